@@ -9,12 +9,14 @@ import os
 from datetime import datetime
 import json
 
-from escolas import GerenciadorEscolas
-from visitas import GerenciadorVisitas
+from escolas import GerenciadorEscolas, GerenciadorEscolasSQL
+from visitas import GerenciadorVisitas, GerenciadorVisitasSQL
 from distancias import CalculadorDistancias
+from cache_persistente import CacheRotas
 from relatorios import GeradorRelatorios
-from planejamento import GerenciadorPlanejamentos
-from usuarios import GerenciadorUsuarios
+from planejamento import GerenciadorPlanejamentos, GerenciadorPlanejamentosSQL
+from usuarios import GerenciadorUsuarios, GerenciadorUsuariosSQL
+from banco_sqlite import ARMAZENAMENTO_LEGADO
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -29,13 +31,19 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Por favor, faca login para acessar esta pagina.'
 login_manager.login_message_category = 'warning'
 
-# Inicializa gerenciadores
-gerenciador_escolas = GerenciadorEscolas()
-gerenciador_visitas = GerenciadorVisitas()
-gerenciador_planejamentos = GerenciadorPlanejamentos()
-calculador_distancias = CalculadorDistancias()
+# Inicializa gerenciadores (ARMAZENAMENTO_LEGADO=sqlite: banco do Django em vez dos JSON)
+if ARMAZENAMENTO_LEGADO == 'sqlite':
+    gerenciador_escolas = GerenciadorEscolasSQL()
+    gerenciador_visitas = GerenciadorVisitasSQL()
+    gerenciador_planejamentos = GerenciadorPlanejamentosSQL()
+    gerenciador_usuarios = GerenciadorUsuariosSQL()
+else:
+    gerenciador_escolas = GerenciadorEscolas()
+    gerenciador_visitas = GerenciadorVisitas()
+    gerenciador_planejamentos = GerenciadorPlanejamentos()
+    gerenciador_usuarios = GerenciadorUsuarios()
+calculador_distancias = CalculadorDistancias(cache=CacheRotas())
 gerador_relatorios = GeradorRelatorios()
-gerenciador_usuarios = GerenciadorUsuarios()
 gerenciador_usuarios.inicializar_admin()
 
 # Configurações
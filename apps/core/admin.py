@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Usuario, Escola, Mediador, Visita, TurmaVisita, AnexoVisita, Evento
+from .models import (
+    Usuario, Escola, DistanciaEscola, RecalculoMatriz, LoteGeocodificacao, ItemGeocodificacao,
+    Mediador, Visita, TurmaVisita, AnexoVisita, Evento,
+)
 
 
 @admin.register(Usuario)
@@ -17,6 +20,33 @@ class EscolaAdmin(admin.ModelAdmin):
     search_fields = ['nome_oficial', 'nome_usual', 'diretor', 'mediador']
 
 
+@admin.register(DistanciaEscola)
+class DistanciaEscolaAdmin(admin.ModelAdmin):
+    list_display = ['origem', 'destino', 'distancia_metros', 'duracao_segundos', 'atualizado_em']
+    list_select_related = ['origem', 'destino']
+    search_fields = ['origem__nome_usual', 'destino__nome_usual']
+
+
+@admin.register(RecalculoMatriz)
+class RecalculoMatrizAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'modo', 'status', 'pares_gravados', 'criado_em', 'concluido_em']
+    list_filter = ['modo', 'status']
+    readonly_fields = ['origens', 'origens_concluidas', 'pid']
+
+
+class ItemGeocodificacaoInline(admin.TabularInline):
+    model = ItemGeocodificacao
+    extra = 0
+    readonly_fields = ['escola', 'status', 'latitude', 'longitude', 'erro', 'processado_em']
+
+
+@admin.register(LoteGeocodificacao)
+class LoteGeocodificacaoAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'status', 'solicitado_por', 'criado_em', 'concluido_em']
+    list_filter = ['status']
+    inlines = [ItemGeocodificacaoInline]
+
+
 @admin.register(Mediador)
 class MediadorAdmin(admin.ModelAdmin):
     list_display = ['nome', 'escola_nome', 'ativo']
@@ -0,0 +1,305 @@
+"""
+Fila de geocodificação de escolas
+
+A view só registra um lote (LoteGeocodificacao + um ItemGeocodificacao por
+escola) e dispara o comando geocodificar_fila em outro processo. O comando
+consome os itens pendentes um a um, respeitando o limite de 1 requisição
+por segundo do Nominatim (token bucket em escolas.py), e grava as
+coordenadas de cada escola assim que elas chegam. Escolas cujo CEP está na
+tabela local (ceps.py) são resolvidas na hora, sem entrar na fila.
+
+Para importações grandes, o comando geocodificar usa a mesma fila como
+ponto de retomada, mas consome os itens em blocos: as escolas de um bloco
+são consultadas em paralelo (o token bucket continua limitando o
+Nominatim) e gravadas com bulk_update em uma única transação.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from ceps import carregar_tabela_ceps
+from escolas import GerenciadorEscolas
+
+from .models import Escola, ItemGeocodificacao, LoteGeocodificacao, VersaoDados
+from .rotas import cache_rotas
+from .tarefas import iniciar_comando, processo_ativo
+
+# Sem atualização do lote por este tempo, o worker é considerado parado
+LIMITE_INATIVIDADE = timedelta(minutes=10)
+
+# Itens por bloco no comando geocodificar (cada bloco é um ponto de retomada)
+TAMANHO_BLOCO = 50
+
+# Escolas consultadas ao mesmo tempo no comando geocodificar
+MAX_CONCORRENCIA = 4
+
+
+def precisa_geocodificar(escola: Escola) -> bool:
+    """Escola sem coordenadas ou com endereço alterado desde a geocodificação"""
+    return escola.latitude is None or escola.longitude is None or escola.endereco_alterado
+
+
+def escolas_para_geocodificar(escolas):
+    """Filtra as escolas do queryset que precisam ser geocodificadas"""
+    candidatas = escolas.filter(Q(latitude=None) | Q(longitude=None) | ~Q(endereco_geocodificado=''))
+    return [e for e in candidatas if precisa_geocodificar(e)]
+
+
+def localizar_escola(escola: Escola, ao_consultar=None):
+    """
+    Consultas de GerenciadorEscolas.obter_coordenadas para uma escola do
+    banco, sem gravar nada
+
+    Returns:
+        (coords, estratégia que encontrou) ou (None, None)
+    """
+    gerenciador = GerenciadorEscolas.__new__(GerenciadorEscolas)
+    gerenciador.escolas = []
+    return gerenciador.localizar(escola.to_dict(), ao_consultar)
+
+
+def geocodificar_escola(escola: Escola):
+    """
+    Geocodifica uma escola (tabela de CEPs, cache e Nominatim) e grava as
+    coordenadas encontradas
+
+    Returns:
+        (coords, estratégia que encontrou) ou (None, None)
+    """
+    coords, estrategia = localizar_escola(escola)
+    if coords:
+        escola.latitude, escola.longitude = coords
+        escola.endereco_geocodificado = escola.chave_endereco
+        escola.save(update_fields=['latitude', 'longitude', 'endereco_geocodificado', 'atualizado_em'])
+    return coords, estrategia
+
+
+def geocodificar_por_cep(escolas) -> int:
+    """
+    Grava o centroide do CEP das escolas encontradas na tabela local
+
+    As coordenadas são gravadas com bulk_update, sem os sinais da escola:
+    as distâncias ficam para o recálculo da matriz (recalcular_matriz), que
+    encontra as escolas novas ou movidas como desatualizadas.
+
+    Returns:
+        Número de escolas geocodificadas (0 se não houver tabela de CEPs)
+    """
+    tabela = carregar_tabela_ceps()
+    if tabela is None:
+        return 0
+
+    agora = now()
+    geocodificadas = []
+    posicoes_antigas = []
+    for escola in escolas:
+        coords = tabela.obter(escola.cep) if escola.cep else None
+        if coords:
+            if escola.latitude is not None and escola.longitude is not None:
+                posicoes_antigas.append((escola.latitude, escola.longitude))
+            escola.latitude, escola.longitude = coords
+            escola.endereco_geocodificado = escola.chave_endereco
+            escola.atualizado_em = escola.posicao_atualizada_em = agora
+            geocodificadas.append(escola)
+
+    with transaction.atomic():
+        Escola.objects.bulk_update(geocodificadas, ['latitude', 'longitude', 'endereco_geocodificado',
+                                                    'atualizado_em', 'posicao_atualizada_em'])
+        VersaoDados.incrementar('escolas')
+    for posicao in posicoes_antigas:
+        cache_rotas.invalidar_ponto(posicao)
+    return len(geocodificadas)
+
+
+def criar_lote(escolas, solicitado_por: str = '') -> Optional[LoteGeocodificacao]:
+    """
+    Registra um lote com as escolas que ainda não estão na fila
+
+    Returns:
+        O lote criado ou None se todas as escolas já estiverem pendentes
+        em outro lote
+    """
+    na_fila = set(ItemGeocodificacao.objects.filter(status='pendente')
+                  .values_list('escola_id', flat=True))
+    novas = [e for e in escolas if e.pk not in na_fila]
+    if not novas:
+        return None
+
+    with transaction.atomic():
+        lote = LoteGeocodificacao.objects.create(solicitado_por=solicitado_por)
+        ItemGeocodificacao.objects.bulk_create(
+            ItemGeocodificacao(lote=lote, escola=escola) for escola in novas)
+    return lote
+
+
+def worker_ativo() -> bool:
+    """Há um processo geocodificar_fila consumindo a fila agora"""
+    return any(
+        processo_ativo(lote.pid) and now() - lote.atualizado_em < LIMITE_INATIVIDADE
+        for lote in LoteGeocodificacao.objects.filter(status='executando')
+    )
+
+
+def iniciar_worker() -> Optional[int]:
+    """Dispara o comando geocodificar_fila se nenhum worker estiver rodando"""
+    if worker_ativo():
+        return None
+    return iniciar_comando('geocodificar_fila')
+
+
+def _processar_item(item: ItemGeocodificacao):
+    escola = item.escola
+    try:
+        if not precisa_geocodificar(escola):
+            # Coordenadas informadas enquanto o item esperava na fila
+            coords, estrategia = (escola.latitude, escola.longitude), ''
+        else:
+            coords, estrategia = geocodificar_escola(escola)
+        item.status = 'encontrada' if coords else 'nao_encontrada'
+        if coords:
+            item.latitude, item.longitude = coords
+            item.estrategia = estrategia
+    except Exception as e:
+        item.status = 'erro'
+        item.erro = str(e)
+    item.processado_em = now()
+    item.save()
+
+
+def processar_fila(progresso=None, continuo: bool = False, espera_segundos: float = 5) -> int:
+    """
+    Consome os itens pendentes de todos os lotes, do mais antigo ao mais novo
+
+    Args:
+        progresso: Função opcional chamada com cada item processado
+        continuo: Continua aguardando novos itens quando a fila esvazia
+        espera_segundos: Intervalo entre verificações no modo contínuo
+
+    Returns:
+        Número de itens processados
+    """
+    pid = os.getpid()
+    processados = 0
+    while True:
+        item = (ItemGeocodificacao.objects.filter(status='pendente')
+                .select_related('escola', 'lote').order_by('lote_id', 'pk').first())
+        if item is None:
+            if not continuo:
+                return processados
+            time.sleep(espera_segundos)
+            continue
+
+        lote = item.lote
+        if lote.status != 'executando' or lote.pid != pid:
+            lote.status = 'executando'
+            lote.pid = pid
+        _processar_item(item)
+        processados += 1
+
+        if not lote.itens.filter(status='pendente').exists():
+            lote.status = 'concluido'
+            lote.concluido_em = now()
+        lote.save()
+        if progresso:
+            progresso(item)
+
+
+def _resultado_item(item: ItemGeocodificacao, ao_consultar):
+    escola = item.escola
+    if not precisa_geocodificar(escola):
+        return (escola.latitude, escola.longitude), '', None
+    try:
+        coords, estrategia = localizar_escola(escola, ao_consultar)
+        return coords, estrategia, None
+    except Exception as e:
+        return None, None, e
+
+
+def processar_fila_em_blocos(tamanho_bloco: int = TAMANHO_BLOCO,
+                             max_concorrencia: int = MAX_CONCORRENCIA,
+                             progresso=None) -> Dict:
+    """
+    Consome os itens pendentes em blocos: as escolas de cada bloco são
+    consultadas em paralelo e gravadas juntas (Escola e itens com
+    bulk_update, em uma transação)
+
+    bulk_update não dispara os sinais da escola: as rotas em cache das
+    posições antigas são invalidadas aqui e a tabela de distâncias fica para
+    o recálculo (recalcular_matriz).
+
+    Args:
+        tamanho_bloco: Itens por bloco/ponto de retomada
+        max_concorrencia: Escolas consultadas ao mesmo tempo
+        progresso: Função opcional chamada com cada item processado
+
+    Returns:
+        {estratégia: {'consultas': n, 'acertos': n}} das consultas feitas
+    """
+    pid = os.getpid()
+    estatisticas = {}
+    estatisticas_lock = threading.Lock()
+
+    def ao_consultar(estrategia, coords):
+        with estatisticas_lock:
+            contagem = estatisticas.setdefault(estrategia, {'consultas': 0, 'acertos': 0})
+            contagem['consultas'] += 1
+            contagem['acertos'] += 1 if coords else 0
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concorrencia)) as executor:
+        while True:
+            itens = list(ItemGeocodificacao.objects.filter(status='pendente')
+                         .select_related('escola', 'lote').order_by('lote_id', 'pk')[:tamanho_bloco])
+            if not itens:
+                return estatisticas
+
+            lotes = {item.lote_id: item.lote for item in itens}
+            LoteGeocodificacao.objects.filter(pk__in=lotes).update(
+                status='executando', pid=pid, atualizado_em=now())
+
+            resultados = list(executor.map(lambda item: _resultado_item(item, ao_consultar), itens))
+
+            agora = now()
+            escolas = []
+            posicoes_antigas = []
+            for item, (coords, estrategia, erro) in zip(itens, resultados):
+                item.processado_em = agora
+                if erro is not None:
+                    item.status, item.erro = 'erro', str(erro)
+                    continue
+                item.status = 'encontrada' if coords else 'nao_encontrada'
+                if not coords:
+                    continue
+                item.latitude, item.longitude = coords
+                item.estrategia = estrategia
+                escola = item.escola
+                if estrategia:
+                    if escola.latitude is not None and escola.longitude is not None:
+                        posicoes_antigas.append((escola.latitude, escola.longitude))
+                    escola.latitude, escola.longitude = coords
+                    escola.endereco_geocodificado = escola.chave_endereco
+                    escola.atualizado_em = escola.posicao_atualizada_em = agora
+                    escolas.append(escola)
+
+            with transaction.atomic():
+                Escola.objects.bulk_update(escolas, ['latitude', 'longitude', 'endereco_geocodificado',
+                                                     'atualizado_em', 'posicao_atualizada_em'])
+                VersaoDados.incrementar('escolas')
+                ItemGeocodificacao.objects.bulk_update(
+                    itens, ['status', 'latitude', 'longitude', 'estrategia', 'erro', 'processado_em'])
+                for lote in lotes.values():
+                    if not lote.itens.filter(status='pendente').exists():
+                        LoteGeocodificacao.objects.filter(pk=lote.pk).update(
+                            status='concluido', concluido_em=agora, atualizado_em=agora)
+
+            for posicao in posicoes_antigas:
+                cache_rotas.invalidar_ponto(posicao)
+            if progresso:
+                for item in itens:
+                    progresso(item)
@@ -0,0 +1,62 @@
+"""
+Management command: converter_snapshots
+Converte os arquivos dos gerenciadores legados (data/*.json) entre o JSON
+comum e o formato binário de formato_snapshot, em que os textos longos
+(observações, contribuições, descrições) só são decodificados quando
+acessados. O formato em disco é detectado na leitura, então a aplicação
+continua funcionando com qualquer um dos dois.
+
+Uso:
+    python manage.py converter_snapshots binario            # todos os arquivos de data/
+    python manage.py converter_snapshots json data/visitas.json
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+import planejamento
+import visitas
+from armazenamento import ArmazenamentoJSON
+from formato_snapshot import FORMATOS
+
+# Arquivos dos gerenciadores -> campos adiados no formato binário
+SNAPSHOTS = {
+    'visitas.json': visitas.CAMPOS_ADIADOS,
+    'agenda.json': planejamento.CAMPOS_ADIADOS,
+    'escolas.json': (),
+    'usuarios.json': (),
+    'mediadores.json': (),
+}
+
+
+class Command(BaseCommand):
+    help = 'Converte os snapshots dos gerenciadores legados entre JSON e o formato binário'
+
+    def add_arguments(self, parser):
+        parser.add_argument('formato', choices=FORMATOS, help='Formato de destino')
+        parser.add_argument('arquivos', nargs='*',
+                            help='Arquivos a converter (padrão: os snapshots de data/)')
+
+    def handle(self, *args, **options):
+        arquivos = options['arquivos'] or [
+            os.path.join(settings.BASE_DIR, 'data', nome) for nome in SNAPSHOTS]
+
+        for arquivo in arquivos:
+            if not os.path.exists(arquivo):
+                if options['arquivos']:
+                    raise CommandError(f'Arquivo não encontrado: {arquivo}')
+                continue
+            armazenamento = ArmazenamentoJSON(
+                arquivo, campos_adiados=SNAPSHOTS.get(os.path.basename(arquivo), ()))
+            antes = os.path.getsize(arquivo)
+            inicio = time.perf_counter()
+            try:
+                depois = armazenamento.converter(options['formato'])
+            except ValueError as e:
+                raise CommandError(f'{arquivo}: {e}')
+            self.stdout.write(f'  {arquivo}: {antes / 1024:.0f} KB -> {depois / 1024:.0f} KB '
+                              f'({time.perf_counter() - inicio:.2f}s)')
+
+        self.stdout.write(self.style.SUCCESS(f'Snapshots em formato {options["formato"]}.'))
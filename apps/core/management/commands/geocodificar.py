@@ -0,0 +1,99 @@
+"""
+Management command: geocodificar
+Geocodifica em lote as escolas sem coordenadas ou cujo endereço mudou desde
+a última geocodificação. Substitui o menu do main.py / geocodificar_todas_bloco1
+em importações grandes.
+
+As escolas entram na fila de geocodificação (LoteGeocodificacao), que serve
+de ponto de retomada: se o comando for interrompido, basta rodá-lo de novo.
+Cada bloco é consultado em paralelo (tabela de CEPs, cache e Nominatim com
+o limite de requisições por segundo) e gravado com bulk_update. No fim, a
+tabela de distâncias é recalculada em segundo plano.
+
+Uso:
+    python manage.py geocodificar                      # escolas ativas
+    python manage.py geocodificar --todas              # inclui inativas/fora do Bloco 1
+    python manage.py geocodificar --tamanho-bloco 100 --concorrencia 8
+    python manage.py geocodificar --sem-recalculo
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.geocodificacao import (
+    MAX_CONCORRENCIA, TAMANHO_BLOCO, criar_lote, escolas_para_geocodificar,
+    processar_fila_em_blocos,
+)
+from apps.core.models import Escola, ItemGeocodificacao
+from apps.core.recalculo import criar_recalculo, iniciar_em_segundo_plano, recalculo_ativo
+from apps.core.rotas import escolas_ativas
+from apps.core.tarefas import trava_exclusiva
+from escolas import ESTRATEGIAS_GEOCODIFICACAO
+
+
+class Command(BaseCommand):
+    help = 'Geocodifica em lote as escolas sem coordenadas ou com endereço alterado (retomável)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true',
+                            help='Inclui escolas inativas e fora do Bloco 1')
+        parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO,
+                            help='Escolas gravadas entre dois pontos de retomada')
+        parser.add_argument('--concorrencia', type=int, default=MAX_CONCORRENCIA,
+                            help='Escolas consultadas ao mesmo tempo')
+        parser.add_argument('--sem-recalculo', action='store_true',
+                            help='Não dispara o recálculo da tabela de distâncias ao final')
+
+    def handle(self, *args, **options):
+        # Mesma trava do geocodificar_fila: um único consumidor da fila por vez
+        with trava_exclusiva('geocodificar_fila') as obtida:
+            if not obtida:
+                raise CommandError('Outro processo já está consumindo a fila de geocodificação.')
+
+            escolas = Escola.objects.all() if options['todas'] else escolas_ativas()
+            lote = criar_lote(escolas_para_geocodificar(escolas), 'manage.py geocodificar')
+            pendentes = ItemGeocodificacao.objects.filter(status='pendente').count()
+            if lote:
+                self.stdout.write(f'  Lote {lote.pk}: {lote.itens.count()} escolas adicionadas à fila')
+            self.stdout.write(f'  {pendentes} escolas pendentes na fila')
+            if not pendentes:
+                self.stdout.write(self.style.SUCCESS('Nenhuma escola para geocodificar.'))
+                return
+
+            contagem = {'encontrada': 0, 'nao_encontrada': 0, 'erro': 0}
+            inicio = time.perf_counter()
+
+            def progresso(item):
+                contagem[item.status] += 1
+                situacao = {'encontrada': 'OK', 'nao_encontrada': 'X', 'erro': 'ERRO'}[item.status]
+                detalhe = f' ({item.estrategia})' if item.estrategia else ''
+                self.stdout.write(f'  [{situacao}] {item.escola}{detalhe}')
+
+            estatisticas = processar_fila_em_blocos(
+                options['tamanho_bloco'], options['concorrencia'], progresso)
+
+        self._resumo(estatisticas, contagem, time.perf_counter() - inicio)
+
+        if contagem['encontrada'] and not options['sem_recalculo']:
+            # bulk_update não dispara os sinais: a tabela de distâncias é refeita à parte
+            if recalculo_ativo():
+                self.stdout.write('  - Recálculo da matriz já em execução; rode '
+                                  '`python manage.py recalcular_matriz` depois que ele terminar.')
+            else:
+                recalculo = criar_recalculo('desatualizadas')
+                iniciar_em_segundo_plano(recalculo)
+                self.stdout.write(f'  Recálculo {recalculo.pk} da matriz de distâncias iniciado em segundo plano.')
+
+    def _resumo(self, estatisticas, contagem, segundos):
+        self.stdout.write('')
+        self.stdout.write(f'  {"Estratégia":<20} {"Consultas":>10} {"Acertos":>8} {"Taxa":>7}')
+        ordem = [e for e in ESTRATEGIAS_GEOCODIFICACAO if e in estatisticas]
+        for estrategia in ordem:
+            dados = estatisticas[estrategia]
+            taxa = dados['acertos'] / dados['consultas'] if dados['consultas'] else 0.0
+            self.stdout.write(f'  {estrategia:<20} {dados["consultas"]:>10} '
+                              f'{dados["acertos"]:>8} {taxa:>7.1%}')
+        total = sum(contagem.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'\n{contagem["encontrada"]}/{total} escolas geocodificadas em {segundos:.1f}s '
+            f'({contagem["nao_encontrada"]} não encontradas, {contagem["erro"]} com erro).'))
@@ -0,0 +1,44 @@
+"""
+Management command: geocodificar_fila
+Processa a fila de geocodificação (lotes criados por POST /api/escolas/geocodificar)
+com no máximo 1 requisição por segundo ao Nominatim.
+
+Uso:
+    python manage.py geocodificar_fila               # até a fila esvaziar
+    python manage.py geocodificar_fila --continuo    # como serviço, aguardando novos lotes
+"""
+from django.core.management.base import BaseCommand
+
+from apps.core.geocodificacao import processar_fila
+from apps.core.models import ItemGeocodificacao
+from apps.core.tarefas import trava_exclusiva
+
+
+class Command(BaseCommand):
+    help = 'Geocodifica as escolas pendentes na fila de geocodificação'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true',
+                            help='Continua aguardando novos itens quando a fila esvazia')
+        parser.add_argument('--espera', type=float, default=5,
+                            help='Segundos entre verificações da fila no modo contínuo')
+
+    def handle(self, *args, **options):
+        def progresso(item):
+            situacao = {'encontrada': 'OK', 'nao_encontrada': 'X', 'erro': 'ERRO'}[item.status]
+            self.stdout.write(f'  [{situacao}] {item.escola} (lote {item.lote_id})')
+
+        total = 0
+        while True:
+            # Um único consumidor por vez: o limite de 1 requisição/s vale por processo
+            with trava_exclusiva('geocodificar_fila') as obtida:
+                if not obtida:
+                    self.stdout.write('  - Outro processo já está consumindo a fila.')
+                    return
+                total += processar_fila(progresso, continuo=options['continuo'],
+                                        espera_segundos=options['espera'])
+            # Itens enfileirados enquanto a trava era liberada
+            if not ItemGeocodificacao.objects.filter(status='pendente').exists():
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'Fila de geocodificação vazia: {total} escolas processadas.'))
@@ -0,0 +1,46 @@
+"""
+Management command: importar_ceps
+Gera a tabela local CEP -> centroide (data/ceps.npy) a partir de um CSV com
+colunas de CEP, latitude e longitude. Com a tabela presente, escolas com CEP
+conhecido são geocodificadas sem consultar o Nominatim.
+
+Uso:
+    python manage.py importar_ceps ceps.csv
+    python manage.py importar_ceps ceps.csv --coluna-cep postcode --saida /tmp/ceps.npy
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ceps import ARQUIVO_PADRAO, importar_csv
+
+
+class Command(BaseCommand):
+    help = 'Importa um CSV de CEPs com coordenadas para a tabela local de geocodificação'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='CSV com CEP, latitude e longitude (separador , ; ou tab)')
+        parser.add_argument('--saida', default=ARQUIVO_PADRAO,
+                            help=f'Arquivo .npy gerado (padrão: {ARQUIVO_PADRAO})')
+        parser.add_argument('--coluna-cep', help='Nome da coluna de CEP (padrão: cep/postcode)')
+        parser.add_argument('--coluna-latitude', help='Nome da coluna de latitude (padrão: latitude/lat)')
+        parser.add_argument('--coluna-longitude', help='Nome da coluna de longitude (padrão: longitude/lon/lng)')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            tabela, ignoradas = importar_csv(
+                options['arquivo'], options['saida'],
+                coluna_cep=options['coluna_cep'],
+                coluna_latitude=options['coluna_latitude'],
+                coluna_longitude=options['coluna_longitude'],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(tabela)} CEPs gravados em {options["saida"]} '
+            f'({time.perf_counter() - inicio:.1f}s)'
+        ))
+        if ignoradas:
+            self.stdout.write(f'  - {ignoradas} linhas ignoradas (CEP ou coordenadas inválidos)')
@@ -4,6 +4,7 @@ Inicializa o banco de dados com:
   1. Usuário admin padrão
   2. Escolas do Bloco 1 (dados hardcoded de escolas.py)
   3. Importa dados históricos dos JSONs legados (escolas, visitas, agenda)
+  4. Completa a tabela de distâncias entre escolas ativas
 """
 import json
 import os
@@ -15,9 +16,13 @@ from django.conf import settings
 # Importa dados hardcoded do módulo legado
 import sys
 sys.path.insert(0, str(settings.BASE_DIR))
+from armazenamento import ArmazenamentoJSON
 from escolas import ESCOLAS_TAUBATE, BLOCO_1
+from visitas import arquivo_diario, carregar_visitas
 
 from apps.core.models import Usuario, Escola, Mediador, Visita, TurmaVisita, AnexoVisita, Evento
+from apps.core.rotas import preencher_distancias
+from apps.core.signals import recalculo_adiado
 
 
 DATA_DIR = settings.BASE_DIR / 'data'
@@ -28,10 +33,14 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         self._criar_admin()
-        self._popular_escolas()
-        self._importar_escolas_json()
+        # As distâncias das escolas criadas aqui são calculadas de uma vez
+        # por _preencher_distancias, e não escola a escola pelo sinal
+        with recalculo_adiado():
+            self._popular_escolas()
+            self._importar_escolas_json()
         self._importar_visitas_json()
         self._importar_agenda_json()
+        self._preencher_distancias()
         self.stdout.write(self.style.SUCCESS('Banco de dados inicializado com sucesso.'))
 
     # ------------------------------------------------------------------
@@ -86,11 +95,11 @@ class Command(BaseCommand):
         if not path.exists():
             return
 
-        with open(path, 'r', encoding='utf-8') as f:
-            try:
-                escolas_json = json.load(f)
-            except json.JSONDecodeError:
-                return
+        # JSON ou snapshot binário (formato_snapshot)
+        try:
+            escolas_json = ArmazenamentoJSON(str(path)).ler()
+        except ValueError:
+            return
 
         importadas = 0
         for e in escolas_json:
@@ -134,14 +143,14 @@ class Command(BaseCommand):
 
     def _importar_visitas_json(self):
         path = DATA_DIR / 'visitas.json'
-        if not path.exists():
+        if not path.exists() and not os.path.exists(arquivo_diario(str(path))):
             return
 
-        with open(path, 'r', encoding='utf-8') as f:
-            try:
-                visitas_json = json.load(f)
-            except json.JSONDecodeError:
-                return
+        try:
+            # Snapshot + diário de alterações do sistema legado
+            visitas_json, _ = carregar_visitas(str(path))
+        except json.JSONDecodeError:
+            return
 
         importadas = 0
         for v in visitas_json:
@@ -225,11 +234,11 @@ class Command(BaseCommand):
         if not path.exists():
             return
 
-        with open(path, 'r', encoding='utf-8') as f:
-            try:
-                eventos_json = json.load(f)
-            except json.JSONDecodeError:
-                return
+        # JSON ou snapshot binário (formato_snapshot)
+        try:
+            eventos_json = ArmazenamentoJSON(str(path)).ler()
+        except ValueError:
+            return
 
         importados = 0
         for e in eventos_json:
@@ -271,3 +280,10 @@ class Command(BaseCommand):
             importados += 1
 
         self.stdout.write(f'  OK {importados} eventos importados de agenda.json.')
+
+    # ------------------------------------------------------------------
+
+    def _preencher_distancias(self):
+        """Calcula pares que ainda faltam na tabela DistanciaEscola."""
+        gravados = preencher_distancias()
+        self.stdout.write(f'  OK {gravados} distâncias entre escolas calculadas.')
@@ -0,0 +1,65 @@
+"""
+Management command: recalcular_matriz
+Recalcula a tabela de distâncias entre escolas (DistanciaEscola) com
+pontos de retomada e troca atômica ao final.
+
+Uso:
+    python manage.py recalcular_matriz                    # só linhas desatualizadas
+    python manage.py recalcular_matriz --modo completo
+    python manage.py recalcular_matriz --retomar          # continua o último interrompido
+    python manage.py recalcular_matriz --recalculo 12     # usado pelo disparo via web
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import RecalculoMatriz
+from apps.core.recalculo import (
+    TAMANHO_BLOCO, criar_recalculo, em_execucao, executar_recalculo,
+    recalculo_ativo, recalculo_interrompido,
+)
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a matriz de distâncias entre escolas (completa ou só as linhas desatualizadas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modo', choices=['completo', 'desatualizadas'], default='desatualizadas')
+        parser.add_argument('--retomar', action='store_true',
+                            help='Continua o último recálculo interrompido, se houver')
+        parser.add_argument('--recalculo', type=int, help='ID de um recálculo já registrado')
+        parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO,
+                            help='Origens calculadas entre dois pontos de retomada')
+
+    def handle(self, *args, **options):
+        if options['recalculo']:
+            try:
+                recalculo = RecalculoMatriz.objects.get(pk=options['recalculo'])
+            except RecalculoMatriz.DoesNotExist:
+                raise CommandError(f"Recálculo {options['recalculo']} não encontrado")
+            if recalculo.status == 'concluido':
+                raise CommandError(f'Recálculo {recalculo.pk} já foi concluído')
+            if recalculo.status == 'executando' and em_execucao(recalculo):
+                raise CommandError(f'Recálculo {recalculo.pk} já está em execução (pid {recalculo.pid})')
+        else:
+            ativo = recalculo_ativo()
+            if ativo:
+                raise CommandError(f'Recálculo {ativo.pk} já está em execução (pid {ativo.pid})')
+            recalculo = recalculo_interrompido() if options['retomar'] else None
+            if recalculo is None:
+                recalculo = criar_recalculo(options['modo'])
+
+        total = len(recalculo.origens)
+        self.stdout.write(f'  Recálculo {recalculo.pk} ({recalculo.modo}): '
+                          f'{len(recalculo.origens_concluidas)}/{total} origens já concluídas')
+
+        def progresso(r):
+            self.stdout.write(f'  {len(r.origens_concluidas)}/{total} origens, '
+                              f'{r.pares_gravados} pares calculados')
+
+        try:
+            executar_recalculo(recalculo, options['tamanho_bloco'], progresso)
+        except Exception as e:
+            raise CommandError(f'Recálculo {recalculo.pk} interrompido: {e} '
+                               f'(retome com --retomar)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Recálculo {recalculo.pk} concluído: {recalculo.pares_gravados} pares gravados.'))
@@ -0,0 +1,194 @@
+"""
+Camada de escolas do mapa em GeoJSON, com agrupamento em grade no servidor
+
+As escolas ativas com coordenadas (e a última visita/total de visitas de
+cada uma) ficam em arrays numpy por processo, reconstruídos quando escolas
+ou visitas mudam. Cada requisição só recorta o retângulo visível e, em
+zoom baixo, soma os pontos por célula de uma grade fixa.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.db.models import Count, Max
+
+from .models import Escola, Visita
+
+# A partir deste zoom as escolas são enviadas individualmente
+ZOOM_SEM_AGRUPAMENTO = 14
+
+# Células da grade por tile de 256 px (4 -> células de ~64 px na tela)
+CELULAS_POR_TILE = 4
+
+# Respostas guardadas por processo (chaves incluem a versão dos dados)
+MAX_RESPOSTAS_CACHE = 256
+
+_mapa_lock = threading.Lock()
+_pontos_mapa = {'versao': None, 'pontos': None}
+_respostas = OrderedDict()
+
+
+def versao_mapa():
+    """Versão dos dados do mapa: quantidade e atualização mais recente de escolas e visitas"""
+    escolas = Escola.objects.aggregate(total=Count('id'), ultima=Max('atualizado_em'))
+    visitas = Visita.objects.aggregate(total=Count('id'), ultima=Max('atualizado_em'))
+    return (escolas['total'], str(escolas['ultima']), visitas['total'], str(visitas['ultima']))
+
+
+def _pontos(versao):
+    """Arrays das escolas ativas com coordenadas para a versão informada"""
+    with _mapa_lock:
+        if _pontos_mapa['versao'] != versao:
+            linhas = list(
+                Escola.objects.filter(ativo=True)
+                .exclude(latitude=None).exclude(longitude=None)
+                .annotate(ultima_visita=Max('visitas__data'), total_visitas=Count('visitas'))
+                .order_by('nome_oficial')
+                .values('id', 'nome_oficial', 'nome_usual', 'diretor', 'latitude',
+                        'longitude', 'bloco_1', 'ultima_visita', 'total_visitas')
+            )
+            _pontos_mapa['pontos'] = {
+                'lat': np.array([e['latitude'] for e in linhas], dtype=np.float64),
+                'lon': np.array([e['longitude'] for e in linhas], dtype=np.float64),
+                'bloco_1': np.array([e['bloco_1'] for e in linhas], dtype=bool),
+                'total_visitas': np.array([e['total_visitas'] for e in linhas], dtype=np.int64),
+                'escolas': linhas,
+            }
+            _pontos_mapa['versao'] = versao
+        return _pontos_mapa['pontos']
+
+
+def tamanho_celula(zoom: int) -> float:
+    """Lado da célula da grade, em graus, para um nível de zoom"""
+    return 360.0 / (2 ** zoom) / CELULAS_POR_TILE
+
+
+def _propriedades_escola(escola, visitas: bool):
+    propriedades = {
+        'id': escola['id'],
+        'nome_usual': escola['nome_usual'],
+        'nome_oficial': escola['nome_oficial'],
+        'diretor': escola['diretor'],
+    }
+    if visitas:
+        ultima = escola['ultima_visita']
+        propriedades['ultima_visita'] = ultima.isoformat() if ultima else None
+        propriedades['total_visitas'] = escola['total_visitas']
+    return propriedades
+
+
+def _feature(lon, lat, propriedades):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [round(float(lon), 6), round(float(lat), 6)]},
+        'properties': propriedades,
+    }
+
+
+def _agrupar(pontos, indices, celula: float, visitas: bool):
+    """Features da grade: clusters com contagem e centroide, ou a escola se estiver sozinha"""
+    lat, lon = pontos['lat'][indices], pontos['lon'][indices]
+    chaves = np.stack([np.floor(lon / celula), np.floor(lat / celula)], axis=1)
+    _, grupo, quantidades = np.unique(chaves, axis=0, return_inverse=True, return_counts=True)
+    grupo = grupo.reshape(-1)
+
+    soma_lat = np.bincount(grupo, weights=lat)
+    soma_lon = np.bincount(grupo, weights=lon)
+    if visitas:
+        total_visitas = np.bincount(grupo, weights=pontos['total_visitas'][indices])
+        sem_visita = np.bincount(grupo, weights=pontos['total_visitas'][indices] == 0)
+
+    features = []
+    primeiro = {}
+    for posicao, g in enumerate(grupo.tolist()):
+        primeiro.setdefault(g, posicao)
+    for g, posicao in sorted(primeiro.items()):
+        quantidade = int(quantidades[g])
+        if quantidade == 1:
+            escola = pontos['escolas'][indices[posicao]]
+            features.append(_feature(lon[posicao], lat[posicao], _propriedades_escola(escola, visitas)))
+            continue
+        propriedades = {'cluster': True, 'quantidade': quantidade}
+        if visitas:
+            propriedades['total_visitas'] = int(total_visitas[g])
+            propriedades['sem_visita'] = int(sem_visita[g])
+        features.append(_feature(soma_lon[g] / quantidade, soma_lat[g] / quantidade, propriedades))
+    return features
+
+
+def _montar(pontos, bbox, zoom, todas: bool, visitas: bool) -> bytes:
+    mascara = np.ones(len(pontos['escolas']), dtype=bool)
+    if not todas:
+        mascara &= pontos['bloco_1']
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        mascara &= (pontos['lon'] >= min_lon) & (pontos['lon'] <= max_lon) \
+            & (pontos['lat'] >= min_lat) & (pontos['lat'] <= max_lat)
+    indices = np.flatnonzero(mascara)
+
+    agrupado = zoom is not None and zoom < ZOOM_SEM_AGRUPAMENTO
+    if agrupado:
+        features = _agrupar(pontos, indices, tamanho_celula(zoom), visitas)
+    else:
+        features = [
+            _feature(pontos['lon'][i], pontos['lat'][i],
+                     _propriedades_escola(pontos['escolas'][i], visitas))
+            for i in indices.tolist()
+        ]
+
+    colecao = {
+        'type': 'FeatureCollection',
+        'features': features,
+        'properties': {'total': int(len(indices)), 'agrupado': agrupado, 'zoom': zoom},
+    }
+    return json.dumps(colecao, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _ajustar_bbox(bbox, zoom):
+    """
+    Expande o retângulo até as bordas da grade (em zoom agrupado) ou o
+    arredonda, para que um cluster cortado pela borda da tela não mude de
+    contagem e para que vistas parecidas reutilizem a mesma resposta
+    """
+    if bbox is None:
+        return None
+    min_lon, min_lat, max_lon, max_lat = bbox
+    if zoom is not None and zoom < ZOOM_SEM_AGRUPAMENTO:
+        celula = tamanho_celula(zoom)
+        return (np.floor(min_lon / celula) * celula, np.floor(min_lat / celula) * celula,
+                np.ceil(max_lon / celula) * celula, np.ceil(max_lat / celula) * celula)
+    return (np.floor(min_lon * 1e3) / 1e3, np.floor(min_lat * 1e3) / 1e3,
+            np.ceil(max_lon * 1e3) / 1e3, np.ceil(max_lat * 1e3) / 1e3)
+
+
+def escolas_geojson(bbox=None, zoom=None, todas: bool = False, visitas: bool = False):
+    """
+    FeatureCollection das escolas no retângulo visível
+
+    Args:
+        bbox: (min_lon, min_lat, max_lon, max_lat) ou None para todas
+        zoom: Zoom do mapa; abaixo de ZOOM_SEM_AGRUPAMENTO as escolas são
+              agrupadas em grade (None desliga o agrupamento)
+        todas: Inclui escolas fora do Bloco 1
+        visitas: Inclui última visita e total de visitas de cada escola
+
+    Returns:
+        (versão dos dados, corpo JSON em bytes)
+    """
+    versao = versao_mapa()
+    bbox = _ajustar_bbox(bbox, zoom)
+    chave = (versao, bbox, zoom, todas, visitas)
+
+    with _mapa_lock:
+        if chave in _respostas:
+            _respostas.move_to_end(chave)
+            return versao, _respostas[chave]
+
+    corpo = _montar(_pontos(versao), bbox, zoom, todas, visitas)
+
+    with _mapa_lock:
+        _respostas[chave] = corpo
+        while len(_respostas) > MAX_RESPOSTAS_CACHE:
+            _respostas.popitem(last=False)
+    return versao, corpo
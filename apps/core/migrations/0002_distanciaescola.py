@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistanciaEscola',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distancia_metros', models.FloatField()),
+                ('duracao_segundos', models.FloatField()),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('destino', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='distancias_entrada', to='core.escola')),
+                ('origem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='distancias_saida', to='core.escola')),
+            ],
+            options={
+                'verbose_name': 'Distância entre Escolas',
+                'verbose_name_plural': 'Distâncias entre Escolas',
+                'indexes': [models.Index(fields=['origem', 'distancia_metros'], name='distancia_origem_metros_idx')],
+                'constraints': [models.UniqueConstraint(fields=('origem', 'destino'), name='distancia_escola_par_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_distanciaescola'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='evento',
+            name='status',
+            field=models.CharField(choices=[('rascunho', 'Rascunho'), ('planejado', 'Planejado'), ('executado', 'Executado'), ('cancelado', 'Cancelado')], default='planejado', max_length=20),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_evento_status_rascunho'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecalculoMatriz',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modo', models.CharField(choices=[('completo', 'Matriz completa'), ('desatualizadas', 'Linhas desatualizadas')], default='desatualizadas', max_length=20)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluido', 'Concluído'), ('erro', 'Erro')], default='pendente', max_length=20)),
+                ('origens', models.JSONField(default=list)),
+                ('origens_concluidas', models.JSONField(default=list)),
+                ('pares_gravados', models.IntegerField(default=0)),
+                ('pid', models.IntegerField(blank=True, null=True)),
+                ('erro', models.TextField(blank=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Recálculo da Matriz',
+                'verbose_name_plural': 'Recálculos da Matriz',
+                'ordering': ['-criado_em'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DistanciaRecalculo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distancia_metros', models.FloatField()),
+                ('duracao_segundos', models.FloatField()),
+                ('calculado_em', models.DateTimeField(auto_now_add=True)),
+                ('destino', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.escola')),
+                ('origem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.escola')),
+                ('recalculo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pares', to='core.recalculomatriz')),
+            ],
+            options={
+                'verbose_name': 'Distância em Recálculo',
+                'verbose_name_plural': 'Distâncias em Recálculo',
+                'constraints': [models.UniqueConstraint(fields=('recalculo', 'origem', 'destino'), name='distancia_recalculo_par_unico')],
+            },
+        ),
+    ]
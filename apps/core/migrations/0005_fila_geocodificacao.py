@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_recalculo_matriz'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoteGeocodificacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluido', 'Concluído')], default='pendente', max_length=20)),
+                ('solicitado_por', models.CharField(blank=True, max_length=150)),
+                ('pid', models.IntegerField(blank=True, null=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Lote de Geocodificação',
+                'verbose_name_plural': 'Lotes de Geocodificação',
+                'ordering': ['-criado_em'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemGeocodificacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('encontrada', 'Encontrada'), ('nao_encontrada', 'Não encontrada'), ('erro', 'Erro')], default='pendente', max_length=20)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('erro', models.TextField(blank=True)),
+                ('processado_em', models.DateTimeField(blank=True, null=True)),
+                ('escola', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='geocodificacoes', to='core.escola')),
+                ('lote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='core.lotegeocodificacao')),
+            ],
+            options={
+                'verbose_name': 'Item de Geocodificação',
+                'verbose_name_plural': 'Itens de Geocodificação',
+                'ordering': ['pk'],
+                'indexes': [models.Index(fields=['status', 'lote'], name='geocodificacao_fila_idx')],
+            },
+        ),
+    ]
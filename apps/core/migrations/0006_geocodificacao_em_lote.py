@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_fila_geocodificacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escola',
+            name='endereco_geocodificado',
+            field=models.CharField(blank=True, max_length=530),
+        ),
+        migrations.AddField(
+            model_name='itemgeocodificacao',
+            name='estrategia',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_geocodificacao_em_lote'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['data', 'hora_inicio'], name='evento_data_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visita',
+            index=models.Index(fields=['data', 'hora'], name='visita_data_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visita',
+            index=models.Index(fields=['escola', 'data'], name='visita_escola_data_idx'),
+        ),
+    ]
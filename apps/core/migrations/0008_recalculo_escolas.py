@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_indices_agenda_visitas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recalculomatriz',
+            name='modo',
+            field=models.CharField(choices=[('completo', 'Matriz completa'), ('desatualizadas', 'Linhas desatualizadas'), ('escolas', 'Linha e coluna de escolas alteradas')], default='desatualizadas', max_length=20),
+        ),
+    ]
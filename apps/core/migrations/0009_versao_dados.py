@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recalculo_escolas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoDados',
+            fields=[
+                ('nome', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('versao', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Versão dos Dados',
+                'verbose_name_plural': 'Versões dos Dados',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:36
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copiar_atualizado_em(apps, schema_editor):
+    # Sem histórico das posições: a última alteração de cada escola é o
+    # limite seguro para as linhas já calculadas
+    Escola = apps.get_model('core', 'Escola')
+    Escola.objects.update(posicao_atualizada_em=models.F('atualizado_em'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_versao_dados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escola',
+            name='posicao_atualizada_em',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copiar_atualizado_em, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
 
@@ -28,11 +29,16 @@ class Escola(models.Model):
     cep = models.CharField(max_length=20, blank=True)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    # Endereço/CEP de onde vieram as coordenadas (vazio se informadas à mão)
+    endereco_geocodificado = models.CharField(max_length=530, blank=True)
     origem = models.CharField(max_length=20, choices=ORIGEM_CHOICES, default='sistema')
     bloco_1 = models.BooleanField(default=False)
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
+    # Última alteração de latitude/longitude/ativo/bloco_1/origem: o que
+    # muda a tabela de distâncias (edições de nome, diretor etc. não contam)
+    posicao_atualizada_em = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['nome_oficial']
@@ -42,6 +48,16 @@ class Escola(models.Model):
     def __str__(self):
         return self.nome_usual or self.nome_oficial
 
+    @property
+    def chave_endereco(self) -> str:
+        """Endereço e CEP atuais, no formato de endereco_geocodificado"""
+        return f"{self.endereco.strip()}|{self.cep.strip()}"
+
+    @property
+    def endereco_alterado(self) -> bool:
+        """O endereço mudou depois que as coordenadas foram geocodificadas"""
+        return bool(self.endereco_geocodificado) and self.endereco_geocodificado != self.chave_endereco
+
     def to_dict(self):
         return {
             'id': self.pk,
@@ -59,6 +75,224 @@ class Escola(models.Model):
         }
 
 
+class DistanciaEscola(models.Model):
+    """Distância/tempo de carro pré-calculados entre duas escolas ativas"""
+    origem = models.ForeignKey(Escola, on_delete=models.CASCADE, related_name='distancias_saida')
+    destino = models.ForeignKey(Escola, on_delete=models.CASCADE, related_name='distancias_entrada')
+    distancia_metros = models.FloatField()
+    duracao_segundos = models.FloatField()
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Distância entre Escolas'
+        verbose_name_plural = 'Distâncias entre Escolas'
+        constraints = [
+            models.UniqueConstraint(fields=['origem', 'destino'], name='distancia_escola_par_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['origem', 'distancia_metros'], name='distancia_origem_metros_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.origem_id} → {self.destino_id}"
+
+    def to_dict(self):
+        return {
+            'distancia_metros': self.distancia_metros,
+            'distancia_km': round(self.distancia_metros / 1000, 2),
+            'duracao_segundos': self.duracao_segundos,
+            'duracao_minutos': round(self.duracao_segundos / 60, 1),
+        }
+
+
+class VersaoDados(models.Model):
+    """
+    Contador de alterações de um conjunto de dados ('escolas', 'distancias')
+
+    Quem grava incrementa a versão depois dos dados (na mesma transação,
+    quando há uma); os índices em memória dos workers conferem a versão com
+    uma consulta pela chave primária em vez de varrer a tabela.
+    """
+    nome = models.CharField(max_length=50, primary_key=True)
+    versao = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Versão dos Dados'
+        verbose_name_plural = 'Versões dos Dados'
+
+    def __str__(self):
+        return f"{self.nome} v{self.versao}"
+
+    @classmethod
+    def versoes(cls, *nomes) -> tuple:
+        """Versão atual de cada conjunto (0 se nunca foi alterado)"""
+        atuais = dict(cls.objects.filter(nome__in=nomes).values_list('nome', 'versao'))
+        return tuple(atuais.get(nome, 0) for nome in nomes)
+
+    @classmethod
+    def incrementar(cls, *nomes):
+        for nome in nomes:
+            if not cls.objects.filter(nome=nome).update(versao=models.F('versao') + 1):
+                cls.objects.get_or_create(nome=nome, defaults={'versao': 1})
+
+
+class RecalculoMatriz(models.Model):
+    """
+    Execução do recálculo da tabela DistanciaEscola em segundo plano.
+
+    As linhas calculadas ficam em DistanciaRecalculo até o fim; origens_concluidas
+    é o ponto de retomada se o processo for interrompido.
+    """
+    MODO_CHOICES = [
+        ('completo', 'Matriz completa'),
+        ('desatualizadas', 'Linhas desatualizadas'),
+        ('escolas', 'Linha e coluna de escolas alteradas'),
+    ]
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluido', 'Concluído'),
+        ('erro', 'Erro'),
+    ]
+
+    modo = models.CharField(max_length=20, choices=MODO_CHOICES, default='desatualizadas')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    origens = models.JSONField(default=list)
+    origens_concluidas = models.JSONField(default=list)
+    pares_gravados = models.IntegerField(default=0)
+    pid = models.IntegerField(null=True, blank=True)
+    erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-criado_em']
+        verbose_name = 'Recálculo da Matriz'
+        verbose_name_plural = 'Recálculos da Matriz'
+
+    def __str__(self):
+        return f"Recálculo {self.pk} ({self.modo}, {self.status})"
+
+    def to_dict(self):
+        total = len(self.origens)
+        concluidas = len(self.origens_concluidas)
+        return {
+            'id': self.pk,
+            'modo': self.modo,
+            'status': self.status,
+            'total_origens': total,
+            'origens_concluidas': concluidas,
+            'progresso': round(concluidas / total, 3) if total else (1.0 if self.status == 'concluido' else 0.0),
+            'pares_gravados': self.pares_gravados,
+            'erro': self.erro,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+            'iniciado_em': self.iniciado_em.isoformat() if self.iniciado_em else None,
+            'concluido_em': self.concluido_em.isoformat() if self.concluido_em else None,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
+        }
+
+
+class DistanciaRecalculo(models.Model):
+    """Par calculado por um RecalculoMatriz, aguardando a troca na tabela definitiva"""
+    recalculo = models.ForeignKey(RecalculoMatriz, on_delete=models.CASCADE, related_name='pares')
+    origem = models.ForeignKey(Escola, on_delete=models.CASCADE, related_name='+')
+    destino = models.ForeignKey(Escola, on_delete=models.CASCADE, related_name='+')
+    distancia_metros = models.FloatField()
+    duracao_segundos = models.FloatField()
+    calculado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Distância em Recálculo'
+        verbose_name_plural = 'Distâncias em Recálculo'
+        constraints = [
+            models.UniqueConstraint(fields=['recalculo', 'origem', 'destino'],
+                                    name='distancia_recalculo_par_unico'),
+        ]
+
+
+class LoteGeocodificacao(models.Model):
+    """Pedido de geocodificação de várias escolas, processado pelo comando geocodificar_fila"""
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluido', 'Concluído'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    solicitado_por = models.CharField(max_length=150, blank=True)
+    pid = models.IntegerField(null=True, blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-criado_em']
+        verbose_name = 'Lote de Geocodificação'
+        verbose_name_plural = 'Lotes de Geocodificação'
+
+    def __str__(self):
+        return f"Geocodificação {self.pk} ({self.status})"
+
+    def to_dict(self, itens=True):
+        lista = list(self.itens.select_related('escola'))
+        contagem = {codigo: 0 for codigo, _ in ItemGeocodificacao.STATUS_CHOICES}
+        for item in lista:
+            contagem[item.status] += 1
+        dados = {
+            'id': self.pk,
+            'status': self.status,
+            'total': sum(contagem.values()),
+            **contagem,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+            'concluido_em': self.concluido_em.isoformat() if self.concluido_em else None,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
+        }
+        if itens:
+            dados['itens'] = [item.to_dict() for item in lista]
+        return dados
+
+
+class ItemGeocodificacao(models.Model):
+    """Uma escola de um lote de geocodificação e o seu resultado"""
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('encontrada', 'Encontrada'),
+        ('nao_encontrada', 'Não encontrada'),
+        ('erro', 'Erro'),
+    ]
+
+    lote = models.ForeignKey(LoteGeocodificacao, on_delete=models.CASCADE, related_name='itens')
+    escola = models.ForeignKey(Escola, on_delete=models.CASCADE, related_name='geocodificacoes')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    estrategia = models.CharField(max_length=30, blank=True)
+    erro = models.TextField(blank=True)
+    processado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['pk']
+        verbose_name = 'Item de Geocodificação'
+        verbose_name_plural = 'Itens de Geocodificação'
+        indexes = [
+            models.Index(fields=['status', 'lote'], name='geocodificacao_fila_idx'),
+        ]
+
+    def to_dict(self):
+        return {
+            'escola_id': self.escola_id,
+            'escola_nome': self.escola.nome_usual or self.escola.nome_oficial,
+            'status': self.status,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'estrategia': self.estrategia,
+            'erro': self.erro,
+            'processado_em': self.processado_em.isoformat() if self.processado_em else None,
+        }
+
+
 class Mediador(models.Model):
     nome = models.CharField(max_length=200)
     escola = models.ForeignKey(
@@ -117,6 +351,11 @@ class Visita(models.Model):
         ordering = ['-data', '-criado_em']
         verbose_name = 'Visita'
         verbose_name_plural = 'Visitas'
+        # Listagens por período e por escola + período (views e GerenciadorVisitasSQL)
+        indexes = [
+            models.Index(fields=['data', 'hora'], name='visita_data_hora_idx'),
+            models.Index(fields=['escola', 'data'], name='visita_escola_data_idx'),
+        ]
 
     def __str__(self):
         return f"{self.escola_nome} - {self.data}"
@@ -194,6 +433,7 @@ class Evento(models.Model):
         ('outro', 'Outro'),
     ]
     STATUS_CHOICES = [
+        ('rascunho', 'Rascunho'),
         ('planejado', 'Planejado'),
         ('executado', 'Executado'),
         ('cancelado', 'Cancelado'),
@@ -231,6 +471,9 @@ class Evento(models.Model):
         ordering = ['data', 'hora_inicio']
         verbose_name = 'Evento'
         verbose_name_plural = 'Eventos'
+        indexes = [
+            models.Index(fields=['data', 'hora_inicio'], name='evento_data_hora_idx'),
+        ]
 
     def __str__(self):
         return f"{self.titulo} - {self.data}"
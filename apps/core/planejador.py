@@ -0,0 +1,259 @@
+"""
+Planejamento automático do mês: agrupa escolas próximas no mesmo dia
+
+Os tempos de viagem vêm da tabela DistanciaEscola (com estimativa em linha
+reta para pares ausentes), então o planejamento não faz requisições HTTP.
+As visitas são criadas como rascunho para revisão na agenda.
+"""
+from calendar import monthrange
+from datetime import date, datetime, time as dtime, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+
+from otimizacao import k_medoides, otimizar_roteiro
+
+from .models import Evento, Visita
+from .rotas import _escolas_roteaveis, matriz_duracoes_array
+
+TURNOS_VISITA = ('manha', 'tarde')
+HORA_PADRAO_TURNO = {'manha': dtime(8, 0), 'tarde': dtime(13, 0)}
+# Tempo reservado para cada visita na agenda
+DURACAO_VISITA = timedelta(minutes=90)
+
+
+def _arredondar_horario(momento: datetime) -> datetime:
+    """Arredonda para cima em múltiplos de 5 minutos"""
+    resto = timedelta(minutes=momento.minute % 5, seconds=momento.second,
+                      microseconds=momento.microsecond)
+    return momento - resto + timedelta(minutes=5) if resto else momento
+
+
+def _turno_evento(evento):
+    """Turno ocupado por um evento ('integral' bloqueia o dia inteiro)"""
+    if evento.dia_inteiro or evento.tipo == 'feriado':
+        return 'integral'
+    if evento.turno:
+        return evento.turno
+    if evento.hora_inicio:
+        return 'manha' if evento.hora_inicio < dtime(12, 0) else 'tarde'
+    return None
+
+
+def vagas_do_mes(ano: int, mes: int, max_por_dia: int, max_por_turno: int,
+                 a_partir_de: date = None):
+    """
+    Vagas de visita por dia útil do mês
+
+    Feriados e eventos de dia inteiro bloqueiam o dia; reuniões e outros
+    eventos bloqueiam o turno em que acontecem; visitas já agendadas
+    ocupam uma vaga do seu turno.
+
+    Returns:
+        Dicionário {data: {'manha': vagas, 'tarde': vagas}} só com os dias
+        que ainda têm vaga
+    """
+    inicio = date(ano, mes, 1)
+    if a_partir_de and a_partir_de > inicio:
+        inicio = a_partir_de
+    ultimo = monthrange(ano, mes)[1]
+
+    vagas = {}
+    visitas_no_dia = {}
+    for dia in range(1, ultimo + 1):
+        data = date(ano, mes, dia)
+        if data >= inicio and data.weekday() < 5:
+            vagas[data] = {turno: max_por_turno for turno in TURNOS_VISITA}
+            visitas_no_dia[data] = 0
+
+    eventos = (Evento.objects
+               .filter(data__in=list(vagas))
+               .exclude(status__in=['cancelado', 'rascunho']))
+    for evento in eventos:
+        turno = _turno_evento(evento)
+        turnos_dia = vagas[evento.data]
+        if evento.tipo == 'visita':
+            visitas_no_dia[evento.data] += 1
+            if turno in turnos_dia:
+                turnos_dia[turno] = max(0, turnos_dia[turno] - 1)
+        elif turno == 'integral':
+            turnos_dia.clear()
+        elif turno in turnos_dia:
+            turnos_dia[turno] = 0
+
+    resultado = {}
+    for data, turnos_dia in vagas.items():
+        restante = max_por_dia - visitas_no_dia[data]
+        livres = {}
+        for turno in TURNOS_VISITA:
+            quantidade = min(turnos_dia.get(turno, 0), restante)
+            if quantidade > 0:
+                livres[turno] = quantidade
+                restante -= quantidade
+        if livres:
+            resultado[data] = livres
+    return resultado
+
+
+def _prioridade_escolas(escolas, ano: int, mes: int):
+    """
+    Ordena as escolas para o mês: sem visita (ou visitadas há mais tempo)
+    primeiro; escolas que já têm visita agendada no mês ficam de fora
+    """
+    ja_agendadas = set(
+        Evento.objects
+        .filter(tipo='visita', data__year=ano, data__month=mes, escola__isnull=False)
+        .exclude(status__in=['cancelado', 'rascunho'])
+        .values_list('escola_id', flat=True)
+    )
+    ultima_visita = dict(
+        Visita.objects.filter(escola__isnull=False)
+        .values('escola_id').annotate(ultima=Max('data'))
+        .values_list('escola_id', 'ultima')
+    )
+    pendentes = [e for e in escolas if e.pk not in ja_agendadas]
+    pendentes.sort(key=lambda e: (ultima_visita.get(e.pk) or date.min, str(e)))
+    return pendentes, ultima_visita
+
+
+def _dias_para_grupos(grupos, dias, capacidades):
+    """
+    Associa grupos a dias: grupos com escolas mais atrasadas (índices menores,
+    já que as escolas estão em ordem de prioridade) ficam nos primeiros dias,
+    desde que caibam na capacidade do dia
+    """
+    ordem = sorted(range(len(grupos)),
+                   key=lambda g: np.mean(grupos[g]) if grupos[g] else np.inf)
+    livres = list(ordem)
+    associacao = {}
+    for d, capacidade in enumerate(capacidades):
+        escolhido = next((g for g in livres if len(grupos[g]) <= capacidade), None)
+        if escolhido is None:
+            # Sem encaixe guloso: mantém a associação original do k-medoides
+            return {g: dias[g] for g in range(len(grupos))}
+        livres.remove(escolhido)
+        associacao[escolhido] = dias[d]
+    return associacao
+
+
+def planejar_mes(ano: int, mes: int, max_por_dia: int = 4, max_por_turno: int = 2,
+                 substituir_rascunhos: bool = True, a_partir_de: date = None):
+    """
+    Cria visitas em rascunho para o mês agrupando escolas próximas por dia
+
+    Args:
+        ano, mes: Mês a planejar
+        max_por_dia: Máximo de visitas por dia (contando as já agendadas)
+        max_por_turno: Máximo de visitas por turno
+        substituir_rascunhos: Remove os rascunhos anteriores do mês antes de planejar
+        a_partir_de: Primeiro dia que pode receber visitas (padrão: hoje)
+
+    Returns:
+        Resumo com os dias planejados, total de visitas criadas e escolas
+        que ficaram sem vaga
+    """
+    if a_partir_de is None:
+        a_partir_de = date.today()
+
+    with transaction.atomic():
+        if substituir_rascunhos:
+            Evento.objects.filter(data__year=ano, data__month=mes, status='rascunho').delete()
+
+        vagas = vagas_do_mes(ano, mes, max_por_dia, max_por_turno, a_partir_de)
+        escolas, ultima_visita = _prioridade_escolas(list(_escolas_roteaveis()), ano, mes)
+
+        capacidade_total = sum(sum(v.values()) for v in vagas.values())
+        selecionadas = escolas[:capacidade_total]
+        sem_vaga = escolas[capacidade_total:]
+
+        # Menor número de dias que comporta as escolas (dias com mais vagas primeiro)
+        dias = []
+        acumulado = 0
+        for data in sorted(vagas, key=lambda d: -sum(vagas[d].values())):
+            if acumulado >= len(selecionadas):
+                break
+            dias.append(data)
+            acumulado += sum(vagas[data].values())
+        dias.sort()
+        capacidades = [sum(vagas[d].values()) for d in dias]
+
+        duracoes, estimados = matriz_duracoes_array(selecionadas)
+        grupos = k_medoides(duracoes, capacidades) if selecionadas else []
+        dia_do_grupo = _dias_para_grupos(grupos, dias, capacidades)
+
+        novos = []
+        resumo_dias = []
+        for g, membros in enumerate(grupos):
+            if not membros:
+                continue
+            data = dia_do_grupo[g]
+            sub = duracoes[np.ix_(membros, membros)]
+            ordem = [membros[i] for i in otimizar_roteiro(sub.tolist())['ordem']]
+
+            # Preenche os turnos livres do dia na ordem do roteiro
+            turnos = [t for t, q in vagas[data].items() for _ in range(q)]
+            escolas_dia = []
+            ultima_do_turno = {}
+            for i, turno in zip(ordem, turnos):
+                escola = selecionadas[i]
+                if turno in ultima_do_turno:
+                    # Depois da visita anterior do turno e do deslocamento até esta escola
+                    anterior, inicio_anterior = ultima_do_turno[turno]
+                    inicio = _arredondar_horario(
+                        inicio_anterior + DURACAO_VISITA
+                        + timedelta(seconds=float(duracoes[anterior, i])))
+                else:
+                    inicio = datetime.combine(data, HORA_PADRAO_TURNO[turno])
+                ultima_do_turno[turno] = (i, inicio)
+                novos.append(Evento(
+                    tipo='visita',
+                    titulo=escola.nome_usual or escola.nome_oficial,
+                    data=data,
+                    turno=turno,
+                    hora_inicio=inicio.time(),
+                    hora_fim=(inicio + DURACAO_VISITA).time(),
+                    escola=escola,
+                    escola_nome=escola.nome_usual,
+                    mediador_nome=escola.mediador or '',
+                    descricao='Gerado pelo planejamento automático',
+                    status='rascunho',
+                ))
+                ultima = ultima_visita.get(escola.pk)
+                escolas_dia.append({
+                    'escola_id': escola.pk,
+                    'escola_nome': escola.nome_usual,
+                    'turno': turno,
+                    'hora_inicio': inicio.strftime('%H:%M'),
+                    'ultima_visita': str(ultima) if ultima else None,
+                })
+            deslocamento = sum(duracoes[a, b] for a, b in zip(ordem, ordem[1:]))
+            resumo_dias.append({
+                'data': str(data),
+                'escolas': escolas_dia,
+                'deslocamento_minutos': round(float(deslocamento) / 60, 1),
+            })
+
+        Evento.objects.bulk_create(novos)
+
+    resumo_dias.sort(key=lambda d: d['data'])
+    return {
+        'ano': ano,
+        'mes': mes,
+        'criados': len(novos),
+        'dias': resumo_dias,
+        'sem_vaga': [{'escola_id': e.pk, 'escola_nome': e.nome_usual} for e in sem_vaga],
+        'pares_estimados': estimados,
+    }
+
+
+def confirmar_rascunhos(ano: int, mes: int) -> int:
+    """Transforma os rascunhos do mês em visitas planejadas"""
+    return Evento.objects.filter(data__year=ano, data__month=mes, status='rascunho') \
+        .update(status='planejado')
+
+
+def descartar_rascunhos(ano: int, mes: int) -> int:
+    """Remove os rascunhos do mês"""
+    removidos, _ = Evento.objects.filter(data__year=ano, data__month=mes, status='rascunho').delete()
+    return removidos
@@ -0,0 +1,242 @@
+"""
+Recálculo da tabela DistanciaEscola em segundo plano
+
+O recálculo roda em um processo separado (management command
+recalcular_matriz), nunca dentro de um worker web. As linhas calculadas vão
+para DistanciaRecalculo bloco a bloco e cada bloco concluído é registrado
+em RecalculoMatriz.origens_concluidas, o que permite retomar após uma queda.
+Só no fim as linhas novas substituem as antigas, em uma única transação:
+quem lê a tabela vê a matriz anterior inteira ou a nova inteira.
+
+O modo 'escolas' é o disparado pelo sinal da escola quando ela muda de
+lugar, entra ou sai da tabela: refaz direto na tabela só a linha e a coluna
+de cada escola (duas requisições /table por escola).
+"""
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min
+from django.utils.timezone import now
+
+from .models import DistanciaEscola, DistanciaRecalculo, Escola, RecalculoMatriz, VersaoDados
+from .rotas import _escolas_roteaveis, atualizar_distancias_escola, calculador_distancias
+from .tarefas import iniciar_comando, processo_ativo
+
+# Origens calculadas por bloco (cada bloco é um ponto de retomada)
+TAMANHO_BLOCO = 20
+
+# Sem atualização do registro por este tempo, o recálculo é considerado interrompido
+LIMITE_INATIVIDADE = timedelta(minutes=30)
+
+
+def origens_desatualizadas():
+    """
+    Escolas cuja linha na tabela precisa ser recalculada: linha incompleta,
+    par mais antigo que a validade do cache de rotas ou anterior à última
+    mudança de posição (posicao_atualizada_em) da escola de origem ou da de
+    destino; edições que não mexem no roteamento não contam
+
+    O destino conta porque bulk_update (comando geocodificar) e os
+    gerenciadores legados em SQL não disparam o sinal que refaz a coluna da
+    escola alterada: sem ele, as distâncias das outras escolas até ela
+    ficariam com os valores antigos.
+    """
+    escolas = list(_escolas_roteaveis().values_list('pk', 'posicao_atualizada_em'))
+    limite = now() - timedelta(days=settings.CACHE_ROTAS_TTL_DIAS)
+    linhas = {
+        origem_id: (total, mais_antigo)
+        for origem_id, total, mais_antigo in
+        DistanciaEscola.objects
+        .filter(destino__in=_escolas_roteaveis())
+        .values('origem_id')
+        .annotate(total=Count('id'), mais_antigo=Min('atualizado_em'))
+        .values_list('origem_id', 'total', 'mais_antigo')
+    }
+
+    destino_alterado = set(
+        DistanciaEscola.objects
+        .filter(destino__in=_escolas_roteaveis(), atualizado_em__lt=F('destino__posicao_atualizada_em'))
+        .values_list('origem_id', flat=True)
+        .distinct()
+    )
+
+    desatualizadas = []
+    for pk, posicao_atualizada_em in escolas:
+        total, mais_antigo = linhas.get(pk, (0, None))
+        if (total < len(escolas) - 1 or pk in destino_alterado
+                or (mais_antigo and mais_antigo < max(limite, posicao_atualizada_em))):
+            desatualizadas.append(pk)
+    return desatualizadas
+
+
+def em_execucao(recalculo: RecalculoMatriz) -> bool:
+    """O recálculo está rodando agora (processo vivo e registro atualizado recentemente)"""
+    if recalculo.status == 'pendente':
+        return now() - recalculo.atualizado_em < LIMITE_INATIVIDADE
+    return (recalculo.status == 'executando'
+            and processo_ativo(recalculo.pid)
+            and now() - recalculo.atualizado_em < LIMITE_INATIVIDADE)
+
+
+def recalculo_ativo():
+    """Recálculo pendente ou em execução, se houver"""
+    for recalculo in RecalculoMatriz.objects.filter(status__in=['pendente', 'executando']):
+        if em_execucao(recalculo):
+            return recalculo
+    return None
+
+
+def recalculo_interrompido():
+    """Recálculo mais recente que parou no meio (pode ser retomado)"""
+    for recalculo in RecalculoMatriz.objects.filter(status__in=['pendente', 'executando', 'erro']):
+        if not em_execucao(recalculo):
+            return recalculo
+    return None
+
+
+def criar_recalculo(modo: str = 'desatualizadas', escolas=None) -> RecalculoMatriz:
+    """
+    Registra um recálculo com a lista de origens a calcular
+
+    Args:
+        modo: 'completo', 'desatualizadas' ou 'escolas'
+        escolas: PKs das escolas do modo 'escolas'
+    """
+    if modo == 'completo':
+        origens = list(_escolas_roteaveis().values_list('pk', flat=True))
+    elif modo == 'desatualizadas':
+        origens = origens_desatualizadas()
+    elif modo == 'escolas':
+        if not escolas:
+            raise ValueError("Informe as escolas do recálculo")
+        origens = list(escolas)
+    else:
+        raise ValueError(f"Modo inválido: {modo}")
+    return RecalculoMatriz.objects.create(modo=modo, origens=origens)
+
+
+def iniciar_em_segundo_plano(recalculo: RecalculoMatriz) -> int:
+    """Dispara `manage.py recalcular_matriz --recalculo <id>` e retorna imediatamente"""
+    return iniciar_comando('recalcular_matriz', '--recalculo', recalculo.pk)
+
+
+def recalcular_escolas_em_segundo_plano(escolas) -> RecalculoMatriz:
+    """Refaz a linha e a coluna das escolas em outro processo (usado pelo sinal da escola)"""
+    recalculo = criar_recalculo('escolas', escolas)
+    iniciar_em_segundo_plano(recalculo)
+    return recalculo
+
+
+def executar_recalculo(recalculo: RecalculoMatriz, tamanho_bloco: int = TAMANHO_BLOCO,
+                       progresso=None) -> RecalculoMatriz:
+    """
+    Calcula as origens pendentes do recálculo e troca as linhas na tabela
+
+    Args:
+        recalculo: Registro criado por criar_recalculo (ou interrompido)
+        tamanho_bloco: Origens por bloco/ponto de retomada
+        progresso: Função opcional chamada com o registro após cada bloco
+    """
+    recalculo.status = 'executando'
+    recalculo.pid = os.getpid()
+    recalculo.erro = ''
+    recalculo.iniciado_em = recalculo.iniciado_em or now()
+    recalculo.save()
+
+    try:
+        if recalculo.modo == 'escolas':
+            _recalcular_escolas(recalculo, progresso)
+            return recalculo
+
+        escolas = list(_escolas_roteaveis())
+        por_pk = {e.pk: e for e in escolas}
+        destinos = [(e.latitude, e.longitude) for e in escolas]
+        concluidas = set(recalculo.origens_concluidas)
+        pendentes = [pk for pk in recalculo.origens if pk not in concluidas and pk in por_pk]
+
+        for inicio in range(0, len(pendentes), tamanho_bloco):
+            bloco = [por_pk[pk] for pk in pendentes[inicio:inicio + tamanho_bloco]]
+            tabela = calculador_distancias.calcular_tabela(
+                [(e.latitude, e.longitude) for e in bloco], destinos)
+
+            novos = [
+                DistanciaRecalculo(
+                    recalculo=recalculo, origem=origem, destino=destino,
+                    distancia_metros=rota['distancia_metros'],
+                    duracao_segundos=rota['duracao_segundos'],
+                )
+                for origem, linha in zip(bloco, tabela)
+                for destino, rota in zip(escolas, linha)
+                if rota and destino.pk != origem.pk
+            ]
+            with transaction.atomic():
+                # Um bloco refeito após uma queda substitui o que ficou pela metade
+                DistanciaRecalculo.objects.filter(
+                    recalculo=recalculo, origem__in=bloco).delete()
+                DistanciaRecalculo.objects.bulk_create(novos)
+                recalculo.origens_concluidas = recalculo.origens_concluidas + [e.pk for e in bloco]
+                recalculo.pares_gravados = DistanciaRecalculo.objects.filter(recalculo=recalculo).count()
+                recalculo.save()
+            if progresso:
+                progresso(recalculo)
+
+        _aplicar(recalculo)
+    except Exception as e:
+        recalculo.status = 'erro'
+        recalculo.erro = str(e)
+        recalculo.save()
+        raise
+
+    return recalculo
+
+
+def _recalcular_escolas(recalculo: RecalculoMatriz, progresso=None):
+    """Modo 'escolas': cada escola concluída já está gravada na tabela definitiva"""
+    concluidas = set(recalculo.origens_concluidas)
+    pendentes = [pk for pk in recalculo.origens if pk not in concluidas]
+    for escola in Escola.objects.filter(pk__in=pendentes):
+        gravados = atualizar_distancias_escola(escola)
+        recalculo.origens_concluidas = recalculo.origens_concluidas + [escola.pk]
+        recalculo.pares_gravados += gravados
+        recalculo.save()
+        if progresso:
+            progresso(recalculo)
+
+    recalculo.status = 'concluido'
+    recalculo.concluido_em = now()
+    recalculo.save()
+
+
+def _aplicar(recalculo: RecalculoMatriz):
+    """
+    Troca as linhas recalculadas na tabela definitiva em uma transação
+
+    Pares de escolas que mudaram de posição (ou entraram/saíram da tabela)
+    depois do início do recálculo ficam com os valores atuais (a linha e a
+    coluna delas são refeitas pelo recálculo 'escolas' disparado pelo sinal
+    da escola).
+    """
+    calculados = DistanciaRecalculo.objects.filter(recalculo=recalculo)
+    alteradas = list(Escola.objects.filter(posicao_atualizada_em__gt=recalculo.iniciado_em)
+                     .values_list('pk', flat=True))
+
+    with transaction.atomic():
+        (DistanciaEscola.objects
+         .filter(origem_id__in=calculados.values('origem_id'))
+         .exclude(origem_id__in=alteradas).exclude(destino_id__in=alteradas)
+         .delete())
+        DistanciaEscola.objects.bulk_create(
+            (DistanciaEscola(origem_id=o, destino_id=d, distancia_metros=m, duracao_segundos=s)
+             for o, d, m, s in calculados
+             .exclude(origem_id__in=alteradas).exclude(destino_id__in=alteradas)
+             .values_list('origem_id', 'destino_id', 'distancia_metros', 'duracao_segundos')
+             .iterator()),
+            batch_size=2000, ignore_conflicts=True,
+        )
+        VersaoDados.incrementar('distancias')
+        calculados.delete()
+        recalculo.status = 'concluido'
+        recalculo.concluido_em = now()
+        recalculo.save()
@@ -0,0 +1,465 @@
+"""
+Instâncias compartilhadas de roteamento usadas pelas views e sinais
+"""
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from cache_persistente import CacheRotas
+from distancias import CalculadorDistancias, distancias_haversine_km
+from indice_espacial import IndiceEspacial
+from otimizacao import custo_roteiro, otimizar_roteiro
+
+from .models import Escola, DistanciaEscola, VersaoDados
+
+cache_rotas = CacheRotas(
+    str(settings.CACHE_ROTAS_ARQUIVO),
+    ttl_segundos=settings.CACHE_ROTAS_TTL_DIAS * 24 * 3600,
+)
+
+
+def _criar_backend():
+    """Backend de roteamento escolhido em settings.ROTEAMENTO_BACKEND"""
+    if settings.ROTEAMENTO_BACKEND == 'local':
+        from roteamento_local import RoteadorLocal
+        return RoteadorLocal.de_arquivo(settings.ROTEAMENTO_OSM_ARQUIVO)
+    return None
+
+
+calculador_distancias = CalculadorDistancias(
+    settings.OSRM_SERVIDOR, cache=cache_rotas, backend=_criar_backend(),
+    max_concorrencia=settings.OSRM_MAX_CONCORRENCIA,
+    requisicoes_por_segundo=settings.OSRM_REQUISICOES_POR_SEGUNDO,
+)
+
+_indice_lock = threading.Lock()
+_indice_escolas = {'versao': None, 'indice': None}
+
+
+def indice_escolas() -> IndiceEspacial:
+    """
+    Índice espacial das escolas ativas com coordenadas.
+
+    É reconstruído quando a versão 'escolas' de VersaoDados muda, o que
+    também cobre alterações feitas por outros workers.
+    """
+    qs = Escola.objects.filter(ativo=True).exclude(latitude=None).exclude(longitude=None)
+    versao = VersaoDados.versoes('escolas')
+
+    with _indice_lock:
+        if _indice_escolas['versao'] != versao:
+            _indice_escolas['indice'] = IndiceEspacial(e.to_dict() for e in qs)
+            _indice_escolas['versao'] = versao
+        return _indice_escolas['indice']
+
+
+# ==================== TABELA DE DISTÂNCIAS ====================
+
+def escolas_ativas():
+    """Escolas ativas (Bloco 1 ou manuais) que entram na tabela de distâncias"""
+    return Escola.objects.filter(ativo=True).filter(Q(bloco_1=True) | Q(origem='manual'))
+
+
+def _escolas_roteaveis():
+    return escolas_ativas().exclude(latitude=None).exclude(longitude=None)
+
+
+def atualizar_distancias_escola(escola) -> int:
+    """
+    Recalcula apenas a linha e a coluna de uma escola na tabela DistanciaEscola.
+
+    Escolas inativas ou sem coordenadas apenas têm seus pares removidos.
+    Pares que voltam sem rota (ex.: OSRM fora do ar) mantêm o valor
+    anterior: quando a escola muda de lugar, o sinal da escola já removeu
+    os pares antigos.
+
+    Returns:
+        Número de pares gravados
+    """
+    outras = list(_escolas_roteaveis().exclude(pk=escola.pk))
+    roteavel = _escolas_roteaveis().filter(pk=escola.pk).exists()
+
+    novos = []
+    if roteavel and outras:
+        ponto = (escola.latitude, escola.longitude)
+        coords = [(e.latitude, e.longitude) for e in outras]
+        linha = calculador_distancias.calcular_tabela([ponto], coords)[0]
+        coluna = [r[0] for r in calculador_distancias.calcular_tabela(coords, [ponto])]
+
+        for outra, ida, volta in zip(outras, linha, coluna):
+            if ida:
+                novos.append(DistanciaEscola(
+                    origem=escola, destino=outra,
+                    distancia_metros=ida['distancia_metros'],
+                    duracao_segundos=ida['duracao_segundos'],
+                ))
+            if volta:
+                novos.append(DistanciaEscola(
+                    origem=outra, destino=escola,
+                    distancia_metros=volta['distancia_metros'],
+                    duracao_segundos=volta['duracao_segundos'],
+                ))
+
+    roteaveis = {e.pk for e in outras} if roteavel else set()
+    calculados = {(n.origem_id, n.destino_id) for n in novos}
+    pares = DistanciaEscola.objects.filter(Q(origem=escola) | Q(destino=escola))
+    removidos = [
+        pk for pk, origem_id, destino_id in pares.values_list('pk', 'origem_id', 'destino_id')
+        if (origem_id, destino_id) in calculados
+        or (destino_id if origem_id == escola.pk else origem_id) not in roteaveis
+    ]
+
+    with transaction.atomic():
+        DistanciaEscola.objects.filter(pk__in=removidos).delete()
+        DistanciaEscola.objects.bulk_create(novos)
+        VersaoDados.incrementar('distancias')
+    return len(novos)
+
+
+def preencher_distancias() -> int:
+    """
+    Calcula os pares que ainda faltam na tabela DistanciaEscola
+
+    Returns:
+        Número de pares gravados
+    """
+    escolas = list(_escolas_roteaveis())
+    existentes = set(DistanciaEscola.objects.values_list('origem_id', 'destino_id'))
+    if len(existentes) >= len(escolas) * (len(escolas) - 1):
+        return 0
+
+    coords = [(e.latitude, e.longitude) for e in escolas]
+    tabela = calculador_distancias.calcular_tabela(coords, coords)
+
+    novos = []
+    for i, origem in enumerate(escolas):
+        for j, destino in enumerate(escolas):
+            rota = tabela[i][j]
+            if i == j or not rota or (origem.pk, destino.pk) in existentes:
+                continue
+            novos.append(DistanciaEscola(
+                origem=origem, destino=destino,
+                distancia_metros=rota['distancia_metros'],
+                duracao_segundos=rota['duracao_segundos'],
+            ))
+
+    with transaction.atomic():
+        DistanciaEscola.objects.bulk_create(novos, ignore_conflicts=True)
+        VersaoDados.incrementar('distancias')
+    return len(novos)
+
+
+def obter_distancia(origem_id, destino_id):
+    """Distância pré-calculada entre duas escolas ou None se o par não estiver na tabela"""
+    registro = DistanciaEscola.objects.filter(origem_id=origem_id, destino_id=destino_id).first()
+    return registro.to_dict() if registro else None
+
+
+def escolas_proximas_tabela(escola, limite: int = 5):
+    """
+    Escolas do Bloco 1 mais próximas usando a tabela pré-calculada.
+
+    Returns:
+        Lista no formato de CalculadorDistancias.encontrar_escolas_proximas ou
+        None se a linha da escola estiver incompleta na tabela
+    """
+    destinos = escolas_ativas().filter(bloco_1=True).exclude(pk=escola.pk) \
+        .exclude(latitude=None).exclude(longitude=None)
+    registros = (
+        DistanciaEscola.objects
+        .filter(origem=escola, destino__in=destinos)
+        .select_related('destino')
+        .order_by('distancia_metros')
+    )
+    if registros.count() < destinos.count():
+        return None
+
+    proximas = []
+    for registro in registros[:limite]:
+        rota = registro.to_dict()
+        proximas.append({
+            'escola': registro.destino.to_dict(),
+            'distancia_km': rota['distancia_km'],
+            'duracao_minutos': rota['duracao_minutos'],
+        })
+    return proximas
+
+
+# ==================== ALCANCE (ISÓCRONAS) ====================
+
+_alcance_lock = threading.Lock()
+_indice_alcance = {'versao': None, 'por_origem': {}}
+
+
+def _alcance_por_origem():
+    """
+    Para cada escola, arrays com as durações até as demais escolas ativas em
+    ordem crescente (e os IDs e distâncias na mesma ordem).
+
+    Reconstruído quando as versões 'escolas' ou 'distancias' de VersaoDados
+    mudam, inclusive por outros workers.
+    """
+    versao = VersaoDados.versoes('escolas', 'distancias')
+
+    with _alcance_lock:
+        if _indice_alcance['versao'] != versao:
+            linhas = np.array(
+                DistanciaEscola.objects
+                .filter(destino__in=escolas_ativas())
+                .order_by('origem_id', 'duracao_segundos')
+                .values_list('origem_id', 'destino_id', 'duracao_segundos', 'distancia_metros'),
+                dtype=np.float64,
+            ).reshape(-1, 4)
+
+            por_origem = {}
+            if len(linhas):
+                origens, inicios = np.unique(linhas[:, 0], return_index=True)
+                fins = np.append(inicios[1:], len(linhas))
+                for origem_id, inicio, fim in zip(origens.astype(int).tolist(), inicios, fins):
+                    bloco = linhas[inicio:fim]
+                    por_origem[origem_id] = (bloco[:, 2].copy(), bloco[:, 1].astype(int),
+                                             bloco[:, 3].copy())
+
+            _indice_alcance['por_origem'] = por_origem
+            _indice_alcance['versao'] = versao
+        return _indice_alcance['por_origem']
+
+
+def escolas_alcancaveis(minutos: float, escola=None, coords=None):
+    """
+    Escolas ativas a até `minutos` de carro de uma escola ou coordenada.
+
+    Para uma escola, a resposta sai da tabela pré-calculada com uma busca
+    binária na lista ordenada de durações. Para uma coordenada avulsa é
+    feita uma única requisição /table (com cache).
+
+    Returns:
+        Lista de {'escola', 'duracao_minutos', 'distancia_km'} ordenada por
+        duração, ou None se a escola ainda não tiver linha na tabela
+    """
+    limite = minutos * 60
+
+    if escola is not None:
+        linha = _alcance_por_origem().get(escola.pk)
+        if linha is None:
+            return None
+        duracoes, destinos, distancias = linha
+        fim = int(np.searchsorted(duracoes, limite, side='right'))
+        escolas = Escola.objects.in_bulk(destinos[:fim].tolist())
+        pares = [(escolas.get(d), duracoes[k], distancias[k])
+                 for k, d in enumerate(destinos[:fim].tolist())]
+    else:
+        candidatas = list(_escolas_roteaveis())
+        rotas = calculador_distancias.calcular_tabela(
+            [tuple(coords)], [(e.latitude, e.longitude) for e in candidatas])[0]
+        pares = sorted(
+            ((e, r['duracao_segundos'], r['distancia_metros'])
+             for e, r in zip(candidatas, rotas) if r and r['duracao_segundos'] <= limite),
+            key=lambda par: par[1],
+        )
+
+    return [
+        {
+            'escola': e.to_dict(),
+            'duracao_minutos': round(float(duracao) / 60, 1),
+            'distancia_km': round(float(distancia) / 1000, 2),
+        }
+        for e, duracao, distancia in pares if e is not None
+    ]
+
+
+# ==================== ROTEIRO DO DIA ====================
+
+# Estimativa usada quando o par não está na tabela nem no cache de rotas:
+# linha reta x fator de desvio das ruas, a uma velocidade média urbana
+FATOR_DESVIO_ESTIMATIVA = 1.4
+VELOCIDADE_ESTIMATIVA_KMH = 30
+
+
+def _duracao_estimada(origem, destino) -> float:
+    km = float(distancias_haversine_km(origem[0], origem[1], [destino[0]], [destino[1]])[0])
+    return km * FATOR_DESVIO_ESTIMATIVA / VELOCIDADE_ESTIMATIVA_KMH * 3600
+
+
+def matriz_duracoes(escolas, partida=None):
+    """
+    Tempos de viagem (segundos) entre escolas sem nenhuma requisição HTTP.
+
+    Usa a tabela DistanciaEscola, depois o cache de rotas e, por último,
+    uma estimativa pela distância em linha reta.
+
+    Args:
+        escolas: Escolas com coordenadas (pode haver repetidas)
+        partida: Escola ou tupla (latitude, longitude) do ponto de partida
+
+    Returns:
+        Tupla (duracoes, saida, estimados): matriz n x n, lista com o tempo da
+        partida até cada escola (None sem partida) e quantos pares foram estimados
+    """
+    partida_escola = partida if isinstance(partida, Escola) else None
+    ids = {e.pk for e in escolas}
+    if partida_escola is not None:
+        ids.add(partida_escola.pk)
+    tabela = {
+        (origem_id, destino_id): duracao
+        for origem_id, destino_id, duracao in DistanciaEscola.objects
+        .filter(origem_id__in=ids, destino_id__in=ids)
+        .values_list('origem_id', 'destino_id', 'duracao_segundos')
+    }
+    estimados = 0
+
+    def duracao(origem_id, origem, destino_id, destino):
+        nonlocal estimados
+        if origem_id is not None and origem_id == destino_id:
+            return 0.0
+        if (origem_id, destino_id) in tabela:
+            return tabela[(origem_id, destino_id)]
+        rota = cache_rotas.obter(origem, destino)
+        if rota is not None:
+            return rota['duracao_segundos']
+        estimados += 1
+        return _duracao_estimada(origem, destino)
+
+    coords = [(e.latitude, e.longitude) for e in escolas]
+    duracoes = [
+        [duracao(a.pk, coords[i], b.pk, coords[j]) for j, b in enumerate(escolas)]
+        for i, a in enumerate(escolas)
+    ]
+
+    saida = None
+    if partida is not None:
+        if partida_escola is not None:
+            partida_id, partida_coords = partida_escola.pk, (partida_escola.latitude,
+                                                             partida_escola.longitude)
+        else:
+            partida_id, partida_coords = None, tuple(partida)
+        saida = [duracao(partida_id, partida_coords, e.pk, coords[j])
+                 for j, e in enumerate(escolas)]
+
+    return duracoes, saida, estimados
+
+
+def matriz_duracoes_array(escolas):
+    """
+    Versão vetorizada de matriz_duracoes para muitas escolas (planejamento).
+
+    Parte da estimativa em linha reta para todos os pares e sobrescreve com
+    a tabela DistanciaEscola; não consulta o cache de rotas nem o OSRM.
+
+    Returns:
+        Tupla (duracoes, estimados): array NumPy n x n em segundos e quantos
+        pares ficaram com a estimativa
+    """
+    n = len(escolas)
+    lats = np.array([e.latitude for e in escolas], dtype=np.float64)
+    lons = np.array([e.longitude for e in escolas], dtype=np.float64)
+    km = distancias_haversine_km(lats[:, None], lons[:, None], lats, lons).reshape(n, n)
+    duracoes = km * FATOR_DESVIO_ESTIMATIVA / VELOCIDADE_ESTIMATIVA_KMH * 3600
+
+    posicao = {}
+    for i, escola in enumerate(escolas):
+        posicao.setdefault(escola.pk, []).append(i)
+    encontrados = np.zeros((n, n), dtype=bool)
+    for origem_id, destino_id, duracao in (
+            DistanciaEscola.objects
+            .filter(origem_id__in=posicao.keys(), destino_id__in=posicao.keys())
+            .values_list('origem_id', 'destino_id', 'duracao_segundos')):
+        linhas, colunas = posicao[origem_id], posicao[destino_id]
+        duracoes[np.ix_(linhas, colunas)] = duracao
+        encontrados[np.ix_(linhas, colunas)] = True
+
+    np.fill_diagonal(duracoes, 0.0)
+    np.fill_diagonal(encontrados, True)
+    return duracoes, int(n * n - encontrados.sum())
+
+
+def roteiro_eventos(eventos, partida=None):
+    """
+    Ordem de visitas com o menor tempo total de deslocamento.
+
+    Args:
+        eventos: Eventos de visita na ordem atual da agenda
+        partida: Escola ou tupla (latitude, longitude) de onde o dia começa
+
+    Returns:
+        Dicionário com o roteiro sugerido, os eventos sem localização e os
+        tempos total sugerido/atual em minutos
+    """
+    roteaveis = [e for e in eventos
+                 if e.escola is not None and e.escola.latitude is not None
+                 and e.escola.longitude is not None]
+    sem_localizacao = [e for e in eventos if e not in roteaveis]
+
+    duracoes, saida, estimados = matriz_duracoes([e.escola for e in roteaveis], partida)
+    resultado = otimizar_roteiro(duracoes, [e.turno for e in roteaveis], saida)
+    ordem = resultado['ordem']
+
+    roteiro = []
+    for posicao, i in enumerate(ordem):
+        if posicao > 0:
+            deslocamento = duracoes[ordem[posicao - 1]][i]
+        else:
+            deslocamento = saida[i] if saida is not None else 0.0
+        roteiro.append({
+            **roteaveis[i].to_dict(),
+            'ordem': posicao + 1,
+            'deslocamento_minutos': round(deslocamento / 60, 1),
+        })
+
+    atual = custo_roteiro(list(range(len(roteaveis))), duracoes, saida)
+    return {
+        'roteiro': roteiro,
+        'sem_localizacao': [e.to_dict() for e in sem_localizacao],
+        'duracao_total_minutos': round(resultado['duracao_total'] / 60, 1),
+        'duracao_atual_minutos': round(atual / 60, 1),
+        'metodo': resultado['metodo'],
+        'pares_estimados': estimados,
+    }
+
+
+# ==================== GEOMETRIA DOS TRAJETOS ====================
+
+# Máximo de pares por requisição de geometrias
+MAX_PARES_GEOMETRIA = 50
+
+
+def geometrias_escolas(pares):
+    """
+    Trajeto de carro entre pares de escolas, para desenhar no mapa.
+
+    A geometria de cada par é pedida ao OSRM só na primeira vez e depois
+    sai do cache de rotas.
+
+    Args:
+        pares: Lista de tuplas (origem_id, destino_id)
+
+    Returns:
+        Lista na mesma ordem com origem_id, destino_id, geometria (polyline
+        codificada ou None se a rota falhar ou alguma escola não tiver
+        coordenadas), distancia_km e duracao_minutos
+    """
+    ids = {i for par in pares for i in par}
+    coords = {
+        pk: (lat, lon)
+        for pk, lat, lon in Escola.objects.filter(pk__in=ids)
+        .exclude(latitude=None).exclude(longitude=None)
+        .values_list('pk', 'latitude', 'longitude')
+    }
+    roteaveis = [(o, d) for o, d in pares if o in coords and d in coords and o != d]
+    rotas = dict(zip(roteaveis, calculador_distancias.calcular_geometrias(
+        [(coords[o], coords[d]) for o, d in roteaveis])))
+
+    resultado = []
+    for origem_id, destino_id in pares:
+        rota = rotas.get((origem_id, destino_id)) or {}
+        resultado.append({
+            'origem_id': origem_id,
+            'destino_id': destino_id,
+            'geometria': rota.get('geometria'),
+            'distancia_km': rota.get('distancia_km'),
+            'duracao_minutos': rota.get('duracao_minutos'),
+        })
+    return resultado
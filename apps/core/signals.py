@@ -0,0 +1,97 @@
+"""
+Sinais do app core
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from .models import DistanciaEscola, Escola, VersaoDados
+from .recalculo import recalcular_escolas_em_segundo_plano
+from .rotas import _escolas_roteaveis, cache_rotas
+
+# Campos que alteram a posição da escola ou sua presença na tabela de distâncias
+_CAMPOS_ROTEAMENTO = ('latitude', 'longitude', 'ativo', 'bloco_1', 'origem')
+
+_local = threading.local()
+
+
+@contextmanager
+def recalculo_adiado():
+    """
+    Escolas salvas dentro do bloco não disparam o recálculo das distâncias
+    (ex.: init_db, que cria as escolas uma a uma e preenche a tabela no fim)
+    """
+    _local.adiado = True
+    try:
+        yield
+    finally:
+        _local.adiado = False
+
+
+@receiver(pre_save, sender=Escola)
+def guardar_estado_anterior(sender, instance, **kwargs):
+    """Guarda os campos de roteamento gravados no banco antes de salvar a escola"""
+    instance._estado_anterior = None
+    if instance.pk:
+        instance._estado_anterior = (
+            Escola.objects.filter(pk=instance.pk)
+            .values_list(*_CAMPOS_ROTEAMENTO)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Escola)
+def atualizar_rotas_escola(sender, instance, created, **kwargs):
+    """
+    Invalida rotas em cache quando a latitude/longitude da escola muda e
+    agenda o recálculo da linha/coluna da escola na tabela DistanciaEscola
+
+    As requisições ao OSRM rodam em outro processo (recalcular_matriz no
+    modo 'escolas'), nunca dentro do save.
+    """
+    anterior = getattr(instance, '_estado_anterior', None)
+    atual = tuple(getattr(instance, campo) for campo in _CAMPOS_ROTEAMENTO)
+    VersaoDados.incrementar('escolas')
+
+    movida = (anterior is not None and anterior[0] is not None and anterior[1] is not None
+              and anterior[:2] != atual[:2])
+    if movida:
+        cache_rotas.invalidar_ponto(anterior[:2])
+
+    if anterior == atual or (created and instance.latitude is None):
+        return
+
+    if anterior is not None:
+        # O save pode ter vindo com update_fields: grava à parte
+        instance.posicao_atualizada_em = now()
+        Escola.objects.filter(pk=instance.pk).update(posicao_atualizada_em=instance.posicao_atualizada_em)
+
+    roteavel = _escolas_roteaveis().filter(pk=instance.pk).exists()
+    if movida or not roteavel:
+        # As distâncias antigas deixam de valer (ou a escola saiu da tabela)
+        DistanciaEscola.objects.filter(Q(origem=instance) | Q(destino=instance)).delete()
+        VersaoDados.incrementar('distancias')
+
+    if not roteavel or getattr(_local, 'adiado', False):
+        return
+
+    def _recalcular():
+        try:
+            recalcular_escolas_em_segundo_plano([instance.pk])
+        except Exception as e:
+            print(f"Erro ao agendar o recálculo das distâncias da escola {instance.pk}: {e}")
+
+    transaction.on_commit(_recalcular)
+
+
+@receiver(post_delete, sender=Escola)
+def invalidar_rotas_escola_removida(sender, instance, **kwargs):
+    # Os pares da escola saem da tabela junto com ela (CASCADE)
+    VersaoDados.incrementar('escolas', 'distancias')
+    if instance.latitude is not None and instance.longitude is not None:
+        cache_rotas.invalidar_ponto((instance.latitude, instance.longitude))
@@ -0,0 +1,84 @@
+"""
+Execução de management commands em processos separados
+
+Usado pelas views que disparam trabalhos longos (recálculo da matriz,
+geocodificação): o worker web só inicia o processo e responde na hora.
+"""
+import os
+import subprocess
+import sys
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from django.conf import settings
+
+PASTA_LOGS = settings.BASE_DIR / 'data'
+
+
+def processo_ativo(pid) -> bool:
+    """O processo com este PID ainda existe nesta máquina"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def iniciar_comando(comando: str, *args) -> int:
+    """
+    Dispara `manage.py <comando> <args>` em segundo plano e retorna o PID
+
+    A saída vai para data/<comando>.log.
+    """
+    os.makedirs(PASTA_LOGS, exist_ok=True)
+    with open(PASTA_LOGS / f'{comando}.log', 'a', encoding='utf-8') as log:
+        processo = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), comando, *map(str, args)],
+            cwd=str(settings.BASE_DIR),
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    # Recolhe o processo quando ele terminar (sem deixar zumbi no worker)
+    threading.Thread(target=processo.wait, daemon=True).start()
+    return processo.pid
+
+
+@contextmanager
+def trava_exclusiva(nome: str):
+    """
+    Trava de arquivo entre processos (data/<nome>.lock), sem bloquear
+
+    Uso:
+        with trava_exclusiva('geocodificar_fila') as obtida:
+            if not obtida:
+                return  # outro processo já está executando
+    """
+    os.makedirs(PASTA_LOGS, exist_ok=True)
+    with open(PASTA_LOGS / f'{nome}.lock', 'a+') as arquivo:
+        try:
+            if fcntl:
+                fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                arquivo.seek(0)
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            if fcntl:
+                fcntl.flock(arquivo, fcntl.LOCK_UN)
+            else:
+                arquivo.seek(0)
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
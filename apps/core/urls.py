@@ -23,6 +23,12 @@ urlpatterns = [
     # API - Escolas
     path('api/escolas', views.api_escolas, name='api_escolas'),
     path('api/escolas/geocodificar', views.api_geocodificar_escolas, name='api_geocodificar_escolas'),
+    path('api/escolas/geocodificar/<int:lote_id>', views.api_geocodificacao_lote,
+         name='api_geocodificacao_lote'),
+    path('api/escolas/vizinhas', views.api_escolas_vizinhas, name='api_escolas_vizinhas'),
+    path('api/escolas/alcance', views.api_escolas_alcance, name='api_escolas_alcance'),
+    path('api/mapa/escolas.geojson', views.api_mapa_escolas_geojson, name='api_mapa_escolas_geojson'),
+    path('api/rotas/geometrias', views.api_rotas_geometrias, name='api_rotas_geometrias'),
     path('api/escolas/<int:escola_id>', views.api_escola_detail, name='api_escola_detail'),
     path('api/escolas/<int:escola_id>/proximas', views.api_escolas_proximas, name='api_escolas_proximas'),
 
@@ -32,6 +38,9 @@ urlpatterns = [
 
     # API - Distancias
     path('api/distancia', views.api_calcular_distancia, name='api_distancia'),
+    path('api/distancias/recalculos', views.api_recalculos_matriz, name='api_recalculos_matriz'),
+    path('api/distancias/recalculos/<int:recalculo_id>', views.api_recalculo_matriz_detail,
+         name='api_recalculo_matriz_detail'),
 
     # API - Estatisticas
     path('api/estatisticas', views.api_estatisticas, name='api_estatisticas'),
@@ -46,6 +55,9 @@ urlpatterns = [
     path('api/agenda/mes/estatisticas', views.api_agenda_mes_stats, name='api_agenda_mes_stats'),
     path('api/agenda/eventos', views.api_eventos, name='api_eventos'),
     path('api/agenda/eventos/executar-visita', views.api_executar_visita, name='api_executar_visita'),
+    path('api/agenda/otimizar-roteiro', views.api_otimizar_roteiro, name='api_otimizar_roteiro'),
+    path('api/agenda/planejar-mes', views.api_planejar_mes, name='api_planejar_mes'),
+    path('api/agenda/rascunhos', views.api_rascunhos_mes, name='api_rascunhos_mes'),
     path('api/agenda/eventos/<str:evento_id>', views.api_evento_detail, name='api_evento_detail'),
     path('api/agenda/eventos/<str:evento_id>/mover', views.api_mover_evento, name='api_mover_evento'),
     path('api/agenda/eventos/<str:evento_id>/executar', views.api_executar_evento, name='api_executar_evento'),
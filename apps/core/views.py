@@ -1,6 +1,7 @@
 """
 Views Django - Sistema de Gestão de Visitas às Escolas
 """
+import hashlib
 import json
 import os
 import shutil
@@ -18,12 +19,21 @@ from django.utils.timezone import now
 from django.conf import settings
 from werkzeug.utils import secure_filename
 
-from .models import Escola, Mediador, Visita, TurmaVisita, AnexoVisita, Evento, Usuario
-from distancias import CalculadorDistancias
+from .models import (
+    Escola, Mediador, Visita, TurmaVisita, AnexoVisita, Evento, Usuario, RecalculoMatriz, LoteGeocodificacao,
+)
+from .geocodificacao import criar_lote, geocodificar_por_cep, iniciar_worker
+from .mapa import escolas_geojson
+from .recalculo import (
+    criar_recalculo, em_execucao, iniciar_em_segundo_plano, recalculo_ativo, recalculo_interrompido,
+)
+from .planejador import planejar_mes, confirmar_rascunhos, descartar_rascunhos
+from .rotas import (
+    calculador_distancias, indice_escolas, obter_distancia, escolas_proximas_tabela,
+    roteiro_eventos, escolas_alcancaveis, geometrias_escolas, MAX_PARES_GEOMETRIA, escolas_ativas,
+)
 from relatorios import GeradorRelatorios
-from escolas import GerenciadorEscolas as _GerEscolas  # só para geocoding
 
-calculador_distancias = CalculadorDistancias()
 gerador_relatorios = GeradorRelatorios()
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf', 'doc', 'docx'}
@@ -40,20 +50,6 @@ def _bloco1_or_manual_qs():
     ).order_by('nome_oficial')
 
 
-def _obter_coords_escola(escola_obj):
-    """Geocodifica uma escola usando o módulo escolas.py"""
-    escola_dict = escola_obj.to_dict()
-    ge = _GerEscolas.__new__(_GerEscolas)
-    ge.escolas = []
-    coords = ge.obter_coordenadas(escola_dict)
-    if coords:
-        escola_obj.latitude = coords[0]
-        escola_obj.longitude = coords[1]
-        escola_obj.save(update_fields=['latitude', 'longitude'])
-        return True
-    return False
-
-
 # ==================== AUTENTICACAO ====================
 
 def login_view(request):
@@ -160,13 +156,14 @@ def relatorios_view(request):
 
 @login_required
 def mapa_view(request):
+    # Os marcadores vêm de /api/mapa/escolas.geojson; aqui só o necessário para o filtro
     escolas = list(
         Escola.objects.filter(bloco_1=True, ativo=True)
         .exclude(latitude=None).exclude(longitude=None)
         .order_by('nome_oficial')
+        .values('id', 'nome_usual', 'latitude', 'longitude')
     )
-    escolas_com_coords = [e.to_dict() for e in escolas]
-    return render(request, 'mapa.html', {'escolas': escolas_com_coords})
+    return render(request, 'mapa.html', {'escolas': escolas})
 
 
 @login_required
@@ -210,33 +207,48 @@ def api_escolas(request):
 
 @login_required
 def api_geocodificar_escolas(request):
+    """
+    Coloca as escolas ativas sem coordenadas na fila de geocodificação.
+
+    Escolas com CEP na tabela local recebem as coordenadas na hora; as
+    distâncias delas são calculadas por um recálculo da matriz em segundo
+    plano (disparado aqui se nenhum estiver rodando). As demais vão para a
+    fila: retorna 202 com o lote; o comando geocodificar_fila (disparado aqui
+    se não estiver rodando) grava as coordenadas de cada escola assim que são
+    encontradas. Acompanhe em /api/escolas/geocodificar/<id>.
+    """
     if request.method != 'POST':
         return JsonResponse({'erro': 'Método não permitido'}, status=405)
     try:
-        sem_coords = Escola.objects.filter(bloco_1=True, ativo=True).filter(
-            latitude__isnull=True
-        )
+        sem_coords = escolas_ativas().filter(latitude__isnull=True)
+        por_cep = geocodificar_por_cep(sem_coords.exclude(cep=''))
+        if por_cep and not recalculo_ativo():
+            iniciar_em_segundo_plano(criar_recalculo('desatualizadas'))
         if not sem_coords.exists():
-            return JsonResponse({'mensagem': 'Todas as escolas já possuem coordenadas', 'total': 0})
-
-        sucesso = 0
-        falha = 0
-        for escola in sem_coords:
-            if _obter_coords_escola(escola):
-                sucesso += 1
-            else:
-                falha += 1
-
-        return JsonResponse({
-            'mensagem': f'Geocodificação concluída: {sucesso} encontradas, {falha} não encontradas',
-            'sucesso': sucesso,
-            'falha': falha,
-            'total': sucesso + falha,
-        })
+            return JsonResponse({'mensagem': 'Todas as escolas já possuem coordenadas',
+                                 'total': 0, 'por_cep': por_cep})
+
+        lote = criar_lote(sem_coords, request.user.username)
+        if lote is None:
+            # Todas já aguardam em outro lote: devolve o mais recente pendente
+            lote = LoteGeocodificacao.objects.filter(
+                itens__status='pendente', itens__escola__in=sem_coords).order_by('-pk').first()
+            if lote is None:
+                # O worker terminou os itens entre as duas consultas
+                return JsonResponse({'mensagem': 'Nenhuma escola aguardando geocodificação',
+                                     'total': 0, 'por_cep': por_cep})
+        iniciar_worker()
+        return JsonResponse({**lote.to_dict(), 'por_cep': por_cep}, status=202)
     except Exception as e:
         return JsonResponse({'erro': str(e)}, status=500)
 
 
+@login_required
+def api_geocodificacao_lote(request, lote_id):
+    lote = get_object_or_404(LoteGeocodificacao, pk=lote_id)
+    return JsonResponse(lote.to_dict())
+
+
 @login_required
 def api_escola_detail(request, escola_id):
     try:
@@ -286,15 +298,205 @@ def api_escolas_proximas(request, escola_id):
             return JsonResponse({'erro': 'Escola sem coordenadas'}, status=400)
 
         limite = int(request.GET.get('limite', 5))
-        escolas_bloco1 = [e.to_dict() for e in Escola.objects.filter(bloco_1=True, ativo=True)]
-        proximas = calculador_distancias.encontrar_escolas_proximas(
-            escola_ref.to_dict(), escolas_bloco1, limite
-        )
+        proximas = escolas_proximas_tabela(escola_ref, limite)
+        if proximas is None:
+            escolas_bloco1 = [e.to_dict() for e in Escola.objects.filter(bloco_1=True, ativo=True)]
+            proximas = calculador_distancias.encontrar_escolas_proximas(
+                escola_ref.to_dict(), escolas_bloco1, limite
+            )
         return JsonResponse(proximas, safe=False)
     except Exception as e:
         return JsonResponse({'erro': str(e)}, status=500)
 
 
+@login_required
+def api_escolas_vizinhas(request):
+    """
+    Escolas mais próximas em linha reta (índice espacial, sem OSRM).
+
+    Referência: ?escola_id=<id> ou ?lat=<lat>&lon=<lon>
+    Filtro: ?k=<n> (padrão 5) ou ?raio_km=<km>
+    """
+    try:
+        indice = indice_escolas()
+        excluir = []
+
+        if request.GET.get('escola_id'):
+            escola_id = int(request.GET['escola_id'])
+            escola_ref = indice.obter(escola_id)
+            if escola_ref is None:
+                return JsonResponse({'erro': 'Escola não encontrada ou sem coordenadas'}, status=404)
+            lat, lon = escola_ref['latitude'], escola_ref['longitude']
+            excluir = [escola_id]
+        elif request.GET.get('lat') and request.GET.get('lon'):
+            lat, lon = float(request.GET['lat']), float(request.GET['lon'])
+        else:
+            return JsonResponse({'erro': 'Informe escola_id ou lat/lon'}, status=400)
+
+        if request.GET.get('raio_km'):
+            vizinhas = indice.dentro_do_raio(lat, lon, float(request.GET['raio_km']), excluir)
+        else:
+            vizinhas = indice.k_proximos(lat, lon, int(request.GET.get('k', 5)), excluir)
+
+        return JsonResponse([
+            {'escola': escola, 'distancia_linha_reta_km': distancia}
+            for escola, distancia in vizinhas
+        ], safe=False)
+    except ValueError:
+        return JsonResponse({'erro': 'Parâmetros inválidos'}, status=400)
+    except Exception as e:
+        return JsonResponse({'erro': str(e)}, status=500)
+
+
+@login_required
+def api_escolas_alcance(request):
+    """
+    Escolas que podem ser alcançadas de carro dentro de um tempo.
+
+    Referência: ?escola_id=<id> ou ?lat=<lat>&lon=<lon>
+    Tempo: ?minutos=<n> (padrão 15)
+    """
+    try:
+        minutos = float(request.GET.get('minutos', 15))
+
+        if request.GET.get('escola_id'):
+            escola_ref = get_object_or_404(Escola, pk=int(request.GET['escola_id']))
+            if escola_ref.latitude is None:
+                return JsonResponse({'erro': 'Escola sem coordenadas'}, status=400)
+            alcancaveis = escolas_alcancaveis(minutos, escola=escola_ref)
+            if alcancaveis is None:
+                # Escola ainda sem linha na tabela pré-calculada
+                alcancaveis = escolas_alcancaveis(
+                    minutos, coords=(escola_ref.latitude, escola_ref.longitude))
+                alcancaveis = [a for a in alcancaveis if a['escola']['id'] != escola_ref.pk]
+        elif request.GET.get('lat') and request.GET.get('lon'):
+            coords = (float(request.GET['lat']), float(request.GET['lon']))
+            alcancaveis = escolas_alcancaveis(minutos, coords=coords)
+        else:
+            return JsonResponse({'erro': 'Informe escola_id ou lat/lon'}, status=400)
+
+        return JsonResponse(alcancaveis, safe=False)
+    except ValueError:
+        return JsonResponse({'erro': 'Parâmetros inválidos'}, status=400)
+    except Exception as e:
+        return JsonResponse({'erro': str(e)}, status=500)
+
+
+@login_required
+def api_mapa_escolas_geojson(request):
+    """
+    Escolas do mapa em GeoJSON.
+
+    ?bbox=<min_lon>,<min_lat>,<max_lon>,<max_lat>  recorte visível
+    ?zoom=<n>      abaixo de 14 as escolas são agrupadas em grade
+    ?visitas=1     inclui última visita e total de visitas
+    ?todas=1       inclui escolas fora do Bloco 1
+
+    A resposta leva um ETag com a versão dos dados (escolas e visitas).
+    """
+    try:
+        bbox = None
+        if request.GET.get('bbox'):
+            bbox = tuple(float(v) for v in request.GET['bbox'].split(','))
+            if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+                raise ValueError
+        zoom = int(request.GET['zoom']) if request.GET.get('zoom') else None
+        todas = request.GET.get('todas') == '1'
+        visitas = request.GET.get('visitas') == '1'
+    except ValueError:
+        return JsonResponse({'erro': 'Parâmetros inválidos'}, status=400)
+
+    try:
+        versao, corpo = escolas_geojson(bbox, zoom, todas=todas, visitas=visitas)
+    except Exception as e:
+        return JsonResponse({'erro': str(e)}, status=500)
+
+    etag = '"%s"' % hashlib.sha1(repr((versao, request.GET.urlencode())).encode()).hexdigest()
+    if request.headers.get('If-None-Match') == etag:
+        resposta = HttpResponse(status=304)
+    else:
+        resposta = HttpResponse(corpo, content_type='application/geo+json')
+    resposta['ETag'] = etag
+    resposta['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+
+@login_required
+def api_rotas_geometrias(request):
+    """
+    Trajetos de carro entre escolas em polyline codificada (precisão 5).
+
+    Corpo JSON: {"pares": [[origem_id, destino_id], ...]} ou
+    {"escolas": [id1, id2, ...]} para os trechos consecutivos de um roteiro.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'erro': 'Método não permitido'}, status=405)
+    try:
+        data = json.loads(request.body or '{}')
+        if data.get('pares'):
+            pares = [(int(o), int(d)) for o, d in data['pares']]
+        elif data.get('escolas'):
+            ids = [int(i) for i in data['escolas']]
+            pares = list(zip(ids, ids[1:]))
+        else:
+            return JsonResponse({'erro': 'Informe pares ou escolas'}, status=400)
+        if len(pares) > MAX_PARES_GEOMETRIA:
+            return JsonResponse({'erro': f'Máximo de {MAX_PARES_GEOMETRIA} pares por requisição'},
+                                status=400)
+
+        return JsonResponse(geometrias_escolas(pares), safe=False)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'erro': str(e)}, status=500)
+
+
+def _recalculo_to_dict(recalculo):
+    return {**recalculo.to_dict(), 'em_execucao': em_execucao(recalculo)}
+
+
+@login_required
+def api_recalculos_matriz(request):
+    """
+    Recálculo da tabela de distâncias em segundo plano.
+
+    GET: últimos recálculos.
+    POST {"modo": "completo"|"desatualizadas"} inicia um recálculo, ou
+    {"retomar": true} continua o último interrompido. Retorna 202 com o
+    registro para acompanhar em /api/distancias/recalculos/<id>.
+    """
+    if request.method == 'GET':
+        recalculos = RecalculoMatriz.objects.all()[:10]
+        return JsonResponse([_recalculo_to_dict(r) for r in recalculos], safe=False)
+
+    if request.method != 'POST':
+        return JsonResponse({'erro': 'Método não permitido'}, status=405)
+    try:
+        data = json.loads(request.body or '{}')
+        ativo = recalculo_ativo()
+        if ativo:
+            return JsonResponse({'erro': 'Já existe um recálculo em execução',
+                                 'recalculo': _recalculo_to_dict(ativo)}, status=409)
+
+        recalculo = recalculo_interrompido() if data.get('retomar') else None
+        if recalculo is None:
+            recalculo = criar_recalculo(data.get('modo', 'desatualizadas'))
+        recalculo.status = 'pendente'
+        recalculo.save()
+        iniciar_em_segundo_plano(recalculo)
+        return JsonResponse(_recalculo_to_dict(recalculo), status=202)
+    except ValueError as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'erro': str(e)}, status=500)
+
+
+@login_required
+def api_recalculo_matriz_detail(request, recalculo_id):
+    recalculo = get_object_or_404(RecalculoMatriz, pk=recalculo_id)
+    return JsonResponse(_recalculo_to_dict(recalculo))
+
+
 # ==================== API - VISITAS ====================
 
 @login_required
@@ -380,7 +582,7 @@ def api_calcular_distancia(request):
         if escola1.latitude is None or escola2.latitude is None:
             return JsonResponse({'erro': 'Uma ou mais escolas sem coordenadas'}, status=400)
 
-        rota = calculador_distancias.calcular_distancia(
+        rota = obter_distancia(escola1.pk, escola2.pk) or calculador_distancias.calcular_distancia(
             (escola1.latitude, escola1.longitude),
             (escola2.latitude, escola2.longitude),
         )
@@ -486,8 +688,8 @@ def api_folha_oficinas(request):
 
 # ==================== API - AGENDA/EVENTOS ====================
 
-def _evento_to_dict_semana(data_str):
-    """Retorna lista de eventos de um dia, ordenados por turno: integral→manhã→tarde→sem turno."""
+def _eventos_dia(data_str):
+    """Eventos de um dia, ordenados por turno: integral→manhã→tarde→sem turno."""
     # Hora virtual para ordenação quando hora_inicio não está preenchida
     _HORA = {
         'integral':    dtime(7, 0),
@@ -495,7 +697,7 @@ def _evento_to_dict_semana(data_str):
         'tarde':       dtime(13, 0),
         'sem_turno':   dtime(23, 59),
     }
-    eventos = (
+    return (
         Evento.objects
         .filter(data=data_str)
         .annotate(
@@ -510,7 +712,11 @@ def _evento_to_dict_semana(data_str):
         )
         .order_by('hora_ord', 'titulo')
     )
-    return [e.to_dict() for e in eventos]
+
+
+def _evento_to_dict_semana(data_str):
+    """Retorna lista de eventos de um dia, ordenados por turno: integral→manhã→tarde→sem turno."""
+    return [e.to_dict() for e in _eventos_dia(data_str)]
 
 
 @login_required
@@ -586,7 +792,7 @@ def api_agenda_mes_stats(request):
     qs = Evento.objects.filter(data__year=ano, data__month=mes)
     total = qs.count()
     por_tipo = {}
-    por_status = {'planejado': 0, 'executado': 0, 'cancelado': 0}
+    por_status = {'rascunho': 0, 'planejado': 0, 'executado': 0, 'cancelado': 0}
 
     for e in qs:
         por_tipo[e.tipo] = por_tipo.get(e.tipo, 0) + 1
@@ -716,6 +922,90 @@ def api_mover_evento(request, evento_id):
         return JsonResponse({'erro': str(e)}, status=500)
 
 
+@login_required
+def api_otimizar_roteiro(request):
+    """
+    Sugere a ordem das visitas de um dia com o menor tempo de deslocamento.
+
+    Corpo JSON: {"data": "AAAA-MM-DD"} ou {"eventos": [ids]}, e opcionalmente
+    "partida_escola_id" ou "partida_latitude"/"partida_longitude".
+    """
+    if request.method != 'POST':
+        return JsonResponse({'erro': 'Método não permitido'}, status=405)
+    try:
+        data = json.loads(request.body or '{}')
+
+        if data.get('eventos'):
+            ids = [int(i) for i in data['eventos']]
+            por_id = {e.pk: e for e in Evento.objects.filter(pk__in=ids).select_related('escola')}
+            eventos = [por_id[i] for i in ids if i in por_id]
+        elif data.get('data'):
+            eventos = list(_eventos_dia(data['data']).select_related('escola'))
+        else:
+            return JsonResponse({'erro': 'Informe data ou eventos'}, status=400)
+        eventos = [e for e in eventos if e.tipo == 'visita' and e.status != 'cancelado']
+
+        partida = None
+        if data.get('partida_escola_id'):
+            partida = Escola.objects.filter(pk=data['partida_escola_id']) \
+                .exclude(latitude=None).exclude(longitude=None).first()
+        elif data.get('partida_latitude') is not None and data.get('partida_longitude') is not None:
+            partida = (float(data['partida_latitude']), float(data['partida_longitude']))
+
+        return JsonResponse(roteiro_eventos(eventos, partida))
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'erro': str(e)}, status=500)
+
+
+@login_required
+def api_planejar_mes(request):
+    """
+    Gera visitas em rascunho para o mês agrupando escolas próximas por dia.
+
+    Corpo JSON: {"ano", "mes", "max_por_dia" (padrão 4), "max_por_turno" (padrão 2)}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'erro': 'Método não permitido'}, status=405)
+    try:
+        data = json.loads(request.body or '{}')
+        hoje = datetime.now()
+        ano = int(data.get('ano') or hoje.year)
+        mes = int(data.get('mes') or hoje.month)
+        max_por_dia = int(data.get('max_por_dia') or 4)
+        max_por_turno = int(data.get('max_por_turno') or 2)
+        if not 1 <= mes <= 12 or max_por_dia < 1 or max_por_turno < 1:
+            return JsonResponse({'erro': 'Parâmetros inválidos'}, status=400)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+
+    try:
+        return JsonResponse(planejar_mes(ano, mes, max_por_dia, max_por_turno), status=201)
+    except Exception as e:
+        return JsonResponse({'erro': str(e)}, status=500)
+
+
+@login_required
+def api_rascunhos_mes(request):
+    """Confirma (POST) ou descarta (DELETE) os rascunhos de visita do mês"""
+    try:
+        data = json.loads(request.body or '{}')
+        ano = int(data.get('ano') or request.GET.get('ano'))
+        mes = int(data.get('mes') or request.GET.get('mes'))
+    except (ValueError, TypeError):
+        return JsonResponse({'erro': 'Informe ano e mes'}, status=400)
+
+    if request.method == 'POST':
+        total = confirmar_rascunhos(ano, mes)
+        return JsonResponse({'mensagem': f'{total} visitas confirmadas', 'total': total})
+    elif request.method == 'DELETE':
+        total = descartar_rascunhos(ano, mes)
+        return JsonResponse({'mensagem': f'{total} rascunhos removidos', 'total': total})
+
+    return JsonResponse({'erro': 'Método não permitido'}, status=405)
+
+
 @login_required
 def api_executar_evento(request, evento_id):
     if request.method != 'POST':
@@ -0,0 +1,190 @@
+"""
+Módulo de armazenamento dos arquivos JSON compartilhados entre processos
+
+Sob o gunicorn cada worker tem a sua cópia dos gerenciadores (escolas,
+visitas, agenda, usuários, mediadores) apontando para os mesmos arquivos.
+ArmazenamentoJSON cuida de três coisas:
+
+- recarga barata: a assinatura do arquivo (mtime, tamanho, inode) lido por
+  último é guardada e alterado() só faz um os.stat, então o arquivo só é
+  relido quando outro processo o trocou;
+- trava de arquivo (fcntl/msvcrt em <arquivo>.lock) em volta de
+  ler-alterar-gravar, para que dois workers não sobrescrevam um ao outro;
+- gravação atômica: arquivo temporário na mesma pasta + os.replace, então
+  quem lê vê o arquivo antigo inteiro ou o novo inteiro.
+
+O conteúdo é codificado por formato_snapshot (JSON compacto ou o formato
+binário com campos de texto adiados); o formato em disco é detectado na
+leitura e mantido nas gravações, a menos que outro seja pedido.
+"""
+import os
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+import formato_snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def assinatura_arquivo(caminho: str) -> Optional[Tuple[int, int, int]]:
+    """(mtime_ns, tamanho, inode) do arquivo ou None se ele não existir"""
+    try:
+        st = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _assinatura_fd(fd: int) -> Tuple[int, int, int]:
+    st = os.fstat(fd)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class ArmazenamentoJSON:
+    def __init__(self, arquivo: str, padrao: Callable[[], Any] = list, indent: Optional[int] = None,
+                 formato: Optional[str] = None, campos_adiados: Iterable[str] = ()):
+        """
+        Arquivo JSON compartilhado
+
+        Args:
+            arquivo: Caminho do arquivo
+            padrao: Fábrica do conteúdo quando o arquivo não existe
+            indent: Indentação usada ao gravar em JSON (None = compacto)
+            formato: 'json' ou 'binario'; None mantém o formato em disco
+                     (arquivos novos: formato_snapshot.FORMATO_PADRAO)
+            campos_adiados: Campos de texto decodificados só no primeiro
+                            acesso (formato binário)
+        """
+        self.arquivo = arquivo
+        self.arquivo_trava = arquivo + '.lock'
+        self.padrao = padrao
+        self.indent = indent
+        self.formato = formato
+        self.campos_adiados = tuple(campos_adiados)
+        self.formato_em_disco = None
+        self._assinatura = None
+
+        # Profundidade da trava por instância: métodos que já estão dentro de
+        # trava() podem chamar outros que também a pedem
+        self._lock = threading.RLock()
+        self._profundidade = 0
+        self._arquivo_trava = None
+
+    # ------------------------------------------------------------------
+    # Trava entre processos
+
+    @contextmanager
+    def trava(self):
+        """Trava exclusiva (bloqueante) do arquivo entre processos e threads"""
+        with self._lock:
+            if self._profundidade == 0:
+                pasta = os.path.dirname(self.arquivo_trava)
+                if pasta:
+                    os.makedirs(pasta, exist_ok=True)
+                arquivo = open(self.arquivo_trava, 'a+')
+                try:
+                    if fcntl:
+                        fcntl.flock(arquivo, fcntl.LOCK_EX)
+                    else:
+                        arquivo.seek(0)
+                        msvcrt.locking(arquivo.fileno(), msvcrt.LK_LOCK, 1)
+                except OSError:
+                    arquivo.close()
+                    raise
+                self._arquivo_trava = arquivo
+            self._profundidade += 1
+            try:
+                yield
+            finally:
+                self._profundidade -= 1
+                if self._profundidade == 0:
+                    arquivo, self._arquivo_trava = self._arquivo_trava, None
+                    if fcntl:
+                        fcntl.flock(arquivo, fcntl.LOCK_UN)
+                    else:
+                        arquivo.seek(0)
+                        msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+                    arquivo.close()
+
+    # ------------------------------------------------------------------
+    # Leitura / gravação
+
+    def existe(self) -> bool:
+        return os.path.exists(self.arquivo)
+
+    def alterado(self) -> bool:
+        """O arquivo mudou desde a última leitura/gravação deste processo"""
+        return self._assinatura is None or assinatura_arquivo(self.arquivo) != self._assinatura
+
+    def ler(self) -> Any:
+        """
+        Lê o arquivo e guarda a assinatura do que foi lido
+
+        Raises:
+            ValueError: arquivo corrompido (json.JSONDecodeError e
+                        orjson.JSONDecodeError são subclasses)
+        """
+        try:
+            with open(self.arquivo, 'rb') as f:
+                # fstat do arquivo aberto: se ele for trocado entre o stat e a
+                # leitura, a assinatura continua sendo a do conteúdo lido
+                assinatura = _assinatura_fd(f.fileno())
+                conteudo = f.read()
+        except FileNotFoundError:
+            self._assinatura = None
+            return self.padrao()
+        self.formato_em_disco = formato_snapshot.detectar_formato(conteudo)
+        dados = formato_snapshot.decodificar(conteudo)
+        self._assinatura = assinatura
+        return dados
+
+    def formato_gravacao(self) -> str:
+        return self.formato or self.formato_em_disco or formato_snapshot.FORMATO_PADRAO
+
+    def gravar(self, dados: Any):
+        """Grava o conteúdo inteiro (temporário + os.replace), sob a trava"""
+        formato = self.formato_gravacao()
+        conteudo = formato_snapshot.codificar(dados, formato, self.campos_adiados, self.indent)
+        pasta = os.path.dirname(self.arquivo) or '.'
+        os.makedirs(pasta, exist_ok=True)
+        with self.trava():
+            fd, temporario = tempfile.mkstemp(prefix=os.path.basename(self.arquivo) + '.', suffix='.tmp', dir=pasta)
+            try:
+                # mkstemp cria com 0600: mantém as permissões do arquivo atual
+                try:
+                    os.chmod(temporario, stat.S_IMODE(os.stat(self.arquivo).st_mode))
+                except FileNotFoundError:
+                    os.chmod(temporario, 0o644)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(conteudo)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temporario, self.arquivo)
+            except BaseException:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+                raise
+            self._assinatura = assinatura_arquivo(self.arquivo)
+            self.formato_em_disco = formato
+
+    def converter(self, formato: str) -> int:
+        """
+        Regrava o arquivo em outro formato ('json' ou 'binario'), sob a trava
+
+        Returns:
+            Tamanho do arquivo gravado (bytes)
+        """
+        if formato not in formato_snapshot.FORMATOS:
+            raise ValueError(f"Formato de snapshot inválido: {formato}")
+        with self.trava():
+            dados = self.ler()
+            self.formato = formato
+            self.gravar(dados)
+        return os.path.getsize(self.arquivo)
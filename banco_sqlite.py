@@ -0,0 +1,165 @@
+"""
+Módulo de acesso ao banco SQLite do Django pelos gerenciadores legados
+
+Com ARMAZENAMENTO_LEGADO=sqlite, app.py e main.py usam as versões SQL dos
+gerenciadores (GerenciadorEscolasSQL, GerenciadorVisitasSQL,
+GerenciadorPlanejamentosSQL e GerenciadorUsuariosSQL), que leem e gravam
+direto nas tabelas de apps/core/models.py em data/db.sqlite3 — a mesma
+fonte de dados do Django — em vez dos arquivos JSON de data/.
+
+O esquema é do Django (python manage.py migrate / init_db); aqui ele só é
+usado. O que o ORM faria em Python é feito pelos gerenciadores: datas e
+horas no formato do backend SQLite do Django (UTC), on_delete das chaves
+estrangeiras nas exclusões. Sinais do Django (pre_save/post_save) não
+disparam.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Optional
+
+# 'json' (arquivos de data/) ou 'sqlite' (banco do Django)
+ARMAZENAMENTO_LEGADO = os.environ.get('ARMAZENAMENTO_LEGADO', 'json')
+
+BANCO_PADRAO = os.environ.get(
+    'BANCO_SQLITE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'db.sqlite3'),
+)
+
+# Parâmetros por consulta em "IN (...)" (o SQLite antigo limita a 999)
+TAMANHO_LOTE = 500
+
+
+def agora_utc() -> str:
+    """Agora, como o Django grava DateTimeField no SQLite com USE_TZ (UTC, sem fuso)"""
+    return str(datetime.now(timezone.utc).replace(tzinfo=None))
+
+
+def de_utc(valor: Optional[str]) -> Optional[str]:
+    """DateTimeField gravado pelo Django -> isoformat na hora local, como nos JSON"""
+    if not valor:
+        return None
+    try:
+        dt = datetime.fromisoformat(valor)
+    except ValueError:
+        return valor
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone().replace(tzinfo=None).isoformat()
+
+
+def lotes(valores: List, tamanho: int = TAMANHO_LOTE) -> Iterator[List]:
+    """Fatia uma lista para consultas com "IN (...)" """
+    for i in range(0, len(valores), tamanho):
+        yield valores[i:i + tamanho]
+
+
+def marcadores(quantidade: int) -> str:
+    """'?, ?, ?' para "IN (...)" """
+    return ', '.join('?' * quantidade)
+
+
+class BancoSQLite:
+    def __init__(self, arquivo: str = BANCO_PADRAO):
+        """
+        Banco SQLite compartilhado com o Django
+
+        Args:
+            arquivo: Caminho do banco (o mesmo de DATABASES['default'])
+        """
+        self.arquivo = arquivo
+        self._local = threading.local()
+
+    def conexao(self) -> sqlite3.Connection:
+        """Retorna a conexão SQLite da thread/processo atual"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Sem criar o arquivo: o banco vem do migrate do Django
+            if not os.path.exists(self.arquivo):
+                raise RuntimeError(f"Banco não encontrado: {self.arquivo} "
+                                   "(rode python manage.py migrate e python manage.py init_db)")
+            conn = sqlite3.connect(self.arquivo, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.profundidade = 0
+        return conn
+
+    def executar(self, sql: str, parametros: Iterable = ()) -> sqlite3.Cursor:
+        return self.conexao().execute(sql, tuple(parametros))
+
+    def consultar(self, sql: str, parametros: Iterable = ()) -> List[sqlite3.Row]:
+        return self.executar(sql, parametros).fetchall()
+
+    def consultar_um(self, sql: str, parametros: Iterable = ()) -> Optional[sqlite3.Row]:
+        return self.executar(sql, parametros).fetchone()
+
+    @contextmanager
+    def transacao(self):
+        """
+        Transação de escrita (BEGIN IMMEDIATE: a trava de escrita é pega no
+        início, então ler-alterar-gravar não é intercalado com outro processo)
+
+        Reentrante na mesma thread: só a transação mais externa faz COMMIT.
+        """
+        conn = self.conexao()
+        if self._local.profundidade:
+            self._local.profundidade += 1
+            try:
+                yield conn
+            finally:
+                self._local.profundidade -= 1
+            return
+
+        conn.execute('BEGIN IMMEDIATE')
+        self._local.profundidade = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+        finally:
+            self._local.profundidade = 0
+
+    def existe(self, tabela: str, pk) -> bool:
+        """Há uma linha com essa chave primária (para não gravar chave estrangeira órfã)"""
+        return pk is not None and self.consultar_um(
+            f'SELECT 1 FROM {tabela} WHERE id = ?', (pk,)) is not None
+
+    def versao(self) -> tuple:
+        """
+        Muda sempre que o banco é alterado (por esta conexão ou por outra):
+        permite manter caches em memória sem reconsultar a cada acesso
+        """
+        conn = self.conexao()
+        return (threading.get_ident(), id(conn),
+                conn.execute('PRAGMA data_version').fetchone()[0], conn.total_changes)
+
+    def verificar_tabelas(self, *tabelas: str):
+        """
+        Raises:
+            RuntimeError: alguma tabela não existe (banco sem as migrações do Django)
+        """
+        existentes = {linha[0] for linha in self.consultar(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        faltando = [t for t in tabelas if t not in existentes]
+        if faltando:
+            raise RuntimeError(f"Tabelas ausentes em {self.arquivo}: {', '.join(faltando)} "
+                               "(rode python manage.py migrate e python manage.py init_db)")
+
+
+_bancos = {}
+_bancos_lock = threading.Lock()
+
+
+def obter_banco(arquivo: str = BANCO_PADRAO) -> BancoSQLite:
+    """BancoSQLite compartilhado do processo para o arquivo"""
+    with _bancos_lock:
+        if arquivo not in _bancos:
+            _bancos[arquivo] = BancoSQLite(arquivo)
+        return _bancos[arquivo]
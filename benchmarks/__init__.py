@@ -0,0 +1,3 @@
+"""
+Benchmarks de roteamento e geocodificação (python -m benchmarks)
+"""
@@ -0,0 +1,90 @@
+"""
+Benchmark de roteamento e geocodificação sem acessar servidores públicos
+
+Uso:
+    python -m benchmarks
+    python -m benchmarks --escolas 20 200 --cenarios matriz proximas
+    python -m benchmarks --latencia 0.05 --taxa-erro 0.02 --modo rota --concorrencia 1
+    python -m benchmarks --json resultados.json
+
+Sobe um servidor local (ServidorStub) que imita OSRM e Nominatim e mede
+cada cenário: tempo total, requisições, taxa de acerto do cache de rotas e
+latência p50/p95 das requisições.
+"""
+import argparse
+import json
+import sys
+import tempfile
+
+from tabulate import tabulate
+
+from benchmarks.cenarios import cenario_geocodificacao, cenario_matriz, cenario_proximas
+from benchmarks.servidor_stub import ServidorStub
+
+CENARIOS = ('matriz', 'proximas', 'geocodificacao')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.split('\n')[1])
+    parser.add_argument('--escolas', type=int, nargs='+', default=[20, 200, 2000],
+                        help='Quantidades de escolas (padrão: 20 200 2000)')
+    parser.add_argument('--cenarios', nargs='+', choices=CENARIOS, default=list(CENARIOS))
+    parser.add_argument('--modo', choices=('tabela', 'rota'), default='tabela',
+                        help='Modo da matriz (serviço /table ou /route por par)')
+    parser.add_argument('--concorrencia', type=int, default=4,
+                        help='Requisições simultâneas ao OSRM')
+    parser.add_argument('--latencia', type=float, default=0.02, help='Latência base do stub (s)')
+    parser.add_argument('--variacao', type=float, default=0.01, help='Latência extra aleatória (s)')
+    parser.add_argument('--taxa-erro', type=float, default=0.0, help='Fração de respostas HTTP 503')
+    parser.add_argument('--consultas', type=int, default=50,
+                        help='Consultas de escolas próximas por tamanho')
+    parser.add_argument('--max-matriz', type=int, default=500,
+                        help='Maior número de escolas no cenário de matriz '
+                             '(a matriz completa cresce com N²)')
+    parser.add_argument('--max-rota', type=int, default=200,
+                        help='Maior número de escolas no modo rota (N² requisições)')
+    parser.add_argument('--json', help='Grava os resultados neste arquivo')
+    parser.add_argument('-v', '--verboso', action='store_true',
+                        help='Mostra o progresso impresso pelos módulos')
+    args = parser.parse_args(argv)
+
+    pasta = tempfile.mkdtemp(prefix='bench_')
+    resultados = []
+
+    with ServidorStub(args.latencia, args.variacao, args.taxa_erro) as stub:
+        print(f"Servidor stub em {stub.url} (latência {args.latencia}s, "
+              f"erro {args.taxa_erro:.0%})\n")
+
+        for quantidade in args.escolas:
+            if 'matriz' in args.cenarios:
+                limite = args.max_rota if args.modo == 'rota' else args.max_matriz
+                if quantidade > limite:
+                    print(f"- matriz com {quantidade} escolas pulada (limite {limite}, "
+                          f"ajuste com --max-matriz/--max-rota)")
+                else:
+                    resultados += cenario_matriz(stub, quantidade, args.modo,
+                                                 args.concorrencia, pasta, args.verboso)
+            if 'proximas' in args.cenarios:
+                resultados += cenario_proximas(stub, quantidade, args.consultas,
+                                               args.concorrencia, pasta, args.verboso)
+            if 'geocodificacao' in args.cenarios:
+                resultados += cenario_geocodificacao(stub, quantidade, pasta, args.verboso)
+
+    colunas = ['cenario', 'escolas', 'modo', 'tempo_s', 'requisicoes', 'erros_http',
+               'taxa_acerto_cache', 'p50_ms', 'p95_ms']
+    print()
+    print(tabulate([[r.get(c) for c in colunas] for r in resultados],
+                   headers=['Cenário', 'Escolas', 'Modo', 'Tempo (s)', 'Requisições',
+                            'Erros HTTP', 'Acerto cache', 'p50 (ms)', 'p95 (ms)'],
+                   tablefmt='simple'))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ Resultados salvos em: {args.json}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Cenários de benchmark: matriz de distâncias, escolas próximas e geocodificação
+
+Cada cenário roda contra o ServidorStub e devolve um dicionário com tempo
+total, requisições, taxa de acerto do cache e latências p50/p95 medidas
+no cliente.
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+import escolas as modulo_escolas
+from cache_geocodificacao import CacheGeocodificacao
+from cache_persistente import CacheRotas
+from distancias import CalculadorDistancias
+from escolas import GerenciadorEscolas
+from http_cliente import ClienteHTTP
+
+# Região aproximada de Taubaté usada para sortear as escolas
+LATITUDES = (-23.08, -22.96)
+LONGITUDES = (-45.62, -45.48)
+
+# ID inicial das escolas sintéticas (evita colidir com ESCOLAS_TAUBATE)
+ID_INICIAL = 100_000
+
+
+class ClienteMedido(ClienteHTTP):
+    """ClienteHTTP que registra a latência de cada chamada"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencias = []
+        self._lock_latencias = threading.Lock()
+
+    def get_json(self, url, params=None, timeout_leitura=None):
+        inicio = time.perf_counter()
+        try:
+            return super().get_json(url, params=params, timeout_leitura=timeout_leitura)
+        finally:
+            with self._lock_latencias:
+                self.latencias.append(time.perf_counter() - inicio)
+
+
+class GerenciadorEscolasBenchmark(GerenciadorEscolas):
+    """GerenciadorEscolas usando um cliente Nominatim medido e um cache de geocodificação próprio"""
+
+    def __init__(self, arquivo_dados: str, cliente: ClienteHTTP, cache: CacheGeocodificacao):
+        self._cliente = cliente
+        self._cache = cache
+        super().__init__(arquivo_dados)
+
+    @property
+    def cliente_http(self) -> ClienteHTTP:
+        return self._cliente
+
+    @property
+    def cache_geocodificacao(self) -> CacheGeocodificacao:
+        return self._cache
+
+
+def gerar_escolas(quantidade: int, semente: int = 0, com_coordenadas: bool = True) -> List[Dict]:
+    """Escolas sintéticas espalhadas pela região da cidade"""
+    rng = random.Random(semente)
+    escolas = []
+    for i in range(quantidade):
+        escola = {
+            'id': ID_INICIAL + i,
+            'nome_oficial': f"EMEF Escola Sintética {i}",
+            'nome_usual': f"Sintética {i}",
+            'bloco_1': True,
+        }
+        if com_coordenadas:
+            escola['latitude'] = rng.uniform(*LATITUDES)
+            escola['longitude'] = rng.uniform(*LONGITUDES)
+        else:
+            if rng.random() < 0.6:
+                escola['endereco'] = f"Rua Sintética, {rng.randint(1, 3000)}"
+            if rng.random() < 0.5:
+                escola['cep'] = f"120{rng.randint(10, 99)}-{rng.randint(100, 999)}"
+        escolas.append(escola)
+    return escolas
+
+
+def _percentil_ms(valores: List[float], percentil: float) -> float:
+    if not valores:
+        return 0.0
+    return round(float(np.percentile(valores, percentil)) * 1000, 1)
+
+
+def _resultado(cenario: str, quantidade: int, modo: str, tempo: float, stub,
+               cliente: ClienteMedido, cache: CacheRotas = None, **extras) -> Dict:
+    estatisticas = cache.estatisticas() if cache else None
+    return {
+        'cenario': cenario,
+        'escolas': quantidade,
+        'modo': modo,
+        'tempo_s': round(tempo, 3),
+        'requisicoes': stub.total_requisicoes(),
+        'erros_http': stub.contadores['erros'],
+        'taxa_acerto_cache': round(estatisticas['taxa_acerto'], 3) if estatisticas else None,
+        'p50_ms': _percentil_ms(cliente.latencias, 50),
+        'p95_ms': _percentil_ms(cliente.latencias, 95),
+        **extras,
+    }
+
+
+def _silencioso(verboso: bool):
+    """Suprime os prints de progresso dos módulos medidos"""
+    return contextlib.nullcontext() if verboso else contextlib.redirect_stdout(io.StringIO())
+
+
+def cenario_matriz(stub, quantidade: int, modo: str = 'tabela', concorrencia: int = 4,
+                   pasta: str = None, verboso: bool = False) -> List[Dict]:
+    """
+    Matriz completa duas vezes: cache frio e cache quente
+
+    Returns:
+        Dois resultados ('frio' e 'quente')
+    """
+    pasta = pasta or tempfile.mkdtemp(prefix='bench_')
+    escolas = gerar_escolas(quantidade)
+    cache = CacheRotas(os.path.join(pasta, f'cache_matriz_{quantidade}_{modo}.sqlite3'))
+    cache.limpar()
+
+    resultados = []
+    for rodada in ('frio', 'quente'):
+        cliente = ClienteMedido('osrm-stub')
+        calculador = CalculadorDistancias(stub.url, cache=cache, cliente_http=cliente,
+                                          max_concorrencia=concorrencia)
+        stub.zerar_contadores()
+        cache.zerar_estatisticas()
+
+        inicio = time.perf_counter()
+        with _silencioso(verboso):
+            matriz = calculador.calcular_matriz_distancias(escolas, modo=modo)
+        tempo = time.perf_counter() - inicio
+
+        rotas = sum(len(destinos) for destinos in matriz.values())
+        resultados.append(_resultado('matriz', quantidade, f"{modo}/c{concorrencia}/{rodada}",
+                                     tempo, stub, cliente, cache, rotas=rotas))
+    return resultados
+
+
+def cenario_proximas(stub, quantidade: int, consultas: int = 50, concorrencia: int = 4,
+                     pasta: str = None, verboso: bool = False) -> List[Dict]:
+    """Busca das 5 escolas mais próximas para `consultas` escolas de referência"""
+    pasta = pasta or tempfile.mkdtemp(prefix='bench_')
+    escolas = gerar_escolas(quantidade)
+    cache = CacheRotas(os.path.join(pasta, f'cache_proximas_{quantidade}.sqlite3'))
+    cache.limpar()
+    cliente = ClienteMedido('osrm-stub')
+    calculador = CalculadorDistancias(stub.url, cache=cache, cliente_http=cliente,
+                                      max_concorrencia=concorrencia)
+    referencias = random.Random(1).sample(escolas, min(consultas, quantidade))
+
+    stub.zerar_contadores()
+    cache.zerar_estatisticas()
+    duracoes = []
+    inicio = time.perf_counter()
+    with _silencioso(verboso):
+        for escola in referencias:
+            t0 = time.perf_counter()
+            calculador.encontrar_escolas_proximas(escola, escolas, limite=5)
+            duracoes.append(time.perf_counter() - t0)
+    tempo = time.perf_counter() - inicio
+
+    return [_resultado('proximas', quantidade, f"{len(referencias)} consultas", tempo, stub,
+                       cliente, cache, consulta_p95_ms=_percentil_ms(duracoes, 95))]
+
+
+def cenario_geocodificacao(stub, quantidade: int, pasta: str = None,
+                           verboso: bool = False) -> List[Dict]:
+    """
+    Geocodificação de todas as escolas (sem coordenadas) via /search, duas
+    vezes: cache de geocodificação frio e quente (cadastro inalterado)
+
+    O intervalo de 1 s entre requisições exigido pelo Nominatim público é
+    desligado durante o cenário para medir apenas o código.
+    """
+    pasta = pasta or tempfile.mkdtemp(prefix='bench_')
+    arquivo = os.path.join(pasta, f'escolas_{quantidade}.json')
+    escolas = gerar_escolas(quantidade, com_coordenadas=False)
+    cache = CacheGeocodificacao(os.path.join(pasta, f'cache_geocodificacao_{quantidade}.sqlite3'))
+    cache.limpar()
+
+    url_original = modulo_escolas.NOMINATIM_URL
+    intervalo_original = modulo_escolas.INTERVALO_NOMINATIM_SEGUNDOS
+    modulo_escolas.NOMINATIM_URL = f"{stub.url}/search"
+    modulo_escolas.INTERVALO_NOMINATIM_SEGUNDOS = 0
+    resultados = []
+    try:
+        for rodada in ('frio', 'quente'):
+            with open(arquivo, 'w', encoding='utf-8') as f:
+                json.dump(escolas, f, ensure_ascii=False)
+            cliente = ClienteMedido('nominatim-stub')
+            gerenciador = GerenciadorEscolasBenchmark(arquivo, cliente, cache)
+            stub.zerar_contadores()
+            cache.zerar_estatisticas()
+
+            encontradas = 0
+            inicio = time.perf_counter()
+            with _silencioso(verboso):
+                for escola in list(gerenciador.escolas):
+                    if gerenciador.obter_coordenadas(escola):
+                        encontradas += 1
+            tempo = time.perf_counter() - inicio
+
+            resultado = _resultado('geocodificacao', quantidade, f"sequencial/{rodada}", tempo,
+                                   stub, cliente, geocodificadas=encontradas)
+            resultado['taxa_acerto_cache'] = round(cache.estatisticas()['taxa_acerto'], 3)
+            resultados.append(resultado)
+    finally:
+        modulo_escolas.NOMINATIM_URL = url_original
+        modulo_escolas.INTERVALO_NOMINATIM_SEGUNDOS = intervalo_original
+
+    return resultados
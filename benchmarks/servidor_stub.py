@@ -0,0 +1,202 @@
+"""
+Servidor HTTP local que imita as respostas do OSRM e do Nominatim
+
+Rotas atendidas:
+  /route/v1/driving/<lon,lat;lon,lat>           (OSRM route, overview=full
+                                                 devolve a linha reta como polyline)
+  /table/v1/driving/<coords>?sources=&destinations= (OSRM table)
+  /search?q=...                                  (Nominatim search)
+
+As distâncias são a linha reta multiplicada por um fator de desvio e as
+durações usam uma velocidade média fixa. Latência e taxa de erro (HTTP 503)
+são configuráveis; cada requisição é contada por rota.
+"""
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from distancias import codificar_polyline
+
+RAIO_TERRA_M = 6371008.8
+
+# Centro aproximado de Taubaté (para as respostas do /search)
+CENTRO = (-23.0262, -45.5558)
+
+
+def _haversine_m(a, b) -> float:
+    (lat1, lon1), (lat2, lon2) = a, b
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * RAIO_TERRA_M * math.asin(math.sqrt(min(1.0, h)))
+
+
+class ServidorStub:
+    def __init__(self, latencia: float = 0.02, variacao: float = 0.01,
+                 taxa_erro: float = 0.0, taxa_sem_resultado: float = 0.3,
+                 fator_desvio: float = 1.3, velocidade_kmh: float = 35.0,
+                 semente: int = 0):
+        """
+        Configura o servidor (use iniciar() / parar() ou como context manager)
+
+        Args:
+            latencia: Atraso base de cada resposta (s)
+            variacao: Atraso adicional aleatório, uniforme entre 0 e variacao (s)
+            taxa_erro: Fração das requisições respondidas com HTTP 503
+            taxa_sem_resultado: Fração das buscas do Nominatim sem resultado
+                                (determinística pela consulta)
+            fator_desvio: Distância de rota = linha reta x fator_desvio
+            velocidade_kmh: Velocidade média usada nas durações
+            semente: Semente do sorteio de latência/erros
+        """
+        self.latencia = latencia
+        self.variacao = variacao
+        self.taxa_erro = taxa_erro
+        self.taxa_sem_resultado = taxa_sem_resultado
+        self.fator_desvio = fator_desvio
+        self.velocidade_ms = velocidade_kmh / 3.6
+
+        self._rng = random.Random(semente)
+        self._lock = threading.Lock()
+        self._servidor = None
+        self._thread = None
+        self.zerar_contadores()
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+
+    @property
+    def url(self) -> str:
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def iniciar(self) -> 'ServidorStub':
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Cabeçalho e corpo saem em escritas separadas: sem isso o Nagle
+            # somado ao ACK atrasado do cliente acrescenta ~40 ms por resposta
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub._atender(self)
+
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._servidor.daemon_threads = True
+        self._thread = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    # ------------------------------------------------------------------
+    # Contadores
+
+    def zerar_contadores(self):
+        with self._lock:
+            self.contadores = {'route': 0, 'table': 0, 'search': 0, 'erros': 0}
+
+    def total_requisicoes(self) -> int:
+        with self._lock:
+            return self.contadores['route'] + self.contadores['table'] + self.contadores['search']
+
+    def _contar(self, chave: str):
+        with self._lock:
+            self.contadores[chave] += 1
+
+    # ------------------------------------------------------------------
+    # Respostas
+
+    def _atender(self, handler: BaseHTTPRequestHandler):
+        partes = urlsplit(handler.path)
+        params = parse_qs(partes.query)
+
+        if '/route/' in partes.path:
+            rota = 'route'
+        elif '/table/' in partes.path:
+            rota = 'table'
+        elif partes.path.rstrip('/').endswith('/search'):
+            rota = 'search'
+        else:
+            self._responder(handler, 404, {'code': 'InvalidUrl'})
+            return
+        self._contar(rota)
+
+        with self._lock:
+            atraso = self.latencia + self._rng.random() * self.variacao
+            falhar = self._rng.random() < self.taxa_erro
+        time.sleep(atraso)
+
+        if falhar:
+            self._contar('erros')
+            self._responder(handler, 503, {'code': 'ServiceUnavailable'})
+            return
+
+        if rota == 'search':
+            self._responder(handler, 200, self._buscar(params.get('q', [''])[0]))
+            return
+
+        # OSRM: coordenadas "lon,lat" separadas por ';'
+        pontos = []
+        for par in partes.path.rsplit('/', 1)[-1].split(';'):
+            lon, lat = par.split(',')
+            pontos.append((float(lat), float(lon)))
+
+        if rota == 'route':
+            distancia, duracao = self._rota(pontos[0], pontos[1])
+            rota = {'distance': distancia, 'duration': duracao}
+            if params.get('overview', ['false'])[0] == 'full':
+                rota['geometry'] = codificar_polyline(pontos[:2])
+            corpo = {'code': 'Ok', 'routes': [rota]}
+        else:
+            fontes = [int(i) for i in params['sources'][0].split(';')]
+            destinos = [int(j) for j in params['destinations'][0].split(';')]
+            rotas = [[self._rota(pontos[i], pontos[j]) for j in destinos] for i in fontes]
+            corpo = {
+                'code': 'Ok',
+                'distances': [[r[0] for r in linha] for linha in rotas],
+                'durations': [[r[1] for r in linha] for linha in rotas],
+            }
+        self._responder(handler, 200, corpo)
+
+    def _rota(self, origem, destino):
+        distancia = round(_haversine_m(origem, destino) * self.fator_desvio, 1)
+        return distancia, round(distancia / self.velocidade_ms, 1)
+
+    def _buscar(self, consulta: str):
+        """Resultado determinístico por consulta, perto do centro da cidade"""
+        resumo = hashlib.sha1(consulta.encode('utf-8')).digest()
+        if resumo[0] / 256 < self.taxa_sem_resultado:
+            return []
+        dlat = (resumo[1] / 255 - 0.5) * 0.1
+        dlon = (resumo[2] / 255 - 0.5) * 0.1
+        return [{'lat': f"{CENTRO[0] + dlat:.7f}", 'lon': f"{CENTRO[1] + dlon:.7f}",
+                 'display_name': consulta}]
+
+    @staticmethod
+    def _responder(handler: BaseHTTPRequestHandler, status: int, corpo):
+        dados = json.dumps(corpo).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(dados)))
+        handler.end_headers()
+        handler.wfile.write(dados)
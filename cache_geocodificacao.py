@@ -0,0 +1,187 @@
+"""
+Módulo de cache persistente de geocodificação
+
+Guarda o resultado de cada consulta ao Nominatim em SQLite, pela consulta
+normalizada (sem acentos, caixa e pontuação). Consultas sem resultado
+também são guardadas, com uma data a partir da qual podem ser tentadas de
+novo; erros de rede não são guardados.
+
+O arquivo fica em data/ ao lado deste módulo, então o sistema legado (JSON)
+e o Django usam o mesmo cache.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+ARQUIVO_PADRAO = os.environ.get(
+    'CACHE_GEOCODIFICACAO_ARQUIVO',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cache_geocodificacao.sqlite3'),
+)
+
+# Retorno de obter() para uma consulta sabidamente sem resultado
+SEM_RESULTADO = ()
+
+
+def normalizar_consulta(consulta: str) -> str:
+    """'Rua  São José, 12.030-000' -> 'rua sao jose 12030 000'"""
+    texto = unicodedata.normalize('NFKD', consulta)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    texto = re.sub(r'(?<=\d)[.](?=\d)', '', texto)
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', texto).split())
+
+
+class CacheGeocodificacao:
+    def __init__(self, arquivo: str = ARQUIVO_PADRAO,
+                 ttl_segundos: int = 365 * 24 * 3600,
+                 espera_sem_resultado_segundos: int = 30 * 24 * 3600):
+        """
+        Inicializa o cache de geocodificação
+
+        Args:
+            arquivo: Caminho do banco SQLite
+            ttl_segundos: Validade de uma coordenada encontrada
+            espera_sem_resultado_segundos: Tempo até uma consulta sem resultado
+                                           poder ser repetida no Nominatim
+        """
+        self.arquivo = arquivo
+        self.ttl_segundos = ttl_segundos
+        self.espera_sem_resultado_segundos = espera_sem_resultado_segundos
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.zerar_estatisticas()
+
+        self._criar_tabela()
+
+    # ------------------------------------------------------------------
+    # SQLite
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Retorna a conexão SQLite da thread/processo atual"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.arquivo, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _criar_tabela(self):
+        pasta = os.path.dirname(self.arquivo)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._conexao().execute('''
+            CREATE TABLE IF NOT EXISTS geocodificacao (
+                chave TEXT PRIMARY KEY,
+                consulta TEXT NOT NULL,
+                latitude REAL,
+                longitude REAL,
+                criado_em REAL NOT NULL,
+                valido_ate REAL NOT NULL
+            )
+        ''')
+
+    # ------------------------------------------------------------------
+    # API pública
+
+    def obter(self, consulta: str) -> Optional[Tuple[float, float]]:
+        """
+        Busca uma consulta no cache
+
+        Returns:
+            (latitude, longitude) se encontrada, SEM_RESULTADO se o Nominatim
+            não achou nada e ainda não é hora de tentar de novo, ou None se a
+            consulta precisa ir para a rede
+        """
+        try:
+            linha = self._conexao().execute(
+                'SELECT latitude, longitude FROM geocodificacao WHERE chave = ? AND valido_ate > ?',
+                (normalizar_consulta(consulta), time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Erro ao ler cache de geocodificação: {e}")
+            return None
+
+        if linha is None:
+            self._contar('falhas')
+            return None
+        if linha[0] is None:
+            self._contar('sem_resultado')
+            return SEM_RESULTADO
+        self._contar('acertos')
+        return (linha[0], linha[1])
+
+    def salvar(self, consulta: str, coords: Optional[Tuple[float, float]]):
+        """Grava o resultado de uma consulta (coords=None para 'sem resultado')"""
+        agora = time.time()
+        validade = self.ttl_segundos if coords else self.espera_sem_resultado_segundos
+        latitude, longitude = coords if coords else (None, None)
+        try:
+            self._conexao().execute(
+                'INSERT OR REPLACE INTO geocodificacao '
+                '(chave, consulta, latitude, longitude, criado_em, valido_ate) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (normalizar_consulta(consulta), consulta, latitude, longitude, agora, agora + validade)
+            )
+        except sqlite3.Error as e:
+            print(f"Erro ao gravar cache de geocodificação: {e}")
+
+    def esquecer_sem_resultado(self) -> int:
+        """Remove as consultas sem resultado (para tentar todas de novo)"""
+        try:
+            return self._conexao().execute(
+                'DELETE FROM geocodificacao WHERE latitude IS NULL').rowcount
+        except sqlite3.Error as e:
+            print(f"Erro ao limpar cache de geocodificação: {e}")
+            return 0
+
+    def limpar(self):
+        """Remove todas as consultas do cache"""
+        try:
+            self._conexao().execute('DELETE FROM geocodificacao')
+        except sqlite3.Error as e:
+            print(f"Erro ao limpar cache de geocodificação: {e}")
+
+    # ------------------------------------------------------------------
+    # Estatísticas
+
+    def _contar(self, contador: str):
+        with self._lock:
+            self._estatisticas[contador] += 1
+
+    def zerar_estatisticas(self):
+        """Zera os contadores deste processo"""
+        self._estatisticas = {'acertos': 0, 'sem_resultado': 0, 'falhas': 0}
+
+    def estatisticas(self) -> Dict:
+        """
+        Contadores de consultas deste processo
+
+        Returns:
+            Dicionário com acertos, sem_resultado (falhas guardadas), falhas
+            (consultas que foram para a rede), consultas e taxa_acerto (0 a 1)
+        """
+        with self._lock:
+            dados = dict(self._estatisticas)
+        dados['consultas'] = dados['acertos'] + dados['sem_resultado'] + dados['falhas']
+        respondidas = dados['acertos'] + dados['sem_resultado']
+        dados['taxa_acerto'] = respondidas / dados['consultas'] if dados['consultas'] else 0.0
+        return dados
+
+
+_cache_padrao = None
+_cache_padrao_lock = threading.Lock()
+
+
+def obter_cache_geocodificacao() -> CacheGeocodificacao:
+    """Cache compartilhado do processo (criado na primeira chamada)"""
+    global _cache_padrao
+    with _cache_padrao_lock:
+        if _cache_padrao is None:
+            _cache_padrao = CacheGeocodificacao()
+        return _cache_padrao
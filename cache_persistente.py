@@ -0,0 +1,352 @@
+"""
+Módulo de cache persistente de rotas
+
+Dois níveis:
+  1. LRU em memória (por processo) - consultas repetidas custam microssegundos
+  2. SQLite em disco (compartilhado entre processos/workers do Gunicorn e
+     preservado entre reinícios)
+
+A geometria da rota (polyline codificada), quando pedida, fica na mesma
+linha do SQLite mas fora do LRU: só é lida por quem desenha o trajeto.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Chaves por consulta em "IN (...)" (o SQLite antigo limita a 999 parâmetros)
+TAMANHO_LOTE = 500
+
+
+def _lotes(valores: List, tamanho: int = TAMANHO_LOTE):
+    for i in range(0, len(valores), tamanho):
+        yield valores[i:i + tamanho]
+
+
+class CacheRotas:
+    # acessado_em só serve para escolher o que sai quando o SQLite passa de
+    # max_persistente: basta a precisão de um dia
+    INTERVALO_ACESSO = 24 * 3600
+
+    def __init__(self, arquivo: str = "data/cache_rotas.sqlite3",
+                 ttl_segundos: int = 30 * 24 * 3600,
+                 max_memoria: int = 4096,
+                 max_persistente: int = 200_000,
+                 casas_decimais: int = 5):
+        """
+        Inicializa o cache de rotas
+
+        Args:
+            arquivo: Caminho do banco SQLite do nível persistente
+            ttl_segundos: Validade de cada rota armazenada
+            max_memoria: Máximo de rotas no LRU em memória
+            max_persistente: Máximo de rotas no SQLite (as mais antigas são removidas)
+            casas_decimais: Arredondamento das coordenadas na chave
+                            (5 casas ~ 1 metro)
+        """
+        self.arquivo = arquivo
+        self.ttl_segundos = ttl_segundos
+        self.max_memoria = max_memoria
+        self.max_persistente = max_persistente
+        self.casas_decimais = casas_decimais
+
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._insercoes = 0
+        self.zerar_estatisticas()
+
+        self._criar_tabela()
+
+    # ------------------------------------------------------------------
+    # SQLite
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Retorna a conexão SQLite da thread/processo atual"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.arquivo, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _criar_tabela(self):
+        """Cria a tabela do nível persistente se não existir"""
+        pasta = os.path.dirname(self.arquivo)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        conn = self._conexao()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rotas (
+                chave TEXT PRIMARY KEY,
+                origem TEXT NOT NULL,
+                destino TEXT NOT NULL,
+                dados TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                acessado_em REAL NOT NULL,
+                geometria TEXT
+            )
+        ''')
+        colunas = [linha[1] for linha in conn.execute('PRAGMA table_info(rotas)')]
+        if 'geometria' not in colunas:
+            # Bancos criados antes do suporte a geometria
+            conn.execute('ALTER TABLE rotas ADD COLUMN geometria TEXT')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_rotas_origem ON rotas (origem)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_rotas_destino ON rotas (destino)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_rotas_acessado ON rotas (acessado_em)')
+
+    # ------------------------------------------------------------------
+    # Chaves
+
+    def _ponto(self, coords: Tuple[float, float]) -> str:
+        """Representação arredondada de uma coordenada (latitude, longitude)"""
+        return f"{coords[0]:.{self.casas_decimais}f},{coords[1]:.{self.casas_decimais}f}"
+
+    def chave(self, origem: Tuple[float, float], destino: Tuple[float, float]) -> str:
+        """Chave de cache para o par origem → destino"""
+        return f"{self._ponto(origem)};{self._ponto(destino)}"
+
+    # ------------------------------------------------------------------
+    # Memória (LRU)
+
+    def _obter_memoria(self, chave: str) -> Optional[Dict]:
+        with self._lock:
+            item = self._memoria.get(chave)
+            if item is None:
+                return None
+            rota, expira_em = item
+            if expira_em < time.time():
+                del self._memoria[chave]
+                return None
+            self._memoria.move_to_end(chave)
+            return rota
+
+    def _salvar_memoria(self, chave: str, rota: Dict, expira_em: float):
+        with self._lock:
+            self._memoria[chave] = (rota, expira_em)
+            self._memoria.move_to_end(chave)
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # API pública
+
+    def obter(self, origem: Tuple[float, float], destino: Tuple[float, float]) -> Optional[Dict]:
+        """
+        Busca uma rota no cache (memória e depois SQLite)
+
+        Returns:
+            Dicionário da rota ou None se não houver entrada válida
+        """
+        return self.obter_varias([(origem, destino)])[0]
+
+    def obter_varias(self, pares: Iterable[Tuple[Tuple[float, float], Tuple[float, float]]]
+                     ) -> List[Optional[Dict]]:
+        """
+        Busca várias rotas no cache: as que não estão no LRU são lidas do
+        SQLite com uma consulta por lote de chaves
+
+        Leituras não gravam no SQLite (não pegam a trava de escrita): o
+        acessado_em das rotas lidas só é atualizado, em lote, quando tem mais
+        de INTERVALO_ACESSO segundos.
+
+        Args:
+            pares: Iterável de tuplas (origem, destino)
+
+        Returns:
+            Lista com a rota de cada par, na mesma ordem (None se não houver
+            entrada válida)
+        """
+        chaves = [self.chave(origem, destino) for origem, destino in pares]
+        rotas = [self._obter_memoria(chave) for chave in chaves]
+
+        faltando = {}
+        for k, (chave, rota) in enumerate(zip(chaves, rotas)):
+            if rota is None:
+                faltando.setdefault(chave, []).append(k)
+        acertos_memoria = sum(rota is not None for rota in rotas)
+        self._contar('acertos_memoria', acertos_memoria)
+        if not faltando:
+            return rotas
+
+        agora = time.time()
+        acessos = []
+        try:
+            conn = self._conexao()
+            for lote in _lotes(list(faltando)):
+                linhas = conn.execute(
+                    'SELECT chave, dados, criado_em, acessado_em FROM rotas '
+                    f'WHERE chave IN ({", ".join("?" * len(lote))}) AND criado_em >= ?',
+                    (*lote, agora - self.ttl_segundos)
+                ).fetchall()
+                for chave, dados, criado_em, acessado_em in linhas:
+                    rota = json.loads(dados)
+                    self._salvar_memoria(chave, rota, criado_em + self.ttl_segundos)
+                    for k in faltando[chave]:
+                        rotas[k] = rota
+                    if acessado_em + self.INTERVALO_ACESSO < agora:
+                        acessos.append((agora, chave))
+            if acessos:
+                with conn:
+                    conn.execute('BEGIN')
+                    conn.executemany('UPDATE rotas SET acessado_em = ? WHERE chave = ?', acessos)
+        except sqlite3.Error as e:
+            print(f"Erro ao ler cache de rotas: {e}")
+
+        consultadas = len(chaves) - acertos_memoria
+        acertos_disco = sum(rota is not None for rota in rotas) - acertos_memoria
+        self._contar('acertos_disco', acertos_disco)
+        self._contar('falhas', consultadas - acertos_disco)
+        return rotas
+
+    def obter_geometria(self, origem: Tuple[float, float], destino: Tuple[float, float]) -> Optional[str]:
+        """
+        Busca a geometria (polyline codificada) de uma rota no SQLite
+
+        Returns:
+            Polyline ou None se a rota não estiver no cache, tiver expirado
+            ou tiver sido salva sem geometria
+        """
+        chave = self.chave(origem, destino)
+        try:
+            linha = self._conexao().execute(
+                'SELECT geometria FROM rotas WHERE chave = ? AND criado_em >= ?',
+                (chave, time.time() - self.ttl_segundos)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Erro ao ler geometria do cache de rotas: {e}")
+            return None
+        return linha[0] if linha else None
+
+    def salvar(self, origem: Tuple[float, float], destino: Tuple[float, float], rota: Dict,
+               geometria: Optional[str] = None):
+        """Armazena uma rota nos dois níveis do cache (a geometria só no SQLite)"""
+        self.salvar_varias([(origem, destino, rota, geometria)])
+
+    def salvar_varias(self, rotas):
+        """
+        Armazena várias rotas em uma única transação
+
+        Args:
+            rotas: Iterável de tuplas (origem, destino, rota) ou
+                   (origem, destino, rota, geometria)
+        """
+        agora = time.time()
+        linhas = []
+        for origem, destino, rota, *geometria in rotas:
+            chave = self.chave(origem, destino)
+            self._salvar_memoria(chave, rota, agora + self.ttl_segundos)
+            linhas.append((chave, self._ponto(origem), self._ponto(destino),
+                           json.dumps(rota), agora, agora, geometria[0] if geometria else None))
+
+        if not linhas:
+            return
+
+        try:
+            conn = self._conexao()
+            with conn:
+                conn.execute('BEGIN')
+                # Rota salva de novo sem geometria (ex.: por calcular_tabela)
+                # mantém a polyline que já estava no cache
+                conn.executemany(
+                    'INSERT INTO rotas '
+                    '(chave, origem, destino, dados, criado_em, acessado_em, geometria) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT(chave) DO UPDATE SET '
+                    'dados = excluded.dados, criado_em = excluded.criado_em, '
+                    'acessado_em = excluded.acessado_em, '
+                    'geometria = COALESCE(excluded.geometria, rotas.geometria)',
+                    linhas
+                )
+        except sqlite3.Error as e:
+            print(f"Erro ao gravar cache de rotas: {e}")
+            return
+
+        self._insercoes += len(linhas)
+        if self._insercoes >= 1000:
+            self._insercoes = 0
+            self._aplicar_limites()
+
+    def _aplicar_limites(self):
+        """Remove rotas expiradas e as menos acessadas acima do limite de tamanho"""
+        try:
+            conn = self._conexao()
+            conn.execute('DELETE FROM rotas WHERE criado_em < ?',
+                         (time.time() - self.ttl_segundos,))
+            total = conn.execute('SELECT COUNT(*) FROM rotas').fetchone()[0]
+            excesso = total - self.max_persistente
+            if excesso > 0:
+                conn.execute(
+                    'DELETE FROM rotas WHERE chave IN '
+                    '(SELECT chave FROM rotas ORDER BY acessado_em LIMIT ?)',
+                    (excesso,)
+                )
+        except sqlite3.Error as e:
+            print(f"Erro ao limpar cache de rotas: {e}")
+
+    def invalidar_ponto(self, coords: Tuple[float, float]) -> int:
+        """
+        Remove todas as rotas que partem ou chegam em uma coordenada
+        (usado quando uma escola muda de posição)
+
+        Como a chave é formada pelas próprias coordenadas, uma escola movida
+        passa a gerar chaves novas nos demais workers; aqui as entradas
+        antigas são descartadas do SQLite e do LRU deste processo.
+
+        Returns:
+            Número de rotas removidas do nível persistente
+        """
+        ponto = self._ponto(coords)
+
+        with self._lock:
+            for chave in [c for c in self._memoria if ponto in c.split(';')]:
+                del self._memoria[chave]
+
+        try:
+            conn = self._conexao()
+            cursor = conn.execute('DELETE FROM rotas WHERE origem = ? OR destino = ?',
+                                  (ponto, ponto))
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"Erro ao invalidar cache de rotas: {e}")
+            return 0
+
+    # ------------------------------------------------------------------
+    # Estatísticas
+
+    def _contar(self, contador: str, quantidade: int = 1):
+        with self._lock:
+            self._estatisticas[contador] += quantidade
+
+    def zerar_estatisticas(self):
+        """Zera os contadores de acertos/falhas deste processo"""
+        self._estatisticas = {'acertos_memoria': 0, 'acertos_disco': 0, 'falhas': 0}
+
+    def estatisticas(self) -> Dict:
+        """
+        Contadores de consultas deste processo
+
+        Returns:
+            Dicionário com acertos_memoria, acertos_disco, falhas, consultas
+            e taxa_acerto (0 a 1)
+        """
+        with self._lock:
+            dados = dict(self._estatisticas)
+        dados['consultas'] = dados['acertos_memoria'] + dados['acertos_disco'] + dados['falhas']
+        acertos = dados['acertos_memoria'] + dados['acertos_disco']
+        dados['taxa_acerto'] = acertos / dados['consultas'] if dados['consultas'] else 0.0
+        return dados
+
+    def limpar(self):
+        """Remove todas as rotas do cache"""
+        with self._lock:
+            self._memoria.clear()
+        try:
+            self._conexao().execute('DELETE FROM rotas')
+        except sqlite3.Error as e:
+            print(f"Erro ao limpar cache de rotas: {e}")
@@ -0,0 +1,187 @@
+"""
+Módulo da tabela local de CEPs (CEP -> coordenada do centroide)
+
+A tabela é um único .npy com registros (cep, latitude, longitude) ordenados
+pelo CEP como inteiro de 8 dígitos, aberto com mmap_mode: a consulta é uma
+busca binária (np.searchsorted) sem rede e sem carregar o arquivo inteiro.
+
+Gerada a partir de um CSV por importar_csv() ou pelo comando
+`python manage.py importar_ceps arquivo.csv`.
+"""
+import csv
+import os
+import re
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+ARQUIVO_PADRAO = os.environ.get(
+    'TABELA_CEPS_ARQUIVO',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ceps.npy'),
+)
+
+TIPO_REGISTRO = np.dtype([('cep', '<u4'), ('latitude', '<f4'), ('longitude', '<f4')])
+
+# Nomes de coluna aceitos no CSV (sem diferenciar maiúsculas)
+COLUNAS_CEP = ('cep', 'postcode', 'codigo_postal')
+COLUNAS_LATITUDE = ('latitude', 'lat')
+COLUNAS_LONGITUDE = ('longitude', 'lon', 'lng')
+
+
+def cep_para_inteiro(cep) -> Optional[int]:
+    """'12.030-000' -> 12030000 (None se não tiver 8 dígitos)"""
+    digitos = re.sub(r'\D', '', str(cep or ''))
+    return int(digitos) if len(digitos) == 8 else None
+
+
+class TabelaCeps:
+    def __init__(self, dados: np.ndarray):
+        """
+        Tabela de CEPs
+
+        Args:
+            dados: Array estruturado TIPO_REGISTRO ordenado por 'cep'
+        """
+        self.dados = dados
+        self._ceps = dados['cep']
+
+    def __len__(self) -> int:
+        return len(self.dados)
+
+    def obter(self, cep) -> Optional[Tuple[float, float]]:
+        """
+        Coordenada do centroide de um CEP
+
+        Returns:
+            (latitude, longitude) ou None se o CEP for inválido ou não
+            estiver na tabela
+        """
+        valor = cep_para_inteiro(cep)
+        if valor is None:
+            return None
+        i = int(np.searchsorted(self._ceps, valor))
+        if i >= len(self._ceps) or self._ceps[i] != valor:
+            return None
+        registro = self.dados[i]
+        # float32: ~1 m de precisão; 5 casas escondem o ruído da conversão
+        return (round(float(registro['latitude']), 5), round(float(registro['longitude']), 5))
+
+    # ------------------------------------------------------------------
+    # Criação / persistência
+
+    @classmethod
+    def de_registros(cls, registros) -> 'TabelaCeps':
+        """
+        Monta a tabela a partir de (cep, latitude, longitude); CEPs
+        repetidos viram a média das coordenadas
+        """
+        linhas = [(c, lat, lon) for c, lat, lon in
+                  ((cep_para_inteiro(cep), lat, lon) for cep, lat, lon in registros) if c is not None]
+        if not linhas:
+            return cls(np.zeros(0, dtype=TIPO_REGISTRO))
+
+        brutos = np.array(linhas, dtype=np.float64)
+        ceps, inverso, quantidades = np.unique(brutos[:, 0].astype(np.uint32),
+                                               return_inverse=True, return_counts=True)
+        inverso = inverso.reshape(-1)
+        dados = np.zeros(len(ceps), dtype=TIPO_REGISTRO)
+        dados['cep'] = ceps
+        dados['latitude'] = np.bincount(inverso, weights=brutos[:, 1]) / quantidades
+        dados['longitude'] = np.bincount(inverso, weights=brutos[:, 2]) / quantidades
+        return cls(dados)
+
+    def salvar(self, arquivo: str = ARQUIVO_PADRAO):
+        """Grava o .npy (substituição atômica)"""
+        pasta = os.path.dirname(arquivo)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        temporario = arquivo + '.tmp'
+        with open(temporario, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.dados, dtype=TIPO_REGISTRO))
+        os.replace(temporario, arquivo)
+
+    @classmethod
+    def abrir(cls, arquivo: str = ARQUIVO_PADRAO, mmap_mode: Optional[str] = 'r') -> 'TabelaCeps':
+        """
+        Abre uma tabela gravada por salvar()
+
+        Raises:
+            ValueError: arquivo com outro formato de registro
+        """
+        dados = np.load(arquivo, mmap_mode=mmap_mode)
+        if dados.dtype != TIPO_REGISTRO:
+            raise ValueError(f"Tabela de CEPs com formato inesperado: {dados.dtype}")
+        return cls(dados)
+
+
+def _coluna(cabecalho, nomes, informada=None) -> int:
+    normalizados = [c.strip().lower() for c in cabecalho]
+    for nome in ([informada] if informada else nomes):
+        if nome.lower() in normalizados:
+            return normalizados.index(nome.lower())
+    raise ValueError(f"Coluna não encontrada no CSV: {informada or '/'.join(nomes)}")
+
+
+def importar_csv(arquivo_csv: str, arquivo_npy: str = ARQUIVO_PADRAO,
+                 coluna_cep: str = None, coluna_latitude: str = None,
+                 coluna_longitude: str = None) -> Tuple['TabelaCeps', int]:
+    """
+    Gera a tabela binária a partir de um CSV com CEP, latitude e longitude
+
+    O separador (',' ou ';') é detectado e a vírgula decimal é aceita.
+    Linhas com CEP ou coordenadas inválidas são ignoradas.
+
+    Returns:
+        (tabela gerada, número de linhas ignoradas)
+    """
+    with open(arquivo_csv, 'r', encoding='utf-8-sig', newline='') as f:
+        amostra = f.read(4096)
+        f.seek(0)
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=',;\t')
+        leitor = csv.reader(f, dialeto)
+        cabecalho = next(leitor)
+        i_cep = _coluna(cabecalho, COLUNAS_CEP, coluna_cep)
+        i_lat = _coluna(cabecalho, COLUNAS_LATITUDE, coluna_latitude)
+        i_lon = _coluna(cabecalho, COLUNAS_LONGITUDE, coluna_longitude)
+
+        registros = []
+        ignoradas = 0
+        for linha in leitor:
+            try:
+                lat = float(linha[i_lat].replace(',', '.'))
+                lon = float(linha[i_lon].replace(',', '.'))
+            except (IndexError, ValueError):
+                ignoradas += 1
+                continue
+            if cep_para_inteiro(linha[i_cep]) is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                ignoradas += 1
+                continue
+            registros.append((linha[i_cep], lat, lon))
+
+    tabela = TabelaCeps.de_registros(registros)
+    tabela.salvar(arquivo_npy)
+    return tabela, ignoradas
+
+
+_abertas = {}
+_abertas_lock = threading.Lock()
+
+
+def carregar_tabela_ceps(arquivo: str = ARQUIVO_PADRAO) -> Optional[TabelaCeps]:
+    """
+    Tabela mapeada compartilhada pelo processo, reaberta quando o arquivo muda
+
+    Returns:
+        TabelaCeps ou None se o arquivo não existir
+    """
+    try:
+        versao = os.stat(arquivo).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _abertas_lock:
+        atual = _abertas.get(arquivo)
+        if atual is None or atual[0] != versao:
+            _abertas[arquivo] = (versao, TabelaCeps.abrir(arquivo))
+        return _abertas[arquivo][1]
@@ -2,20 +2,125 @@
 Módulo para calcular distâncias entre escolas usando OSRM
 """
 import requests
+import numpy as np
 from typing import List, Dict, Optional, Tuple
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_persistente import CacheRotas
+from http_cliente import ClienteHTTP, obter_cliente
+from matriz_binaria import MatrizDistancias, carregar_matriz_binaria
+
+
+# Limite de coordenadas por requisição /table do servidor público OSRM
+# (opção --max-table-size do osrm-routed, padrão 100)
+MAX_COORDENADAS_TABELA = 100
+
+RAIO_TERRA_KM = 6371.0088
+
+
+def distancias_haversine_km(lat: float, lon: float, lats, lons) -> np.ndarray:
+    """
+    Distância em linha reta (grande círculo) de um ponto para vários pontos
+
+    Args:
+        lat, lon: Coordenadas do ponto de referência (graus)
+        lats, lons: Sequências com as coordenadas dos demais pontos (graus)
+
+    Returns:
+        Array NumPy com as distâncias em km
+    """
+    lat1 = np.radians(lat)
+    lon1 = np.radians(lon)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lons, dtype=np.float64))
+
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def codificar_polyline(pontos, precisao: int = 5) -> str:
+    """
+    Codifica uma lista de (latitude, longitude) no formato polyline do
+    Google/OSRM (o mesmo de geometries=polyline)
+    """
+    fator = 10 ** precisao
+    resultado = []
+    anterior = (0, 0)
+    for lat, lon in pontos:
+        atual = (int(round(lat * fator)), int(round(lon * fator)))
+        for delta in (atual[0] - anterior[0], atual[1] - anterior[1]):
+            valor = ~(delta << 1) if delta < 0 else delta << 1
+            while valor >= 0x20:
+                resultado.append(chr((0x20 | (valor & 0x1f)) + 63))
+                valor >>= 5
+            resultado.append(chr(valor + 63))
+        anterior = atual
+    return ''.join(resultado)
 
 
 class CalculadorDistancias:
-    def __init__(self, servidor_osrm: str = "http://router.project-osrm.org"):
+    def __init__(self, servidor_osrm: str = "http://router.project-osrm.org",
+                 max_coordenadas_tabela: int = MAX_COORDENADAS_TABELA,
+                 cache: Optional[CacheRotas] = None,
+                 backend=None,
+                 cliente_http: Optional[ClienteHTTP] = None,
+                 max_concorrencia: int = 4,
+                 requisicoes_por_segundo: Optional[float] = None):
         """
         Inicializa o calculador de distâncias
 
         Args:
             servidor_osrm: URL do servidor OSRM (padrão: servidor público)
                           Pode usar também: "https://routing.openstreetmap.de/routed-car"
+            max_coordenadas_tabela: Máximo de coordenadas aceitas pelo servidor
+                                    em uma única requisição /table
+            cache: Cache de rotas (memória + SQLite) consultado antes do OSRM
+            backend: Roteador alternativo ao servidor OSRM (ex.: RoteadorLocal)
+                     com os métodos calcular_distancia e calcular_tabela
+            cliente_http: Cliente HTTP com pool/retry/disjuntor (padrão:
+                          cliente compartilhado 'osrm' do processo)
+            max_concorrencia: Requisições ao OSRM em paralelo (1 = sequencial)
+            requisicoes_por_segundo: Limite de taxa imposto pela política do
+                                     servidor (None = sem limite); só se aplica
+                                     ao cliente padrão
         """
         self.servidor_osrm = servidor_osrm
+        self.max_coordenadas_tabela = max(2, max_coordenadas_tabela)
+        self.cache = cache
+        self.backend = backend
+        self.max_concorrencia = max(1, max_concorrencia)
+        self.cliente_http = cliente_http or obter_cliente(
+            'osrm',
+            tamanho_pool=max(10, self.max_concorrencia),
+            requisicoes_por_segundo=requisicoes_por_segundo,
+        )
+
+    def _mapear(self, funcao, itens):
+        """
+        Aplica funcao a cada item com até max_concorrencia threads
+
+        Os resultados saem na mesma ordem dos itens, independente de qual
+        requisição termina primeiro.
+        """
+        itens = list(itens)
+        if self.max_concorrencia == 1 or len(itens) <= 1:
+            yield from map(funcao, itens)
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concorrencia, len(itens))) as executor:
+            yield from executor.map(funcao, itens)
+
+    @staticmethod
+    def _formatar_rota(distancia_metros: float, duracao_segundos: float) -> Dict:
+        """Monta o dicionário de rota no formato usado em todo o sistema"""
+        return {
+            'distancia_metros': distancia_metros,
+            'distancia_km': round(distancia_metros / 1000, 2),
+            'duracao_segundos': duracao_segundos,
+            'duracao_minutos': round(duracao_segundos / 60, 1)
+        }
 
     def calcular_distancia(self, origem: Tuple[float, float], destino: Tuple[float, float]) -> Optional[Dict]:
         """
@@ -28,29 +133,74 @@ class CalculadorDistancias:
         Returns:
             Dicionário com informações da rota ou None se houver erro
         """
+        if self.cache:
+            rota = self.cache.obter(origem, destino)
+            if rota is not None:
+                return rota
+
+        rota = self._consultar_rota(origem, destino)
+        if rota and self.cache:
+            self.cache.salvar(origem, destino, rota)
+        return rota
+
+    def calcular_geometria(self, origem: Tuple[float, float], destino: Tuple[float, float]) -> Optional[Dict]:
+        """
+        Rota entre dois pontos com o trajeto para desenhar no mapa
+
+        A geometria é pedida ao OSRM uma única vez por par e fica no cache
+        junto com a rota; as chamadas seguintes não fazem requisições.
+
+        Returns:
+            Dicionário da rota com 'geometria' (polyline codificada, precisão 5)
+            ou None se houver erro
+        """
+        if self.cache:
+            geometria = self.cache.obter_geometria(origem, destino)
+            rota = self.cache.obter(origem, destino) if geometria else None
+            if rota is not None:
+                return {**rota, 'geometria': geometria}
+
+        rota = self._consultar_rota(origem, destino, geometria=True)
+        if rota is None or not rota.get('geometria'):
+            return None
+        if self.cache:
+            dados = {k: v for k, v in rota.items() if k != 'geometria'}
+            self.cache.salvar(origem, destino, dados, rota['geometria'])
+        return rota
+
+    def calcular_geometrias(self, pares: List[Tuple[Tuple[float, float], Tuple[float, float]]]) -> List[Optional[Dict]]:
+        """calcular_geometria para vários pares (origem, destino), na mesma ordem"""
+        return list(self._mapear(lambda par: self.calcular_geometria(*par), pares))
+
+    def _consultar_rota(self, origem: Tuple[float, float], destino: Tuple[float, float],
+                        geometria: bool = False) -> Optional[Dict]:
+        """Faz a requisição /route ao OSRM (sem passar pelo cache)"""
+        if self.backend is not None:
+            if geometria:
+                return self.backend.calcular_distancia(origem, destino, geometria=True)
+            return self.backend.calcular_distancia(origem, destino)
+
         try:
             # OSRM usa formato: longitude,latitude (inverso!)
             url = f"{self.servidor_osrm}/route/v1/driving/{origem[1]},{origem[0]};{destino[1]},{destino[0]}"
 
             params = {
-                'overview': 'false',  # Não precisa da geometria completa
+                # Geometria completa só quando o trajeto vai ser desenhado
+                'overview': 'full' if geometria else 'false',
                 'steps': 'false'       # Não precisa das instruções passo a passo
             }
+            if geometria:
+                params['geometries'] = 'polyline'
 
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-
-            data = response.json()
+            data = self.cliente_http.get_json(url, params=params)
 
             if data.get('code') == 'Ok' and 'routes' in data and len(data['routes']) > 0:
                 route = data['routes'][0]
 
-                return {
-                    'distancia_metros': route['distance'],
-                    'distancia_km': round(route['distance'] / 1000, 2),
-                    'duracao_segundos': route['duration'],
-                    'duracao_minutos': round(route['duration'] / 60, 1)
-                }
+                rota = self._formatar_rota(route['distance'], route['duration'])
+                if geometria:
+                    rota['geometria'] = route.get('geometry')
+                return rota
             else:
                 print(f"Erro na resposta OSRM: {data.get('code', 'desconhecido')}")
                 return None
@@ -62,10 +212,197 @@ class CalculadorDistancias:
             print(f"Erro inesperado: {e}")
             return None
 
-    def calcular_matriz_distancias(self, escolas: List[Dict]) -> Dict:
+    def _consultar_tabela(self, coordenadas: List[Tuple[float, float]],
+                          fontes: List[int], destinos: List[int]) -> Optional[Dict]:
+        """
+        Faz uma única requisição ao serviço /table do OSRM
+
+        Args:
+            coordenadas: Lista de tuplas (latitude, longitude)
+            fontes: Índices (em coordenadas) usados como origem
+            destinos: Índices (em coordenadas) usados como destino
+
+        Returns:
+            Dicionário com as listas 'durations' e 'distances' ou None se houver erro
+        """
+        try:
+            # OSRM usa formato: longitude,latitude (inverso!)
+            pontos = ';'.join(f"{lon},{lat}" for lat, lon in coordenadas)
+            url = f"{self.servidor_osrm}/table/v1/driving/{pontos}"
+
+            params = {
+                'sources': ';'.join(str(i) for i in fontes),
+                'destinations': ';'.join(str(i) for i in destinos),
+                'annotations': 'duration,distance'
+            }
+
+            data = self.cliente_http.get_json(url, params=params, timeout_leitura=30)
+
+            if data.get('code') == 'Ok' and 'durations' in data and 'distances' in data:
+                return data
+            else:
+                print(f"Erro na resposta OSRM: {data.get('code', 'desconhecido')}")
+                return None
+
+        except requests.exceptions.RequestException as e:
+            print(f"Erro ao calcular tabela: {e}")
+            return None
+        except Exception as e:
+            print(f"Erro inesperado: {e}")
+            return None
+
+    def calcular_tabela(self, origens: List[Tuple[float, float]],
+                        destinos: List[Tuple[float, float]]) -> List[List[Optional[Dict]]]:
+        """
+        Calcula rotas de todas as origens para todos os destinos usando o
+        serviço /table do OSRM, dividindo em blocos quando o número de
+        coordenadas excede o limite do servidor
+
+        Args:
+            origens: Lista de tuplas (latitude, longitude) de origem
+            destinos: Lista de tuplas (latitude, longitude) de destino
+
+        Returns:
+            Matriz len(origens) x len(destinos) com dicionários de rota
+            (mesmo formato de calcular_distancia) ou None onde não há rota
+        """
+        if self.backend is not None:
+            return self.backend.calcular_tabela(origens, destinos)
+
+        resultado = [[None] * len(destinos) for _ in origens]
+        if not origens or not destinos:
+            return resultado
+
+        # Cada requisição leva um bloco de origens e um bloco de destinos
+        tamanho_bloco = self.max_coordenadas_tabela // 2
+        blocos_origem = [range(i, min(i + tamanho_bloco, len(origens)))
+                         for i in range(0, len(origens), tamanho_bloco)]
+        blocos_destino = [range(j, min(j + tamanho_bloco, len(destinos)))
+                          for j in range(0, len(destinos), tamanho_bloco)]
+        blocos = [(bloco_o, bloco_d) for bloco_o in blocos_origem for bloco_d in blocos_destino]
+
+        def calcular(bloco):
+            return self._calcular_bloco(origens, destinos, *bloco)
+
+        # Os blocos são independentes: as requisições saem em paralelo e os
+        # resultados são gravados na posição de cada bloco
+        for k, ((bloco_o, bloco_d), (rotas, situacao)) in enumerate(
+                zip(blocos, self._mapear(calcular, blocos)), 1):
+            for a, i in enumerate(bloco_o):
+                for b, j in enumerate(bloco_d):
+                    resultado[i][j] = rotas[a][b]
+
+            if situacao == 'erro':
+                print(f"✗ Erro no bloco {k}/{len(blocos)}")
+            elif situacao == 'osrm' and len(blocos) > 1:
+                print(f"[{k}/{len(blocos)}] Bloco de "
+                      f"{len(bloco_o)}x{len(bloco_d)} rotas calculado")
+
+        return resultado
+
+    def _calcular_bloco(self, origens: List[Tuple[float, float]],
+                        destinos: List[Tuple[float, float]],
+                        bloco_o: range, bloco_d: range):
+        """
+        Calcula um bloco origens[bloco_o] x destinos[bloco_d] da tabela
+
+        Returns:
+            Tupla (rotas, situacao): matriz do bloco e 'cache' (nenhuma
+            requisição necessária), 'osrm' (calculado) ou 'erro'
+        """
+        rotas = [[None] * len(bloco_d) for _ in bloco_o]
+
+        # Bloco inteiro já em cache: nenhuma requisição necessária
+        if self.cache:
+            encontradas = iter(self.cache.obter_varias(
+                [(origens[i], destinos[j]) for i in bloco_o for j in bloco_d]))
+            rotas = [[next(encontradas) for _ in bloco_d] for _ in bloco_o]
+            if all(rota is not None for linha in rotas for rota in linha):
+                return rotas, 'cache'
+
+        if origens is destinos and bloco_o == bloco_d:
+            # Bloco da diagonal: as mesmas coordenadas são origem e destino
+            coordenadas = [origens[i] for i in bloco_o]
+            fontes = alvos = list(range(len(coordenadas)))
+        else:
+            coordenadas = [origens[i] for i in bloco_o] + [destinos[j] for j in bloco_d]
+            fontes = list(range(len(bloco_o)))
+            alvos = list(range(len(bloco_o), len(coordenadas)))
+
+        data = self._consultar_tabela(coordenadas, fontes, alvos)
+        if not data:
+            return rotas, 'erro'
+
+        novas = []
+        for a, i in enumerate(bloco_o):
+            for b, j in enumerate(bloco_d):
+                duracao = data['durations'][a][b]
+                distancia = data['distances'][a][b]
+                if duracao is not None and distancia is not None:
+                    rotas[a][b] = self._formatar_rota(distancia, duracao)
+                    novas.append((origens[i], destinos[j], rotas[a][b]))
+
+        if self.cache:
+            self.cache.salvar_varias(novas)
+
+        return rotas, 'osrm'
+
+    def calcular_matriz_distancias(self, escolas: List[Dict], modo: str = 'tabela') -> Dict:
         """
         Calcula matriz de distâncias entre todas as escolas
 
+        Args:
+            escolas: Lista de escolas com coordenadas
+            modo: 'tabela' (serviço /table do OSRM, poucas requisições) ou
+                  'rota' (uma requisição /route por par de escolas)
+
+        Returns:
+            Dicionário com matriz de distâncias
+        """
+        if modo == 'rota':
+            return self._calcular_matriz_por_rota(escolas)
+
+        com_coords = []
+        for escola in escolas:
+            if 'latitude' not in escola or 'longitude' not in escola:
+                print(f"⚠️  Escola {escola['nome_usual']} sem coordenadas, pulando...")
+                continue
+            com_coords.append(escola)
+
+        print(f"Calculando matriz de distâncias para {len(com_coords)} escolas...")
+        print(f"Total de rotas: {len(com_coords) * (len(com_coords) - 1)} "
+              f"(serviço /table, até {self.max_coordenadas_tabela} coordenadas por requisição)\n")
+
+        coords = [(e['latitude'], e['longitude']) for e in com_coords]
+        tabela = self.calcular_tabela(coords, coords)
+
+        matriz = {}
+        calculos_feitos = 0
+        for i, escola_origem in enumerate(com_coords):
+            origem_key = escola_origem['nome_usual']
+            matriz.setdefault(origem_key, {})
+
+            for j, escola_destino in enumerate(com_coords):
+                if i == j:
+                    continue
+
+                destino_key = escola_destino['nome_usual']
+                rota = tabela[i][j]
+
+                if rota:
+                    matriz[origem_key][destino_key] = rota
+                    calculos_feitos += 1
+                else:
+                    print(f"✗ Erro: {origem_key} → {destino_key}")
+
+        print(f"\n{calculos_feitos} rotas calculadas")
+
+        return matriz
+
+    def _calcular_matriz_por_rota(self, escolas: List[Dict]) -> Dict:
+        """
+        Calcula matriz de distâncias com uma requisição /route por par de escolas
+
         Args:
             escolas: Lista de escolas com coordenadas
 
@@ -79,14 +416,13 @@ class CalculadorDistancias:
         print(f"Calculando matriz de distâncias para {len(escolas)} escolas...")
         print(f"Total de cálculos necessários: {total_calculos}\n")
 
+        pares = []
         for i, escola_origem in enumerate(escolas):
             if 'latitude' not in escola_origem or 'longitude' not in escola_origem:
                 print(f"⚠️  Escola {escola_origem['nome_usual']} sem coordenadas, pulando...")
                 continue
 
-            origem_key = escola_origem['nome_usual']
-            if origem_key not in matriz:
-                matriz[origem_key] = {}
+            matriz.setdefault(escola_origem['nome_usual'], {})
 
             for j, escola_destino in enumerate(escolas):
                 if i >= j:  # Evita calcular duplicados e distância para si mesmo
@@ -95,38 +431,47 @@ class CalculadorDistancias:
                 if 'latitude' not in escola_destino or 'longitude' not in escola_destino:
                     continue
 
-                destino_key = escola_destino['nome_usual']
-
-                origem_coords = (escola_origem['latitude'], escola_origem['longitude'])
-                destino_coords = (escola_destino['latitude'], escola_destino['longitude'])
+                pares.append((escola_origem, escola_destino))
 
-                rota = self.calcular_distancia(origem_coords, destino_coords)
+        def calcular(par):
+            escola_origem, escola_destino = par
+            return self.calcular_distancia(
+                (escola_origem['latitude'], escola_origem['longitude']),
+                (escola_destino['latitude'], escola_destino['longitude'])
+            )
 
-                if rota:
-                    # Adiciona nas duas direções (assumindo que a distância é a mesma)
-                    matriz[origem_key][destino_key] = rota
+        for (escola_origem, escola_destino), rota in zip(pares, self._mapear(calcular, pares)):
+            origem_key = escola_origem['nome_usual']
+            destino_key = escola_destino['nome_usual']
 
-                    if destino_key not in matriz:
-                        matriz[destino_key] = {}
-                    matriz[destino_key][origem_key] = rota
+            if rota:
+                # Adiciona nas duas direções (assumindo que a distância é a mesma)
+                matriz[origem_key][destino_key] = rota
+                matriz.setdefault(destino_key, {})[origem_key] = rota
 
-                    calculos_feitos += 1
-                    print(f"[{calculos_feitos}/{total_calculos}] {origem_key} → {destino_key}: "
-                          f"{rota['distancia_km']} km, {rota['duracao_minutos']} min")
-                else:
-                    print(f"✗ Erro: {origem_key} → {destino_key}")
+                calculos_feitos += 1
+                print(f"[{calculos_feitos}/{total_calculos}] {origem_key} → {destino_key}: "
+                      f"{rota['distancia_km']} km, {rota['duracao_minutos']} min")
+            else:
+                print(f"✗ Erro: {origem_key} → {destino_key}")
 
         return matriz
 
     def encontrar_escolas_proximas(self, escola_ref: Dict, outras_escolas: List[Dict],
-                                   limite: int = 5) -> List[Dict]:
+                                   limite: int = 5, fator_candidatos: Optional[int] = 4) -> List[Dict]:
         """
         Encontra as escolas mais próximas de uma escola de referência
 
+        Antes de consultar o OSRM, ordena as candidatas pela distância em
+        linha reta (haversine vetorizado) e só calcula a rota real das
+        limite * fator_candidatos mais próximas.
+
         Args:
             escola_ref: Escola de referência
             outras_escolas: Lista de outras escolas
             limite: Número máximo de escolas a retornar
+            fator_candidatos: Multiplicador de candidatas confirmadas por rota
+                              (None calcula a rota para todas as escolas)
 
         Returns:
             Lista de escolas mais próximas com suas distâncias
@@ -135,19 +480,34 @@ class CalculadorDistancias:
             print(f"⚠️  Escola {escola_ref['nome_usual']} sem coordenadas")
             return []
 
-        ref_coords = (escola_ref['latitude'], escola_ref['longitude'])
-        distancias = []
-
-        for escola in outras_escolas:
-            if escola['id'] == escola_ref['id']:
-                continue
+        candidatas = [
+            e for e in outras_escolas
+            if e['id'] != escola_ref['id']
+            and e.get('latitude') is not None and e.get('longitude') is not None
+        ]
+        if not candidatas:
+            return []
 
-            if 'latitude' not in escola or 'longitude' not in escola:
-                continue
+        if fator_candidatos:
+            linha_reta = distancias_haversine_km(
+                escola_ref['latitude'], escola_ref['longitude'],
+                [e['latitude'] for e in candidatas],
+                [e['longitude'] for e in candidatas]
+            )
+            quantidade = max(limite * fator_candidatos, limite + 4)
+            if quantidade < len(candidatas):
+                indices = np.argpartition(linha_reta, quantidade)[:quantidade]
+                indices.sort()
+                candidatas = [candidatas[i] for i in indices]
 
-            escola_coords = (escola['latitude'], escola['longitude'])
-            rota = self.calcular_distancia(ref_coords, escola_coords)
+        ref_coords = (escola_ref['latitude'], escola_ref['longitude'])
+        rotas = self.calcular_tabela(
+            [ref_coords],
+            [(e['latitude'], e['longitude']) for e in candidatas]
+        )[0]
 
+        distancias = []
+        for escola, rota in zip(candidatas, rotas):
             if rota:
                 distancias.append({
                     'escola': escola,
@@ -170,6 +530,25 @@ class CalculadorDistancias:
 
         print(f"\n✅ Matriz salva em: {arquivo}")
 
+    def salvar_matriz_binaria(self, matriz: Dict, escolas: List[Dict],
+                              arquivo: str = "data/matriz_distancias.npy") -> MatrizDistancias:
+        """
+        Salva a matriz no formato binário indexado por ID (float32 + cabeçalho)
+
+        Args:
+            matriz: Matriz retornada por calcular_matriz_distancias
+            escolas: Escolas da matriz (para mapear nome_usual em ID)
+            arquivo: Caminho do .npy
+        """
+        binaria = MatrizDistancias.de_dicionario(matriz, escolas)
+        binaria.salvar(arquivo)
+        print(f"✅ Matriz binária salva em: {arquivo}")
+        return binaria
+
+    def carregar_matriz_binaria(self, arquivo: str = "data/matriz_distancias.npy") -> Optional[MatrizDistancias]:
+        """Abre a matriz binária mapeada em memória (None se não existir)"""
+        return carregar_matriz_binaria(arquivo)
+
     def carregar_matriz(self, arquivo: str = "data/matriz_distancias.json") -> Optional[Dict]:
         """Carrega matriz de distâncias de arquivo JSON"""
         import os
@@ -180,19 +559,22 @@ class CalculadorDistancias:
         with open(arquivo, 'r', encoding='utf-8') as f:
             return json.load(f)
 
-    def obter_distancia_entre(self, escola1: str, escola2: str,
-                              matriz: Dict) -> Optional[Dict]:
+    def obter_distancia_entre(self, escola1, escola2, matriz) -> Optional[Dict]:
         """
         Obtém distância entre duas escolas da matriz pré-calculada
 
         Args:
-            escola1: Nome usual da primeira escola
-            escola2: Nome usual da segunda escola
-            matriz: Matriz de distâncias pré-calculada
+            escola1: Nome usual (ou ID, na matriz binária) da primeira escola
+            escola2: Nome usual (ou ID, na matriz binária) da segunda escola
+            matriz: Matriz de distâncias pré-calculada (dicionário JSON ou
+                    MatrizDistancias)
 
         Returns:
             Dicionário com informações de distância ou None
         """
+        if isinstance(matriz, MatrizDistancias):
+            return matriz.obter(escola1, escola2) or matriz.obter(escola2, escola1)
+
         if escola1 in matriz and escola2 in matriz[escola1]:
             return matriz[escola1][escola2]
         elif escola2 in matriz and escola1 in matriz[escola2]:
@@ -1,12 +1,44 @@
 """
 Módulo para gerenciar dados das escolas de Taubaté
 """
-import json
 import os
 from typing import List, Dict, Optional
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
-import time
+import requests
+import threading
+from contextlib import contextmanager
+
+from armazenamento import ArmazenamentoJSON
+from banco_sqlite import BANCO_PADRAO, agora_utc, obter_banco
+from ceps import TabelaCeps, carregar_tabela_ceps
+from cache_geocodificacao import SEM_RESULTADO, CacheGeocodificacao, obter_cache_geocodificacao
+from http_cliente import ClienteHTTP, LimitadorTaxa, obter_cliente
+from indice_espacial import IndiceEspacial
+
+NOMINATIM_URL = os.environ.get('NOMINATIM_URL', "https://nominatim.openstreetmap.org/search")
+
+# Política de uso do Nominatim público: no máximo 1 requisição por segundo
+# (respostas vindas do cache de geocodificação não esperam)
+INTERVALO_NOMINATIM_SEGUNDOS = float(os.environ.get('INTERVALO_NOMINATIM_SEGUNDOS', '1'))
+
+# Estratégias de GerenciadorEscolas.localizar, da mais precisa para a menos precisa
+ESTRATEGIAS_GEOCODIFICACAO = (
+    'cep_local', 'endereco_cep', 'cep', 'endereco', 'nome_oficial', 'escola_nome_usual', 'nome_usual',
+)
+
+_limitador_nominatim = None
+_limitador_lock = threading.Lock()
+
+
+def _aguardar_intervalo_nominatim():
+    """Token bucket do processo: no máximo uma requisição ao Nominatim por intervalo"""
+    global _limitador_nominatim
+    if INTERVALO_NOMINATIM_SEGUNDOS <= 0:
+        return
+    with _limitador_lock:
+        taxa = 1 / INTERVALO_NOMINATIM_SEGUNDOS
+        if _limitador_nominatim is None or _limitador_nominatim.taxa != taxa:
+            _limitador_nominatim = LimitadorTaxa(taxa)
+    _limitador_nominatim.aguardar()
 
 # Dados das escolas baseados nos anexos fornecidos
 # Coordenadas pre-carregadas para escolas do Bloco 1 (geocodificadas via Nominatim)
@@ -77,38 +109,48 @@ BLOCO_1 = [
 class GerenciadorEscolas:
     def __init__(self, arquivo_dados: str = "data/escolas.json"):
         self.arquivo_dados = arquivo_dados
+        self._armazenamento = ArmazenamentoJSON(arquivo_dados)
         self.escolas = []
-        self.geolocator = Nominatim(user_agent="gestor_visitas_escolas_taubate")
+        self._indice = None
+        self._por_id = None
         self._carregar_dados()
 
     def _carregar_dados(self):
         """Carrega dados das escolas do arquivo JSON"""
-        if os.path.exists(self.arquivo_dados):
-            with open(self.arquivo_dados, 'r', encoding='utf-8') as f:
-                self.escolas = json.load(f)
-            # Mescla coordenadas do codigo fonte para escolas sem coordenadas
-            self._mesclar_coordenadas()
-        else:
-            self.escolas = [e.copy() for e in ESCOLAS_TAUBATE]
-            self._salvar_dados()
+        # Sob a trava: dois processos iniciando juntos não criam o arquivo por cima um do outro
+        with self._armazenamento.trava():
+            if self._armazenamento.existe():
+                self.escolas = self._armazenamento.ler()
+                # Mescla coordenadas do codigo fonte para escolas sem coordenadas
+                self._mesclar_coordenadas()
+            else:
+                self.escolas = [e.copy() for e in ESCOLAS_TAUBATE]
+                self._salvar_dados()
 
     def _mesclar_coordenadas(self):
         """Atualiza escolas sem coordenadas com dados do codigo fonte"""
         coords_padrao = {e['id']: e for e in ESCOLAS_TAUBATE if 'latitude' in e}
-        atualizado = False
-        for escola in self.escolas:
-            if 'latitude' not in escola and escola['id'] in coords_padrao:
-                escola['latitude'] = coords_padrao[escola['id']]['latitude']
-                escola['longitude'] = coords_padrao[escola['id']]['longitude']
-                atualizado = True
-        if atualizado:
+        if not any('latitude' not in e and e['id'] in coords_padrao for e in self.escolas):
+            return
+        with self._alteracao():
+            for escola in self.escolas:
+                if 'latitude' not in escola and escola['id'] in coords_padrao:
+                    escola['latitude'] = coords_padrao[escola['id']]['latitude']
+                    escola['longitude'] = coords_padrao[escola['id']]['longitude']
             self._salvar_dados()
 
     def _salvar_dados(self):
-        """Salva dados das escolas no arquivo JSON"""
-        os.makedirs(os.path.dirname(self.arquivo_dados), exist_ok=True)
-        with open(self.arquivo_dados, 'w', encoding='utf-8') as f:
-            json.dump(self.escolas, f, ensure_ascii=False, indent=2)
+        """Salva dados das escolas no arquivo JSON (gravação atômica)"""
+        self._indice = None
+        self._por_id = None
+        self._armazenamento.gravar(self.escolas)
+
+    @contextmanager
+    def _alteracao(self):
+        """Trava o arquivo e recarrega as escolas antes de ler-alterar-gravar"""
+        with self._armazenamento.trava():
+            self._recarregar_do_disco()
+            yield
 
     def fazer_match_bloco1(self) -> List[Dict]:
         """Faz o match entre as escolas do Bloco 1 e a lista completa.
@@ -149,78 +191,118 @@ class GerenciadorEscolas:
 
         return escolas_bloco1
 
-    def _geocode_com_retry(self, query: str, max_tentativas: int = 3) -> Optional[tuple]:
-        """Tenta geocodificar com retry em caso de timeout"""
-        for tentativa in range(max_tentativas):
-            try:
-                location = self.geolocator.geocode(query, timeout=10)
-                if location:
-                    return (location.latitude, location.longitude)
-                return None
-            except GeocoderTimedOut:
-                if tentativa < max_tentativas - 1:
-                    time.sleep(1)
-                    continue
-                return None
-            except Exception as e:
-                print(f"Erro ao geocodificar {query}: {e}")
-                return None
-        return None
+    @property
+    def cliente_http(self) -> ClienteHTTP:
+        """Cliente HTTP compartilhado do Nominatim (pool, retry e disjuntor)"""
+        return obter_cliente('nominatim')
+
+    @property
+    def cache_geocodificacao(self) -> CacheGeocodificacao:
+        """Cache persistente de consultas (compartilhado com o Django)"""
+        return obter_cache_geocodificacao()
+
+    @property
+    def tabela_ceps(self) -> Optional[TabelaCeps]:
+        """Tabela local CEP -> centroide (None se data/ceps.npy não existir)"""
+        return carregar_tabela_ceps()
+
+    def _geocode_com_retry(self, query: str) -> Optional[tuple]:
+        """
+        Geocodifica uma consulta: primeiro no cache, depois no Nominatim
+        (retry/backoff feitos pelo cliente HTTP)
+
+        Consultas sem resultado ficam no cache por um tempo; erros de rede não.
+        """
+        cache = self.cache_geocodificacao
+        coords = cache.obter(query)
+        if coords is not None:
+            return None if coords == SEM_RESULTADO else coords
+
+        _aguardar_intervalo_nominatim()
+        try:
+            resultados = self.cliente_http.get_json(
+                NOMINATIM_URL, params={'q': query, 'format': 'json', 'limit': 1}
+            )
+        except requests.exceptions.RequestException as e:
+            print(f"Erro ao geocodificar {query}: {e}")
+            return None
+
+        coords = (float(resultados[0]['lat']), float(resultados[0]['lon'])) if resultados else None
+        cache.salvar(query, coords)
+        return coords
+
+    def consultas_geocodificacao(self, escola: Dict) -> List[tuple]:
+        """
+        Consultas aplicáveis à escola, da mais precisa para a menos precisa
+
+        Returns:
+            Lista de (estratégia, consulta); 'cep_local' é a tabela de CEPs
+            (só entra se ela existir), as demais vão ao cache/Nominatim
+        """
+        consultas = []
+        if escola.get('cep') and self.tabela_ceps is not None:
+            consultas.append(('cep_local', escola['cep']))
+        if escola.get('cep') and escola.get('endereco'):
+            consultas.append(('endereco_cep', f"{escola['endereco']}, {escola['cep']}, Taubaté, SP, Brasil"))
+        if escola.get('cep'):
+            consultas.append(('cep', f"{escola['cep']}, Brasil"))
+        if escola.get('endereco'):
+            consultas.append(('endereco', f"{escola['endereco']}, Taubaté, SP, Brasil"))
+        consultas.append(('nome_oficial', f"{escola['nome_oficial']}, Taubaté, SP, Brasil"))
+        consultas.append(('escola_nome_usual', f"Escola {escola['nome_usual']}, Taubaté, SP, Brasil"))
+        consultas.append(('nome_usual', f"{escola['nome_usual']}, Taubaté, SP, Brasil"))
+        return consultas
+
+    def localizar(self, escola: Dict, ao_consultar=None) -> tuple:
+        """
+        Tenta as consultas em ordem até uma encontrar coordenadas (não grava nada)
+
+        Args:
+            escola: Dicionário da escola
+            ao_consultar: Função opcional chamada com (estratégia, coords ou None)
+                          após cada consulta
+
+        Returns:
+            (coords, estratégia que encontrou) ou (None, None)
+        """
+        for estrategia, consulta in self.consultas_geocodificacao(escola):
+            if estrategia == 'cep_local':
+                # Centroide do CEP na tabela local (sem rede)
+                coords = self.tabela_ceps.obter(consulta)
+            else:
+                coords = self._geocode_com_retry(consulta)
+            if ao_consultar:
+                ao_consultar(estrategia, coords)
+            if coords:
+                return coords, estrategia
+        return None, None
 
     def obter_coordenadas(self, escola: Dict) -> Optional[tuple]:
         """Obtém coordenadas geográficas de uma escola"""
         # Se já tem coordenadas salvas, retorna
-        if 'latitude' in escola and 'longitude' in escola:
+        if escola.get('latitude') is not None and escola.get('longitude') is not None:
             return (escola['latitude'], escola['longitude'])
 
-        coords = None
+        coords, _ = self.localizar(escola)
 
-        # Tenta primeiro com endereço + CEP (maior precisão)
-        if escola.get('cep') and escola.get('endereco'):
-            query = f"{escola['endereco']}, {escola['cep']}, Taubaté, SP, Brasil"
-            coords = self._geocode_com_retry(query)
-
-        # Tenta apenas com CEP
-        if not coords and escola.get('cep'):
-            query = f"{escola['cep']}, Brasil"
-            coords = self._geocode_com_retry(query)
-
-        # Tenta com endereço + cidade
-        if not coords and escola.get('endereco'):
-            query = f"{escola['endereco']}, Taubaté, SP, Brasil"
-            coords = self._geocode_com_retry(query)
-
-        # Tenta geocodificar com o nome oficial
-        if not coords:
-            query = f"{escola['nome_oficial']}, Taubaté, SP, Brasil"
-            coords = self._geocode_com_retry(query)
-
-        # Se não encontrou, tenta com nome usual
-        if not coords:
-            query = f"Escola {escola['nome_usual']}, Taubaté, SP, Brasil"
-            coords = self._geocode_com_retry(query)
-
-        # Se não encontrou, tenta apenas com bairro/região
-        if not coords:
-            query = f"{escola['nome_usual']}, Taubaté, SP, Brasil"
-            coords = self._geocode_com_retry(query)
-
-        if coords:
-            # Atualiza escola com coordenadas
-            for esc in self.escolas:
-                if esc['id'] == escola['id']:
+        if coords and escola.get('id') in self._escolas_por_id():
+            # Atualiza escola com coordenadas (a consulta fica fora da trava)
+            with self._alteracao():
+                esc = self._escolas_por_id().get(escola['id'])
+                if esc is not None:
                     esc['latitude'] = coords[0]
                     esc['longitude'] = coords[1]
-                    break
-            self._salvar_dados()
-
-        # Aguarda para não sobrecarregar o serviço
-        time.sleep(1)
+                    self._salvar_dados()
 
         return coords
 
     def geocodificar_todas_bloco1(self):
-        """Geocodifica todas as escolas do Bloco 1"""
+        """
+        Geocodifica todas as escolas do Bloco 1 (JSON legado)
+
+        Para importações grandes no banco do Django use
+        `python manage.py geocodificar` (em blocos, retomável).
+        """
         escolas_bloco1 = self.fazer_match_bloco1()
 
         print(f"Geocodificando {len(escolas_bloco1)} escolas do Bloco 1...\n")
@@ -244,14 +326,14 @@ class GerenciadorEscolas:
 
     def buscar_escola(self, termo: str) -> Optional[Dict]:
         """Busca uma escola por nome usual ou ID"""
+        self._recarregar_do_disco()
         termo_lower = termo.lower().strip()
 
         # Tenta buscar por ID
         try:
-            escola_id = int(termo)
-            for escola in self.escolas:
-                if escola['id'] == escola_id:
-                    return escola
+            escola = self._escolas_por_id().get(int(termo))
+            if escola is not None:
+                return escola
         except ValueError:
             pass
 
@@ -264,70 +346,89 @@ class GerenciadorEscolas:
 
     def atualizar_diretor(self, escola_id: int, nome_diretor: str) -> bool:
         """Atualiza o diretor de uma escola"""
-        for escola in self.escolas:
-            if escola['id'] == escola_id:
-                escola['diretor'] = nome_diretor
-                self._salvar_dados()
-                return True
-        return False
+        with self._alteracao():
+            escola = self._escolas_por_id().get(escola_id)
+            if escola is None:
+                return False
+            escola['diretor'] = nome_diretor
+            self._salvar_dados()
+        return True
 
     def obter_diretor(self, escola_id: int) -> Optional[str]:
         """Obtém o nome do diretor de uma escola"""
-        for escola in self.escolas:
-            if escola['id'] == escola_id:
-                return escola.get('diretor', '')
-        return None
+        self._recarregar_do_disco()
+        escola = self._escolas_por_id().get(escola_id)
+        return escola.get('diretor', '') if escola is not None else None
 
     def atualizar_escola(self, escola_id: int, nome_oficial: str = None,
                         nome_usual: str = None, diretor: str = None,
                         mediador: str = None, endereco: str = None,
                         cep: str = None, bloco_1: bool = None) -> bool:
         """Atualiza dados de uma escola"""
-        for escola in self.escolas:
-            if escola['id'] == escola_id:
-                if nome_oficial is not None:
-                    escola['nome_oficial'] = nome_oficial
-                if nome_usual is not None:
-                    escola['nome_usual'] = nome_usual
-                if diretor is not None:
-                    escola['diretor'] = diretor
-                if mediador is not None:
-                    escola['mediador'] = mediador
-                if endereco is not None:
-                    escola['endereco'] = endereco
-                if cep is not None:
-                    escola['cep'] = cep
-                if bloco_1 is not None:
-                    escola['bloco_1'] = bloco_1
-                self._salvar_dados()
-                return True
-        return False
+        with self._alteracao():
+            escola = self._escolas_por_id().get(escola_id)
+            if escola is None:
+                return False
+            if nome_oficial is not None:
+                escola['nome_oficial'] = nome_oficial
+            if nome_usual is not None:
+                escola['nome_usual'] = nome_usual
+            if diretor is not None:
+                escola['diretor'] = diretor
+            if mediador is not None:
+                escola['mediador'] = mediador
+            if endereco is not None:
+                escola['endereco'] = endereco
+            if cep is not None:
+                escola['cep'] = cep
+            if bloco_1 is not None:
+                escola['bloco_1'] = bloco_1
+            self._salvar_dados()
+        return True
 
     def adicionar_escola(self, nome_oficial: str, nome_usual: str, diretor: str = "",
                          mediador: str = "", endereco: str = "", cep: str = "",
                          bloco_1: bool = False) -> Dict:
         """Adiciona uma nova escola"""
-        novo_id = max(e['id'] for e in self.escolas) + 1 if self.escolas else 1
-        nova_escola = {
-            'id': novo_id,
-            'nome_oficial': nome_oficial,
-            'nome_usual': nome_usual,
-            'diretor': diretor,
-            'mediador': mediador,
-            'endereco': endereco,
-            'cep': cep,
-            'origem': 'manual',
-            'bloco_1': bloco_1
-        }
-        self.escolas.append(nova_escola)
-        self._salvar_dados()
+        with self._alteracao():
+            novo_id = max(self._escolas_por_id(), default=0) + 1
+            nova_escola = {
+                'id': novo_id,
+                'nome_oficial': nome_oficial,
+                'nome_usual': nome_usual,
+                'diretor': diretor,
+                'mediador': mediador,
+                'endereco': endereco,
+                'cep': cep,
+                'origem': 'manual',
+                'bloco_1': bloco_1
+            }
+            self.escolas.append(nova_escola)
+            self._salvar_dados()
         return nova_escola
 
     def _recarregar_do_disco(self):
-        """Recarrega escolas do JSON — necessário em ambientes multi-worker (Gunicorn)"""
-        if os.path.exists(self.arquivo_dados):
-            with open(self.arquivo_dados, 'r', encoding='utf-8') as f:
-                self.escolas = json.load(f)
+        """
+        Recarrega escolas do JSON — necessário em ambientes multi-worker (Gunicorn)
+
+        Só relê o arquivo se outro processo o alterou (senão custa um os.stat)
+        """
+        if self._armazenamento.alterado() and self._armazenamento.existe():
+            self.escolas = self._armazenamento.ler()
+            self._indice = None
+            self._por_id = None
+
+    def _escolas_por_id(self) -> Dict[int, Dict]:
+        """Índice id -> escola (reconstruído quando os dados mudam)"""
+        if getattr(self, '_por_id', None) is None:
+            self._por_id = {e['id']: e for e in self.escolas}
+        return self._por_id
+
+    def indice_espacial(self) -> IndiceEspacial:
+        """Índice espacial das escolas com coordenadas (reconstruído quando os dados mudam)"""
+        if getattr(self, '_indice', None) is None:
+            self._indice = IndiceEspacial(self.escolas)
+        return self._indice
 
     def listar_escolas_ativas(self) -> List[Dict]:
         """Retorna escolas do Bloco 1 + escolas adicionadas manualmente"""
@@ -339,18 +440,190 @@ class GerenciadorEscolas:
 
     def remover_escola(self, escola_id: int) -> bool:
         """Remove uma escola manual pelo ID"""
-        for i, escola in enumerate(self.escolas):
-            if escola['id'] == escola_id:
-                if escola.get('origem') != 'manual':
-                    return False  # Não permite remover escolas do sistema
-                self.escolas.pop(i)
-                self._salvar_dados()
-                return True
-        return False
+        with self._alteracao():
+            escola = self._escolas_por_id().get(escola_id)
+            if escola is None:
+                return False
+            if escola.get('origem') != 'manual':
+                return False  # Não permite remover escolas do sistema
+            self.escolas = [e for e in self.escolas if e is not escola]
+            self._salvar_dados()
+        return True
 
     def obter_escola(self, escola_id: int) -> Optional[Dict]:
         """Obtém uma escola por ID"""
-        for escola in self.escolas:
-            if escola['id'] == escola_id:
-                return escola
-        return None
+        self._recarregar_do_disco()
+        return self._escolas_por_id().get(escola_id)
+
+
+# ----------------------------------------------------------------------
+# Banco SQLite do Django (ARMAZENAMENTO_LEGADO=sqlite)
+
+_COLUNAS_ESCOLA = ('id, nome_oficial, nome_usual, diretor, mediador, endereco, cep, '
+                   'latitude, longitude, origem, bloco_1, ativo')
+
+
+def _escola_de_linha(linha) -> Dict:
+    """Linha de core_escola -> dicionário no formato do escolas.json"""
+    escola = {
+        'id': linha['id'],
+        'nome_oficial': linha['nome_oficial'],
+        'nome_usual': linha['nome_usual'],
+        'diretor': linha['diretor'],
+        'mediador': linha['mediador'],
+        'endereco': linha['endereco'],
+        'cep': linha['cep'],
+        'origem': linha['origem'],
+        'bloco_1': bool(linha['bloco_1']),
+        'ativo': bool(linha['ativo']),
+    }
+    # Como no JSON: escola ainda não geocodificada não tem as chaves de coordenadas
+    if linha['latitude'] is not None and linha['longitude'] is not None:
+        escola['latitude'] = linha['latitude']
+        escola['longitude'] = linha['longitude']
+    return escola
+
+
+class GerenciadorEscolasSQL(GerenciadorEscolas):
+    """
+    GerenciadorEscolas sobre a tabela core_escola do banco do Django
+
+    self.escolas é um cache da tabela, relido só quando o banco muda (cada
+    acesso confere a versão do banco, sem consultar a tabela). As
+    escolas iniciais vêm do python manage.py init_db (nada é semeado aqui).
+    Alterações de posição (latitude, longitude, bloco_1...) gravam
+    posicao_atualizada_em, então python manage.py recalcular_matriz encontra
+    as linhas da matriz de distâncias a recalcular (os sinais do Django não
+    disparam fora do ORM).
+    """
+
+    # Campos que mudam a tabela de distâncias (os mesmos do sinal da escola)
+    CAMPOS_ROTEAMENTO = ('latitude', 'longitude', 'ativo', 'bloco_1', 'origem')
+
+    def __init__(self, banco: str = BANCO_PADRAO):
+        self.banco = obter_banco(banco)
+        self._escolas = []
+        self._indice = None
+        self._por_id = None
+        self._versao = None
+        self._carregar_dados()
+
+    @property
+    def escolas(self) -> List[Dict]:
+        self._recarregar_do_disco()
+        return self._escolas
+
+    def _carregar_dados(self):
+        """Confere o esquema e lê as escolas do banco"""
+        self.banco.verificar_tabelas('core_escola', 'core_versaodados')
+        self._recarregar_do_disco()
+        if not self.escolas:
+            print("[AVISO]Nenhuma escola no banco: rode python manage.py init_db")
+
+    def _recarregar_do_disco(self):
+        """Relê core_escola só se o banco mudou desde a última leitura"""
+        versao = self.banco.versao()
+        if versao != self._versao:
+            linhas = self.banco.consultar(f'SELECT {_COLUNAS_ESCOLA} FROM core_escola ORDER BY id')
+            self._escolas = [_escola_de_linha(linha) for linha in linhas]
+            self._indice = None
+            self._por_id = None
+            self._versao = versao
+
+    @contextmanager
+    def _alteracao(self, *versoes: str):
+        """
+        Transação de escrita no banco
+
+        Args:
+            versoes: Conjuntos de core_versaodados incrementados no fim da
+                     transação (os índices em memória do Django conferem essa
+                     versão para saber que os dados mudaram)
+        """
+        with self.banco.transacao() as conn:
+            yield conn
+            for nome in versoes:
+                conn.execute('INSERT INTO core_versaodados (nome, versao) VALUES (?, 1) '
+                             'ON CONFLICT(nome) DO UPDATE SET versao = versao + 1', (nome,))
+
+    def _atualizar(self, escola_id: int, **campos) -> bool:
+        """
+        UPDATE de core_escola com atualizado_em (e posicao_atualizada_em, se
+        algum campo de roteamento mudou); False se a escola não existe
+        """
+        campos['atualizado_em'] = agora_utc()
+        roteamento = [coluna for coluna in campos if coluna in self.CAMPOS_ROTEAMENTO]
+        with self._alteracao('escolas') as conn:
+            if roteamento:
+                linha = conn.execute(f'SELECT {", ".join(roteamento)} FROM core_escola WHERE id = ?',
+                                     (escola_id,)).fetchone()
+                if linha is not None and tuple(linha) != tuple(campos[c] for c in roteamento):
+                    campos['posicao_atualizada_em'] = campos['atualizado_em']
+            atribuicoes = ', '.join(f'{coluna} = ?' for coluna in campos)
+            cursor = conn.execute(f'UPDATE core_escola SET {atribuicoes} WHERE id = ?',
+                                  (*campos.values(), escola_id))
+        return cursor.rowcount > 0
+
+    def obter_coordenadas(self, escola: Dict) -> Optional[tuple]:
+        """Obtém coordenadas geográficas de uma escola (e as grava no banco)"""
+        if escola.get('latitude') is not None and escola.get('longitude') is not None:
+            return (escola['latitude'], escola['longitude'])
+
+        coords, _ = self.localizar(escola)
+
+        if coords and escola.get('id') is not None:
+            with self._alteracao() as conn:
+                linha = conn.execute('SELECT endereco, cep FROM core_escola WHERE id = ?',
+                                     (escola['id'],)).fetchone()
+                if linha is not None:
+                    # Mesmo formato de Escola.chave_endereco
+                    self._atualizar(escola['id'], latitude=coords[0], longitude=coords[1],
+                                    endereco_geocodificado=f"{linha['endereco'].strip()}|{linha['cep'].strip()}")
+
+        return coords
+
+    def atualizar_diretor(self, escola_id: int, nome_diretor: str) -> bool:
+        """Atualiza o diretor de uma escola"""
+        return self._atualizar(escola_id, diretor=nome_diretor)
+
+    def atualizar_escola(self, escola_id: int, nome_oficial: str = None,
+                        nome_usual: str = None, diretor: str = None,
+                        mediador: str = None, endereco: str = None,
+                        cep: str = None, bloco_1: bool = None) -> bool:
+        """Atualiza dados de uma escola"""
+        campos = {'nome_oficial': nome_oficial, 'nome_usual': nome_usual, 'diretor': diretor,
+                  'mediador': mediador, 'endereco': endereco, 'cep': cep, 'bloco_1': bloco_1}
+        return self._atualizar(escola_id, **{k: v for k, v in campos.items() if v is not None})
+
+    def adicionar_escola(self, nome_oficial: str, nome_usual: str, diretor: str = "",
+                         mediador: str = "", endereco: str = "", cep: str = "",
+                         bloco_1: bool = False) -> Dict:
+        """Adiciona uma nova escola"""
+        agora = agora_utc()
+        with self._alteracao('escolas') as conn:
+            cursor = conn.execute(
+                'INSERT INTO core_escola (nome_oficial, nome_usual, diretor, mediador, endereco, cep, '
+                'endereco_geocodificado, origem, bloco_1, ativo, criado_em, atualizado_em, '
+                'posicao_atualizada_em) '
+                "VALUES (?, ?, ?, ?, ?, ?, '', 'manual', ?, 1, ?, ?, ?)",
+                (nome_oficial, nome_usual, diretor, mediador, endereco, cep, bloco_1, agora, agora, agora))
+            linha = conn.execute(f'SELECT {_COLUNAS_ESCOLA} FROM core_escola WHERE id = ?',
+                                 (cursor.lastrowid,)).fetchone()
+        return _escola_de_linha(linha)
+
+    def remover_escola(self, escola_id: int) -> bool:
+        """Remove uma escola manual pelo ID (com o on_delete dos modelos do Django)"""
+        with self._alteracao('escolas', 'distancias') as conn:
+            linha = conn.execute('SELECT origem FROM core_escola WHERE id = ?', (escola_id,)).fetchone()
+            if linha is None or linha['origem'] != 'manual':
+                return False  # Não permite remover escolas do sistema
+            # SET_NULL
+            for tabela in ('core_visita', 'core_evento', 'core_mediador'):
+                conn.execute(f'UPDATE {tabela} SET escola_id = NULL WHERE escola_id = ?', (escola_id,))
+            # CASCADE
+            for tabela in ('core_distanciaescola', 'core_distanciarecalculo'):
+                conn.execute(f'DELETE FROM {tabela} WHERE origem_id = ? OR destino_id = ?',
+                             (escola_id, escola_id))
+            conn.execute('DELETE FROM core_itemgeocodificacao WHERE escola_id = ?', (escola_id,))
+            conn.execute('DELETE FROM core_escola WHERE id = ?', (escola_id,))
+        return True
@@ -0,0 +1,292 @@
+"""
+Módulo de formato dos snapshots dos gerenciadores legados
+
+Dois formatos em disco, detectados pelos primeiros bytes do arquivo:
+
+- 'json': JSON comum (o formato histórico), gravado compacto. Usa orjson
+  quando instalado e o json da biblioteca padrão caso contrário.
+- 'binario': contêiner com cabeçalho MAGICA. Os registros vão sem os campos
+  de texto grandes (ex.: observacoes, contribuicoes); os textos de cada
+  registro ficam codificados à parte, em uma seção no fim do arquivo. Na
+  leitura só os campos pequenos são decodificados: cada registro vira um
+  RegistroAdiado, que decodifica os seus textos no primeiro acesso a eles.
+  Registros cujos textos não foram lidos nem alterados são regravados com
+  os mesmos bytes, sem decodificar e codificar de novo.
+
+As seções do formato binário usam orjson (JSON) quando instalado, senão
+msgpack quando instalado, senão o json da biblioteca padrão; o codec usado
+fica gravado no cabeçalho.
+
+Layout binário:
+    MAGICA | codec (1 byte: j/m) | tamanho dos registros (<Q) | registros | textos
+"""
+import gc
+import json
+import os
+import struct
+from contextlib import contextmanager
+from typing import Any, Iterable, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MAGICA = b'GSNP\x01'
+FORMATOS = ('json', 'binario')
+
+# Formato de arquivos novos; arquivos existentes mantêm o formato em que estão
+FORMATO_PADRAO = os.environ.get('FORMATO_SNAPSHOT', 'json')
+
+# Chave do registro com (início, fim) dos seus textos na seção de textos
+CHAVE_ADIADOS = '_adiados'
+
+_CODECS = {b'j': 'json', b'm': 'msgpack'}
+_CABECALHO = struct.Struct('<Q')
+
+
+@contextmanager
+def _sem_coletor():
+    """
+    Pausa o coletor de ciclos: decodificar/codificar cria centenas de
+    milhares de dicts sem ciclos, e cada leva de alocações dispararia uma
+    varredura de todos os objetos vivos
+    """
+    ativo = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if ativo:
+            gc.enable()
+
+
+# ----------------------------------------------------------------------
+# Codecs
+
+def _json_para_bytes(dados: Any, indent: Optional[int] = None) -> bytes:
+    if orjson and indent in (None, 2):
+        opcoes = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(dados, option=opcoes)
+    if indent:
+        return json.dumps(dados, ensure_ascii=False, indent=indent).encode('utf-8')
+    return json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _json_de_bytes(dados) -> Any:
+    if orjson:
+        return orjson.loads(dados)
+    return json.loads(bytes(dados).decode('utf-8'))
+
+
+def _codec_binario() -> str:
+    return 'json' if orjson or not msgpack else 'msgpack'
+
+
+def _codificar(codec: str, dados: Any) -> bytes:
+    if codec == 'msgpack':
+        return msgpack.packb(dados, use_bin_type=True)
+    return _json_para_bytes(dados)
+
+
+def _decodificar(codec: str, dados) -> Any:
+    if codec == 'msgpack':
+        if msgpack is None:
+            raise ValueError("Snapshot gravado com msgpack, que não está instalado "
+                             "(pip install msgpack ou converta o arquivo para JSON)")
+        return msgpack.unpackb(dados, raw=False, strict_map_key=False)
+    return _json_de_bytes(dados)
+
+
+# ----------------------------------------------------------------------
+# Registro com campos adiados
+
+class RegistroAdiado(dict):
+    """
+    dict cujos campos de texto grandes só são decodificados no primeiro acesso
+
+    Leituras de campos já presentes (r['id'], r.get('data')) não decodificam
+    nada; qualquer operação sobre o registro inteiro (iterar, items(),
+    comparar, copiar, serializar) decodifica antes.
+    """
+    __slots__ = ('_bruto',)
+
+    def __init__(self, campos: dict, codec: str, bruto):
+        super().__init__(campos)
+        self._bruto = (codec, bruto)
+
+    def materializar(self):
+        """Decodifica os textos; valores já gravados no registro prevalecem"""
+        if self._bruto is not None:
+            (codec, bruto), self._bruto = self._bruto, None
+            for chave, valor in _decodificar(codec, bruto).items():
+                dict.setdefault(self, chave, valor)
+
+    def __missing__(self, chave):
+        if self._bruto is not None:
+            self.materializar()
+            if dict.__contains__(self, chave):
+                return dict.__getitem__(self, chave)
+        raise KeyError(chave)
+
+    def get(self, chave, padrao=None):
+        if self._bruto is not None and not dict.__contains__(self, chave):
+            self.materializar()
+        return dict.get(self, chave, padrao)
+
+    def __contains__(self, chave):
+        if self._bruto is not None and not dict.__contains__(self, chave):
+            self.materializar()
+        return dict.__contains__(self, chave)
+
+    def setdefault(self, chave, padrao=None):
+        if self._bruto is not None and not dict.__contains__(self, chave):
+            self.materializar()
+        return dict.setdefault(self, chave, padrao)
+
+    def __eq__(self, outro):
+        self.materializar()
+        if isinstance(outro, RegistroAdiado):
+            outro.materializar()
+        return dict.__eq__(self, outro)
+
+    def __ne__(self, outro):
+        resultado = self.__eq__(outro)
+        return resultado if resultado is NotImplemented else not resultado
+
+    __hash__ = None
+
+    def copy(self) -> dict:
+        self.materializar()
+        return dict(dict.items(self))
+
+    def __reduce__(self):
+        # pickle/copy: vira um dict comum com todos os campos
+        return (dict, (self.copy(),))
+
+    def __repr__(self):
+        self.materializar()
+        return dict.__repr__(self)
+
+
+def _materializando(nome: str):
+    metodo = getattr(dict, nome)
+
+    def envolto(self, *args, **kwargs):
+        self.materializar()
+        return metodo(self, *args, **kwargs)
+    envolto.__name__ = nome
+    return envolto
+
+
+# Operações sobre o registro inteiro decodificam os textos antes
+for _nome in ('__iter__', '__len__', '__reversed__', '__or__', '__delitem__',
+              'keys', 'values', 'items', 'pop', 'popitem'):
+    setattr(RegistroAdiado, _nome, _materializando(_nome))
+
+
+# ----------------------------------------------------------------------
+# Leitura / gravação
+
+def detectar_formato(dados: bytes) -> str:
+    """'binario' se os bytes começam com MAGICA, senão 'json'"""
+    return 'binario' if dados[:len(MAGICA)] == MAGICA else 'json'
+
+
+def decodificar(dados: bytes) -> Any:
+    """Decodifica o conteúdo de um snapshot em qualquer um dos formatos"""
+    with _sem_coletor():
+        if detectar_formato(dados) == 'json':
+            return _json_de_bytes(dados)
+        return _decodificar_binario(dados)
+
+
+def _decodificar_binario(dados: bytes) -> Any:
+    inicio = len(MAGICA)
+    try:
+        codec = _CODECS[dados[inicio:inicio + 1]]
+    except KeyError:
+        raise ValueError("Snapshot binário com codec desconhecido") from None
+    inicio += 1
+    tamanho, = _CABECALHO.unpack_from(dados, inicio)
+    inicio += _CABECALHO.size
+    visao = memoryview(dados)
+    registros = _decodificar(codec, visao[inicio:inicio + tamanho])
+    textos = visao[inicio + tamanho:]
+
+    if not isinstance(registros, list):
+        return registros
+    for i, registro in enumerate(registros):
+        if isinstance(registro, dict) and CHAVE_ADIADOS in registro:
+            a, b = registro.pop(CHAVE_ADIADOS)
+            registros[i] = RegistroAdiado(registro, codec, textos[a:b])
+    return registros
+
+
+def codificar(dados: Any, formato: str = 'json', campos_adiados: Iterable[str] = (),
+              indent: Optional[int] = None) -> bytes:
+    """
+    Codifica um snapshot
+
+    Args:
+        dados: Conteúdo (no formato binário, os campos adiados só são
+               separados quando é uma lista de dicts)
+        formato: 'json' ou 'binario'
+        campos_adiados: Campos de texto guardados à parte no formato binário
+        indent: Indentação do formato JSON (None = compacto)
+    """
+    with _sem_coletor():
+        return _codificar_snapshot(dados, formato, frozenset(campos_adiados), indent)
+
+
+def _codificar_snapshot(dados: Any, formato: str, adiados: frozenset, indent: Optional[int]) -> bytes:
+    if formato == 'json':
+        if isinstance(dados, list):
+            dados = [r.copy() if isinstance(r, RegistroAdiado) else r for r in dados]
+        return _json_para_bytes(dados, indent)
+    if formato != 'binario':
+        raise ValueError(f"Formato de snapshot inválido: {formato}")
+
+    codec = _codec_binario()
+    textos = []
+    posicao = 0
+    registros = dados
+    if adiados and isinstance(dados, list):
+        registros = []
+        for registro in dados:
+            if not isinstance(registro, dict):
+                registros.append(registro)
+                continue
+            bruto = None
+            if isinstance(registro, RegistroAdiado):
+                if registro._bruto is not None and adiados.isdisjoint(dict.keys(registro)):
+                    # Textos intactos: regrava os mesmos bytes
+                    codec_bruto, bruto = registro._bruto
+                    if codec_bruto != codec:
+                        registro.materializar()
+                        bruto = None
+                else:
+                    registro.materializar()
+            if bruto is not None:
+                campos = dict(dict.items(registro))
+            else:
+                campos = {k: v for k, v in dict.items(registro) if k not in adiados}
+                separados = {k: v for k, v in dict.items(registro) if k in adiados}
+                if separados:
+                    bruto = _codificar(codec, separados)
+            if bruto is not None:
+                campos[CHAVE_ADIADOS] = [posicao, posicao + len(bruto)]
+                textos.append(bruto)
+                posicao += len(bruto)
+            registros.append(campos)
+    elif isinstance(dados, list):
+        registros = [r.copy() if isinstance(r, RegistroAdiado) else r for r in dados]
+
+    corpo = _codificar(codec, registros)
+    codigo = {v: k for k, v in _CODECS.items()}[codec]
+    return b''.join([MAGICA, codigo, _CABECALHO.pack(len(corpo)), corpo, *textos])
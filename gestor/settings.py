@@ -103,3 +103,17 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 16 * 1024 * 1024  # 16MB
 # Diretórios de relatórios e anexos
 RELATORIOS_DIR = BASE_DIR / 'relatorios'
 ANEXOS_DIR = BASE_DIR / 'anexos'
+
+# Cache de rotas OSRM (LRU em memória + SQLite compartilhado entre workers)
+CACHE_ROTAS_ARQUIVO = BASE_DIR / 'data' / 'cache_rotas.sqlite3'
+CACHE_ROTAS_TTL_DIAS = int(os.environ.get('CACHE_ROTAS_TTL_DIAS', '30'))
+
+# Roteamento: 'osrm' (servidor HTTP) ou 'local' (grafo de um extrato OSM, sem rede)
+ROTEAMENTO_BACKEND = os.environ.get('ROTEAMENTO_BACKEND', 'osrm')
+OSRM_SERVIDOR = os.environ.get('OSRM_SERVIDOR', 'http://router.project-osrm.org')
+# Requisições simultâneas ao OSRM e limite de taxa (vazio = sem limite)
+OSRM_MAX_CONCORRENCIA = int(os.environ.get('OSRM_MAX_CONCORRENCIA', '4'))
+OSRM_REQUISICOES_POR_SEGUNDO = float(os.environ.get('OSRM_REQUISICOES_POR_SEGUNDO') or 0) or None
+ROTEAMENTO_OSM_ARQUIVO = os.environ.get(
+    'ROTEAMENTO_OSM_ARQUIVO', str(BASE_DIR / 'data' / 'taubate.osm.bz2')
+)
@@ -0,0 +1,233 @@
+"""
+Módulo de cliente HTTP compartilhado para chamadas externas (OSRM, Nominatim)
+
+Cada processo/worker mantém uma Session com pool de conexões (keep-alive),
+timeouts separados de conexão e leitura, novas tentativas com backoff
+exponencial em 429/5xx e um disjuntor (circuit breaker) que falha
+imediatamente enquanto o serviço externo estiver fora do ar.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class CircuitoAbertoError(requests.exceptions.RequestException):
+    """Serviço externo marcado como indisponível pelo disjuntor"""
+
+
+class Disjuntor:
+    """
+    Circuit breaker simples
+
+    Após limite_falhas falhas seguidas o circuito abre e as chamadas falham
+    na hora. Passado tempo_reabertura segundos, uma chamada de teste é
+    liberada (meio-aberto): sucesso fecha o circuito, falha reabre.
+    """
+
+    def __init__(self, limite_falhas: int = 5, tempo_reabertura: float = 30.0):
+        self.limite_falhas = limite_falhas
+        self.tempo_reabertura = tempo_reabertura
+        self.falhas = 0
+        self.aberto_em = None
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        if self.aberto_em is None:
+            return 'fechado'
+        if time.monotonic() - self.aberto_em >= self.tempo_reabertura:
+            return 'meio-aberto'
+        return 'aberto'
+
+    def permitir(self) -> bool:
+        """Indica se uma chamada pode ser feita agora"""
+        with self._lock:
+            estado = self.estado
+            if estado == 'fechado':
+                return True
+            if estado == 'meio-aberto' and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return True
+            return False
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self.falhas = 0
+            self.aberto_em = None
+            self._teste_em_andamento = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas += 1
+            self._teste_em_andamento = False
+            if self.falhas >= self.limite_falhas:
+                self.aberto_em = time.monotonic()
+
+
+class LimitadorTaxa:
+    """
+    Token bucket: libera no máximo `taxa` chamadas por segundo, com rajadas
+    de até `capacidade` chamadas. Seguro para uso entre threads.
+    """
+
+    def __init__(self, taxa: float, capacidade: float = 1.0):
+        self.taxa = taxa
+        self.capacidade = max(1.0, capacidade)
+        self._fichas = self.capacidade
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        """Bloqueia até haver uma ficha disponível e a consome"""
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._fichas = min(self.capacidade,
+                                   self._fichas + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.taxa
+            time.sleep(espera)
+
+
+class ClienteHTTP:
+    def __init__(self, nome: str = "externo",
+                 tamanho_pool: int = 10,
+                 timeout_conexao: float = 3.05,
+                 timeout_leitura: float = 10.0,
+                 tentativas: int = 3,
+                 fator_backoff: float = 0.5,
+                 limite_falhas: int = 5,
+                 tempo_reabertura: float = 30.0,
+                 requisicoes_por_segundo: Optional[float] = None,
+                 user_agent: str = "gestor_visitas_escolas_taubate"):
+        """
+        Inicializa o cliente HTTP
+
+        Args:
+            nome: Nome do serviço (usado nas mensagens de erro)
+            tamanho_pool: Conexões mantidas abertas por host
+            timeout_conexao: Tempo máximo para abrir a conexão TCP/TLS (s)
+            timeout_leitura: Tempo máximo de espera pela resposta (s)
+            tentativas: Novas tentativas em erro de conexão, 429 e 5xx
+            fator_backoff: Base do backoff exponencial entre tentativas (s)
+            limite_falhas: Falhas seguidas até abrir o disjuntor
+            tempo_reabertura: Segundos com o disjuntor aberto antes de testar de novo
+            requisicoes_por_segundo: Limite de taxa da política do serviço
+                                     (None = sem limite)
+            user_agent: Cabeçalho User-Agent (exigido pela política do Nominatim)
+        """
+        self.nome = nome
+        self.tamanho_pool = tamanho_pool
+        self.timeout_conexao = timeout_conexao
+        self.timeout_leitura = timeout_leitura
+        self.tentativas = tentativas
+        self.fator_backoff = fator_backoff
+        self.user_agent = user_agent
+        self.disjuntor = Disjuntor(limite_falhas, tempo_reabertura)
+        self.limitador = LimitadorTaxa(requisicoes_por_segundo) if requisicoes_por_segundo else None
+
+        self._sessao = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _criar_sessao(self) -> requests.Session:
+        retry = Retry(
+            total=self.tentativas,
+            connect=self.tentativas,
+            read=self.tentativas,
+            status=self.tentativas,
+            backoff_factor=self.fator_backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=self.tamanho_pool,
+                              pool_maxsize=self.tamanho_pool,
+                              max_retries=retry)
+        sessao = requests.Session()
+        sessao.mount('http://', adapter)
+        sessao.mount('https://', adapter)
+        sessao.headers['User-Agent'] = self.user_agent
+        return sessao
+
+    @property
+    def sessao(self) -> requests.Session:
+        """Session do processo atual (recriada após fork dos workers)"""
+        with self._lock:
+            if self._sessao is None or self._pid != os.getpid():
+                self._sessao = self._criar_sessao()
+                self._pid = os.getpid()
+            return self._sessao
+
+    def get_json(self, url: str, params: Optional[Dict] = None,
+                 timeout_leitura: Optional[float] = None):
+        """
+        Faz um GET e retorna o corpo JSON
+
+        Raises:
+            CircuitoAbertoError: serviço marcado como indisponível
+            requests.exceptions.RequestException: erro de rede/HTTP após as tentativas
+        """
+        if not self.disjuntor.permitir():
+            raise CircuitoAbertoError(
+                f"Serviço {self.nome} indisponível (circuito aberto após "
+                f"{self.disjuntor.falhas} falhas seguidas)"
+            )
+
+        if self.limitador:
+            self.limitador.aguardar()
+
+        try:
+            response = self.sessao.get(
+                url, params=params,
+                timeout=(self.timeout_conexao, timeout_leitura or self.timeout_leitura)
+            )
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.HTTPError as e:
+            # Erros 4xx (exceto 429) são do pedido, não indisponibilidade do serviço
+            status = e.response.status_code if e.response is not None else 0
+            if status == 429 or status >= 500:
+                self.disjuntor.registrar_falha()
+            else:
+                self.disjuntor.registrar_sucesso()
+            raise
+        except (requests.exceptions.RequestException, ValueError):
+            self.disjuntor.registrar_falha()
+            raise
+
+        self.disjuntor.registrar_sucesso()
+        return data
+
+
+_clientes = {}
+_clientes_lock = threading.Lock()
+
+
+def obter_cliente(nome: str, **config) -> ClienteHTTP:
+    """
+    Retorna o cliente compartilhado de um serviço, criando-o na primeira chamada
+
+    Chamadas com o mesmo nome e a mesma configuração compartilham o
+    cliente (pool, disjuntor e limite de taxa); uma configuração diferente
+    (ex.: outro requisicoes_por_segundo) recebe um cliente próprio.
+
+    Args:
+        nome: Identificador do serviço (ex.: 'osrm', 'nominatim')
+        **config: Parâmetros de ClienteHTTP usados na criação
+    """
+    chave = (nome, tuple(sorted(config.items())))
+    with _clientes_lock:
+        if chave not in _clientes:
+            _clientes[chave] = ClienteHTTP(nome, **config)
+        return _clientes[chave]
@@ -0,0 +1,181 @@
+"""
+Módulo de índice espacial para consultas de vizinhança entre escolas
+
+Usa uma KD-tree sobre os pontos projetados na esfera unitária (x, y, z):
+a distância em linha reta entre dois pontos na esfera (corda) cresce junto
+com a distância de grande círculo, então os k mais próximos pela corda são
+os k mais próximos na superfície da Terra.
+"""
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+RAIO_TERRA_KM = 6371.0088
+
+
+def _para_xyz(lats, lons) -> np.ndarray:
+    """Converte latitudes/longitudes (graus) em vetores unitários 3D"""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def _corda_para_km(corda: float) -> float:
+    return 2 * RAIO_TERRA_KM * math.asin(min(1.0, corda / 2))
+
+
+def _km_para_corda(km: float) -> float:
+    return 2 * math.sin(min(math.pi / 2, km / (2 * RAIO_TERRA_KM)))
+
+
+class IndiceEspacial:
+    def __init__(self, itens: Iterable[Dict], tamanho_folha: int = 16):
+        """
+        Constrói o índice espacial
+
+        Args:
+            itens: Dicionários com 'id', 'latitude' e 'longitude'
+                   (itens sem coordenadas são ignorados)
+            tamanho_folha: Quantidade máxima de pontos por folha da árvore
+        """
+        self.itens = [
+            item for item in itens
+            if item.get('latitude') is not None and item.get('longitude') is not None
+        ]
+        self.tamanho_folha = max(1, tamanho_folha)
+        self._por_id = {item['id']: item for item in self.itens}
+
+        self._xyz = _para_xyz([i['latitude'] for i in self.itens],
+                              [i['longitude'] for i in self.itens]).reshape(-1, 3)
+        self._ordem = np.arange(len(self.itens))
+
+        # Nós: (inicio, fim, eixo, corte, filho_esq, filho_dir); eixo -1 = folha
+        self._nos = []
+        if self.itens:
+            self._construir(0, len(self.itens))
+
+    def __len__(self) -> int:
+        return len(self.itens)
+
+    def _construir(self, inicio: int, fim: int) -> int:
+        """Constrói recursivamente o nó que cobre self._ordem[inicio:fim]"""
+        indice_no = len(self._nos)
+        self._nos.append(None)
+
+        if fim - inicio <= self.tamanho_folha:
+            self._nos[indice_no] = (inicio, fim, -1, 0.0, -1, -1)
+            return indice_no
+
+        pontos = self._xyz[self._ordem[inicio:fim]]
+        eixo = int(np.argmax(pontos.max(axis=0) - pontos.min(axis=0)))
+        meio = (fim - inicio) // 2
+
+        particao = np.argpartition(pontos[:, eixo], meio)
+        self._ordem[inicio:fim] = self._ordem[inicio:fim][particao]
+        corte = float(self._xyz[self._ordem[inicio + meio], eixo])
+
+        esquerda = self._construir(inicio, inicio + meio)
+        direita = self._construir(inicio + meio, fim)
+        self._nos[indice_no] = (inicio, fim, eixo, corte, esquerda, direita)
+        return indice_no
+
+    def obter(self, item_id) -> Optional[Dict]:
+        """Retorna o item indexado com o ID informado"""
+        return self._por_id.get(item_id)
+
+    def k_proximos(self, latitude: float, longitude: float, k: int = 5,
+                   excluir_ids: Iterable = ()) -> List[Tuple[Dict, float]]:
+        """
+        Busca os k itens mais próximos de um ponto
+
+        Args:
+            latitude, longitude: Ponto de referência
+            k: Quantidade de itens a retornar
+            excluir_ids: IDs que não devem aparecer no resultado
+
+        Returns:
+            Lista de tuplas (item, distancia_km em linha reta), da mais próxima
+            para a mais distante
+        """
+        if k <= 0 or not self.itens:
+            return []
+
+        excluir = set(excluir_ids)
+        alvo = _para_xyz([latitude], [longitude])[0]
+        melhores = []  # heap de (-distancia2, indice)
+
+        pilha = [(0, 0.0)]  # (nó, limite inferior da distância² até a região do nó)
+        while pilha:
+            no, limite_inferior = pilha.pop()
+            if len(melhores) == k and limite_inferior >= -melhores[0][0]:
+                continue
+            inicio, fim, eixo, corte, esquerda, direita = self._nos[no]
+
+            if eixo < 0:
+                indices = self._ordem[inicio:fim]
+                dist2 = ((self._xyz[indices] - alvo) ** 2).sum(axis=1)
+                for indice, d2 in zip(indices.tolist(), dist2.tolist()):
+                    if self.itens[indice]['id'] in excluir:
+                        continue
+                    if len(melhores) < k:
+                        heapq.heappush(melhores, (-d2, indice))
+                    elif d2 < -melhores[0][0]:
+                        heapq.heapreplace(melhores, (-d2, indice))
+                continue
+
+            diferenca = alvo[eixo] - corte
+            perto, longe = (esquerda, direita) if diferenca < 0 else (direita, esquerda)
+            pilha.append((longe, max(limite_inferior, diferenca * diferenca)))
+            pilha.append((perto, limite_inferior))
+
+        resultado = sorted((-d2, indice) for d2, indice in melhores)
+        return [(self.itens[indice], round(_corda_para_km(math.sqrt(d2)), 3))
+                for d2, indice in resultado]
+
+    def dentro_do_raio(self, latitude: float, longitude: float, raio_km: float,
+                       excluir_ids: Iterable = ()) -> List[Tuple[Dict, float]]:
+        """
+        Busca todos os itens a até raio_km (linha reta) de um ponto
+
+        Returns:
+            Lista de tuplas (item, distancia_km), ordenada por distância
+        """
+        if raio_km < 0 or not self.itens:
+            return []
+
+        excluir = set(excluir_ids)
+        alvo = _para_xyz([latitude], [longitude])[0]
+        limite2 = _km_para_corda(raio_km) ** 2
+        encontrados = []
+
+        pilha = [0]
+        while pilha:
+            inicio, fim, eixo, corte, esquerda, direita = self._nos[pilha.pop()]
+
+            if eixo < 0:
+                indices = self._ordem[inicio:fim]
+                dist2 = ((self._xyz[indices] - alvo) ** 2).sum(axis=1)
+                for indice, d2 in zip(indices.tolist(), dist2.tolist()):
+                    if d2 <= limite2 and self.itens[indice]['id'] not in excluir:
+                        encontrados.append((d2, indice))
+                continue
+
+            diferenca = alvo[eixo] - corte
+            if diferenca < 0 or diferenca * diferenca <= limite2:
+                pilha.append(esquerda)
+            if diferenca >= 0 or diferenca * diferenca <= limite2:
+                pilha.append(direita)
+
+        encontrados.sort()
+        return [(self.itens[indice], round(_corda_para_km(math.sqrt(d2)), 3))
+                for d2, indice in encontrados]
+
+    def k_proximos_de(self, item_id, k: int = 5) -> List[Tuple[Dict, float]]:
+        """Busca os k itens mais próximos de um item já indexado"""
+        item = self.obter(item_id)
+        if item is None:
+            return []
+        return self.k_proximos(item['latitude'], item['longitude'], k, excluir_ids=[item_id])
@@ -0,0 +1,75 @@
+"""
+Módulo de índice ordenado para os gerenciadores em JSON
+
+Mantém os registros ordenados por uma chave (tupla) em listas paralelas, de
+modo que a posição de inserção/remoção e os intervalos pelo primeiro campo
+da chave (ex.: data) saem por busca binária (bisect) em vez de varrer e
+reordenar a lista inteira a cada consulta.
+"""
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, List
+
+
+class IndiceOrdenado:
+    def __init__(self, chave: Callable[[Dict], tuple], registros: Iterable[Dict] = ()):
+        """
+        Constrói o índice
+
+        Args:
+            chave: Função registro -> tupla de ordenação; intervalo() filtra
+                   pelo primeiro elemento da tupla
+            registros: Registros iniciais
+        """
+        self.chave = chave
+        self._preencher(sorted(((chave(r), r) for r in registros), key=itemgetter(0)))
+
+    @classmethod
+    def de_pares_ordenados(cls, chave: Callable[[Dict], tuple], pares: List[tuple]) -> 'IndiceOrdenado':
+        """
+        Índice a partir de pares (chave(registro), registro) já ordenados pela
+        chave: permite montar vários índices com uma única ordenação
+        """
+        indice = cls.__new__(cls)
+        indice.chave = chave
+        indice._preencher(pares)
+        return indice
+
+    def _preencher(self, pares: List[tuple]):
+        self._chaves = [c for c, _ in pares]
+        self._primeiros = [c[0] for c in self._chaves]
+        self._registros = [r for _, r in pares]
+
+    def __len__(self) -> int:
+        return len(self._registros)
+
+    def __iter__(self):
+        return iter(self._registros)
+
+    def inserir(self, registro: Dict):
+        """Insere mantendo a ordem (empates ficam na ordem de inserção)"""
+        chave = self.chave(registro)
+        i = bisect_right(self._chaves, chave)
+        self._chaves.insert(i, chave)
+        self._primeiros.insert(i, chave[0])
+        self._registros.insert(i, registro)
+
+    def remover(self, registro: Dict) -> bool:
+        """
+        Remove o registro (o mesmo objeto); chame antes de alterar os campos
+        usados na chave e insira de novo depois
+        """
+        chave = self.chave(registro)
+        i = bisect_left(self._chaves, chave)
+        while i < len(self._chaves) and self._chaves[i] == chave:
+            if self._registros[i] is registro:
+                del self._chaves[i], self._primeiros[i], self._registros[i]
+                return True
+            i += 1
+        return False
+
+    def intervalo(self, inicio=None, fim=None) -> List[Dict]:
+        """Registros com inicio <= primeiro campo da chave <= fim, em ordem crescente"""
+        lo = 0 if inicio is None else bisect_left(self._primeiros, inicio)
+        hi = len(self._primeiros) if fim is None else bisect_right(self._primeiros, fim)
+        return self._registros[lo:hi]
@@ -11,7 +11,7 @@ def verificar_requisitos():
     requisitos = [
         ('Flask', 'flask'),
         ('Requests', 'requests'),
-        ('Geopy', 'geopy'),
+        ('NumPy', 'numpy'),
         ('Pandas', 'pandas')
     ]
 
@@ -6,17 +6,24 @@ import sys
 from datetime import datetime
 from tabulate import tabulate
 
-from escolas import GerenciadorEscolas
+from escolas import GerenciadorEscolas, GerenciadorEscolasSQL
 from distancias import CalculadorDistancias
-from visitas import GerenciadorVisitas
+from cache_persistente import CacheRotas
+from visitas import GerenciadorVisitas, GerenciadorVisitasSQL
 from relatorios import GeradorRelatorios
+from banco_sqlite import ARMAZENAMENTO_LEGADO
 
 
 class SistemaGestaoVisitas:
     def __init__(self):
-        self.gerenciador_escolas = GerenciadorEscolas()
-        self.calculador_distancias = CalculadorDistancias()
-        self.gerenciador_visitas = GerenciadorVisitas()
+        # ARMAZENAMENTO_LEGADO=sqlite: banco do Django em vez dos JSON
+        if ARMAZENAMENTO_LEGADO == 'sqlite':
+            self.gerenciador_escolas = GerenciadorEscolasSQL()
+            self.gerenciador_visitas = GerenciadorVisitasSQL()
+        else:
+            self.gerenciador_escolas = GerenciadorEscolas()
+            self.gerenciador_visitas = GerenciadorVisitas()
+        self.calculador_distancias = CalculadorDistancias(cache=CacheRotas())
         self.gerador_relatorios = GeradorRelatorios()
 
     def limpar_tela(self):
@@ -150,7 +157,8 @@ class SistemaGestaoVisitas:
         print("GEOCODIFICAR ESCOLAS DO BLOCO 1".center(80))
         print("=" * 80)
         print("\nEsta operação pode demorar alguns minutos...")
-        print("As coordenadas serão obtidas do OpenStreetMap.\n")
+        print("As coordenadas serão obtidas do OpenStreetMap.")
+        print("Para importações grandes (sistema web), use: python manage.py geocodificar\n")
 
         confirma = input("Deseja continuar? (s/n): ").strip().lower()
 
@@ -572,7 +580,7 @@ class SistemaGestaoVisitas:
         print("=" * 80)
         print("CALCULAR MATRIZ DE DISTÂNCIAS".center(80))
         print("=" * 80)
-        print("\nEsta operação pode demorar vários minutos...")
+        print("\nEsta operação pode demorar alguns segundos...")
         print("Serão calculadas as rotas reais de carro usando OSRM.\n")
 
         confirma = input("Deseja continuar? (s/n): ").strip().lower()
@@ -593,6 +601,7 @@ class SistemaGestaoVisitas:
         print()
         matriz = self.calculador_distancias.calcular_matriz_distancias(escolas)
         self.calculador_distancias.salvar_matriz(matriz)
+        self.calculador_distancias.salvar_matriz_binaria(matriz, escolas)
 
         self.pausar()
 
@@ -704,7 +713,7 @@ def verificar_requisitos():
         ('Flask', 'flask'),
         ('Flask-Login', 'flask_login'),
         ('Requests', 'requests'),
-        ('Geopy', 'geopy'),
+        ('NumPy', 'numpy'),
         ('Pandas', 'pandas')
     ]
 
@@ -0,0 +1,282 @@
+"""
+Módulo da matriz de distâncias em formato binário
+
+A matriz é gravada em um único arquivo <nome>.npy:
+  - um .npy comum com um array float32 contíguo de forma (2, N, N), onde [0]
+    são as distâncias em metros e [1] as durações em segundos (NaN = sem
+    rota) — np.load continua lendo o arquivo;
+  - logo depois do array, o cabeçalho em JSON com a versão do formato, os
+    IDs das escolas (posição no array) e o nome usual de cada uma, seguido
+    do tamanho do cabeçalho (<Q) e de FIM_CABECALHO.
+
+Array e cabeçalho são trocados juntos por um único os.replace, e abrir() lê
+os dois do mesmo arquivo aberto: quem lê nunca combina os IDs de uma
+gravação com as distâncias de outra.
+
+O array é mapeado em memória (mmap): todos os processos/workers
+compartilham a mesma cópia no cache de páginas do sistema e cada consulta
+é O(1).
+"""
+import json
+import os
+import stat
+import struct
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from armazenamento import ArmazenamentoJSON, assinatura_arquivo
+
+VERSAO_FORMATO = 1
+
+# Fim do arquivo: tamanho do cabeçalho JSON (<Q) + FIM_CABECALHO
+FIM_CABECALHO = b'GMTZCAB1'
+_TAMANHO_CABECALHO = struct.Struct('<Q')
+
+DISTANCIA = 0
+DURACAO = 1
+
+
+def _ler_cabecalho(f, arquivo: str) -> Dict:
+    """
+    Cabeçalho gravado no fim do arquivo aberto
+
+    Raises:
+        ValueError: arquivo sem o cabeçalho (truncado ou .npy comum)
+    """
+    rodape = len(FIM_CABECALHO) + _TAMANHO_CABECALHO.size
+    f.seek(0, os.SEEK_END)
+    if f.tell() >= rodape:
+        f.seek(-rodape, os.SEEK_END)
+        final = f.read(rodape)
+        if final.endswith(FIM_CABECALHO):
+            tamanho, = _TAMANHO_CABECALHO.unpack_from(final)
+            f.seek(-(rodape + tamanho), os.SEEK_END)
+            return json.loads(f.read(tamanho))
+    raise ValueError(f"Arquivo sem cabeçalho de matriz de distâncias: {arquivo}")
+
+
+def _formatar_rota(distancia_metros: float, duracao_segundos: float) -> Dict:
+    """Mesmo formato de CalculadorDistancias._formatar_rota"""
+    return {
+        'distancia_metros': distancia_metros,
+        'distancia_km': round(distancia_metros / 1000, 2),
+        'duracao_segundos': duracao_segundos,
+        'duracao_minutos': round(duracao_segundos / 60, 1)
+    }
+
+
+class MatrizDistancias:
+    def __init__(self, dados: np.ndarray, ids: List, nomes: Optional[Dict] = None,
+                 criado_em: Optional[str] = None):
+        """
+        Matriz de distâncias indexada por ID de escola
+
+        Args:
+            dados: Array (2, N, N) com distâncias (m) e durações (s)
+            ids: ID da escola de cada posição do array
+            nomes: Nome usual por ID (permite consultas pelo nome)
+            criado_em: Data de geração (ISO 8601)
+        """
+        if dados.shape != (2, len(ids), len(ids)):
+            raise ValueError(f"Forma {dados.shape} incompatível com {len(ids)} escolas")
+        self.dados = dados
+        self.ids = list(ids)
+        self.nomes = dict(nomes or {})
+        self.criado_em = criado_em
+        self._indice = {escola_id: i for i, escola_id in enumerate(self.ids)}
+        self._indice_nome = {nome: escola_id for escola_id, nome in self.nomes.items() if nome}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, escola_id) -> bool:
+        return escola_id in self._indice
+
+    def indice(self, escola) -> Optional[int]:
+        """Posição de uma escola no array, pelo ID ou pelo nome usual"""
+        if escola in self._indice:
+            return self._indice[escola]
+        escola_id = self._indice_nome.get(escola)
+        return self._indice.get(escola_id) if escola_id is not None else None
+
+    def obter(self, origem, destino) -> Optional[Dict]:
+        """
+        Rota entre duas escolas (IDs ou nomes usuais)
+
+        Returns:
+            Dicionário no formato de CalculadorDistancias.calcular_distancia
+            ou None se o par não estiver na matriz
+        """
+        i, j = self.indice(origem), self.indice(destino)
+        if i is None or j is None or i == j:
+            return None
+        distancia = float(self.dados[DISTANCIA, i, j])
+        duracao = float(self.dados[DURACAO, i, j])
+        if np.isnan(distancia) or np.isnan(duracao):
+            return None
+        return _formatar_rota(round(distancia, 1), round(duracao, 1))
+
+    # ------------------------------------------------------------------
+    # Criação / persistência
+
+    @classmethod
+    def vazia(cls, escolas: Iterable[Dict]) -> 'MatrizDistancias':
+        """Matriz sem rotas para as escolas informadas (dicts com 'id' e 'nome_usual')"""
+        escolas = list(escolas)
+        n = len(escolas)
+        dados = np.full((2, n, n), np.nan, dtype=np.float32)
+        return cls(dados, [e['id'] for e in escolas],
+                   {e['id']: e.get('nome_usual', '') for e in escolas})
+
+    def definir(self, origem_id, destino_id, rota: Dict):
+        """Grava a rota de um par (matriz aberta em memória, não mapeada)"""
+        i, j = self._indice[origem_id], self._indice[destino_id]
+        self.dados[DISTANCIA, i, j] = rota['distancia_metros']
+        self.dados[DURACAO, i, j] = rota['duracao_segundos']
+
+    @classmethod
+    def de_dicionario(cls, matriz: Dict, escolas: Iterable[Dict]) -> 'MatrizDistancias':
+        """
+        Converte a matriz aninhada {nome_usual: {nome_usual: rota}} usada em
+        matriz_distancias.json
+
+        Args:
+            matriz: Matriz no formato JSON antigo
+            escolas: Escolas (com 'id' e 'nome_usual') para mapear nomes em IDs;
+                     pares com nomes desconhecidos são ignorados
+        """
+        escolas = [e for e in escolas if e.get('nome_usual') in matriz
+                   or any(e.get('nome_usual') in destinos for destinos in matriz.values())]
+        resultado = cls.vazia(escolas)
+        por_nome = {e['nome_usual']: e['id'] for e in escolas}
+
+        for origem, destinos in matriz.items():
+            if origem not in por_nome:
+                continue
+            for destino, rota in destinos.items():
+                if destino in por_nome and rota:
+                    resultado.definir(por_nome[origem], por_nome[destino], rota)
+        return resultado
+
+    def salvar(self, arquivo: str = "data/matriz_distancias.npy"):
+        """Grava array e cabeçalho no .npy (substituição atômica do arquivo inteiro)"""
+        pasta = os.path.dirname(arquivo)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+        cabecalho = {
+            'versao': VERSAO_FORMATO,
+            'forma': [2, len(self.ids), len(self.ids)],
+            'tipo': 'float32',
+            'unidades': ['metros', 'segundos'],
+            'criado_em': self.criado_em or datetime.now().isoformat(timespec='seconds'),
+            'ids': self.ids,
+            'nomes': [self.nomes.get(escola_id, '') for escola_id in self.ids],
+        }
+
+        conteudo = json.dumps(cabecalho, ensure_ascii=False).encode('utf-8')
+
+        fd, temporario = tempfile.mkstemp(prefix=os.path.basename(arquivo) + '.', suffix='.tmp',
+                                          dir=pasta or '.')
+        try:
+            # mkstemp cria com 0600: mantém as permissões do arquivo atual
+            try:
+                os.chmod(temporario, stat.S_IMODE(os.stat(arquivo).st_mode))
+            except FileNotFoundError:
+                os.chmod(temporario, 0o644)
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.ascontiguousarray(self.dados, dtype=np.float32))
+                f.write(conteudo)
+                f.write(_TAMANHO_CABECALHO.pack(len(conteudo)) + FIM_CABECALHO)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporario, arquivo)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    @classmethod
+    def abrir(cls, arquivo: str = "data/matriz_distancias.npy",
+              mmap_mode: Optional[str] = 'r') -> 'MatrizDistancias':
+        """
+        Abre uma matriz gravada por salvar()
+
+        Args:
+            arquivo: Caminho do .npy
+            mmap_mode: Modo do mapeamento em memória (None carrega em memória)
+
+        Raises:
+            ValueError: versão de formato desconhecida ou arquivo inconsistente
+        """
+        # Cabeçalho e array do mesmo arquivo aberto, mesmo que ele seja
+        # trocado no meio da leitura
+        with open(arquivo, 'rb') as f:
+            cabecalho = _ler_cabecalho(f, arquivo)
+            if cabecalho.get('versao') != VERSAO_FORMATO:
+                raise ValueError(f"Versão de matriz não suportada: {cabecalho.get('versao')}")
+
+            f.seek(0)
+            versao_npy = np.lib.format.read_magic(f)
+            if versao_npy == (1, 0):
+                forma, ordem_fortran, tipo = np.lib.format.read_array_header_1_0(f)
+            else:
+                forma, ordem_fortran, tipo = np.lib.format.read_array_header_2_0(f)
+            if tipo != np.float32 or ordem_fortran or list(forma) != cabecalho['forma']:
+                raise ValueError("Matriz binária não corresponde ao cabeçalho")
+
+            if mmap_mode:
+                dados = np.memmap(f, dtype=np.float32, mode=mmap_mode, shape=forma, offset=f.tell())
+            else:
+                dados = np.fromfile(f, dtype=np.float32, count=int(np.prod(forma))).reshape(forma)
+
+        ids = cabecalho['ids']
+        return cls(dados, ids, dict(zip(ids, cabecalho.get('nomes', []))),
+                   cabecalho.get('criado_em'))
+
+
+_abertas = {}
+_abertas_lock = threading.Lock()
+
+
+def carregar_matriz_binaria(arquivo: str = "data/matriz_distancias.npy") -> Optional[MatrizDistancias]:
+    """
+    Matriz mapeada compartilhada pelo processo, reaberta quando o arquivo muda
+
+    Returns:
+        MatrizDistancias ou None se o arquivo não existir
+    """
+    versao = assinatura_arquivo(arquivo)
+    if versao is None:
+        return None
+
+    with _abertas_lock:
+        atual = _abertas.get(arquivo)
+        if atual is None or atual[0] != versao:
+            _abertas[arquivo] = (versao, MatrizDistancias.abrir(arquivo))
+        return _abertas[arquivo][1]
+
+
+def converter_json(arquivo_json: str = "data/matriz_distancias.json",
+                   arquivo_escolas: str = "data/escolas.json",
+                   arquivo_npy: str = "data/matriz_distancias.npy") -> MatrizDistancias:
+    """Converte a matriz JSON (chaves por nome_usual) para o formato binário"""
+    with open(arquivo_json, 'r', encoding='utf-8') as f:
+        matriz = json.load(f)
+    escolas = ArmazenamentoJSON(arquivo_escolas).ler()
+
+    binaria = MatrizDistancias.de_dicionario(matriz, escolas)
+    binaria.salvar(arquivo_npy)
+    return binaria
+
+
+if __name__ == '__main__':
+    # Uso: python matriz_binaria.py [matriz.json] [escolas.json] [saida.npy]
+    convertida = converter_json(*sys.argv[1:4])
+    preenchidos = int(np.count_nonzero(~np.isnan(convertida.dados[DISTANCIA])))
+    print(f"✅ {len(convertida)} escolas, {preenchidos} rotas convertidas")
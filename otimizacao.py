@@ -0,0 +1,271 @@
+"""
+Módulo de otimização do roteiro diário de visitas
+
+Dado o tempo de viagem entre as escolas de um dia, encontra a ordem de
+visitas com o menor tempo total de deslocamento:
+  - até LIMITE_EXATO visitas: programação dinâmica de Held-Karp (ótimo exato)
+  - acima disso: vizinho mais próximo refinado por 2-opt e Or-opt
+
+A ordem respeita os turnos: nenhuma visita da manhã depois de uma da tarde
+(visitas 'integral' ou sem turno podem ficar em qualquer posição).
+
+Também agrupa escolas próximas em dias de visita (k-medoides com
+capacidade máxima por grupo) para o planejamento do mês.
+"""
+import math
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+LIMITE_EXATO = 10
+
+_ORDEM_TURNO = {'manha': 0, 'tarde': 1}
+
+
+def _ordem_valida(ordem: Sequence[int], turnos: Sequence[Optional[str]]) -> bool:
+    """Verifica se nenhuma visita da manhã aparece depois de uma da tarde"""
+    ultimo = 0
+    for i in ordem:
+        posicao = _ORDEM_TURNO.get(turnos[i])
+        if posicao is None:
+            continue
+        if posicao < ultimo:
+            return False
+        ultimo = posicao
+    return True
+
+
+def custo_roteiro(ordem: Sequence[int], duracoes: Sequence[Sequence[float]],
+                  saida: Optional[Sequence[float]] = None) -> float:
+    """Tempo total de deslocamento de um roteiro (sem retorno ao ponto de partida)"""
+    if not ordem:
+        return 0.0
+    total = saida[ordem[0]] if saida is not None else 0.0
+    for a, b in zip(ordem, ordem[1:]):
+        total += duracoes[a][b]
+    return total
+
+
+def _held_karp(duracoes, turnos, saida) -> List[int]:
+    n = len(duracoes)
+    tarde = 0
+    for i, turno in enumerate(turnos):
+        if turno == 'tarde':
+            tarde |= 1 << i
+
+    total_mascaras = 1 << n
+    custo = [[math.inf] * n for _ in range(total_mascaras)]
+    anterior = [[-1] * n for _ in range(total_mascaras)]
+    for j in range(n):
+        custo[1 << j][j] = saida[j] if saida is not None else 0.0
+
+    for mascara in range(1, total_mascaras):
+        linha = custo[mascara]
+        tem_tarde = mascara & tarde
+        for j in range(n):
+            atual = linha[j]
+            if atual == math.inf:
+                continue
+            distancias_j = duracoes[j]
+            for k in range(n):
+                bit = 1 << k
+                if mascara & bit:
+                    continue
+                # Visita da manhã não pode vir depois de uma visita da tarde
+                if tem_tarde and turnos[k] == 'manha':
+                    continue
+                novo = atual + distancias_j[k]
+                if novo < custo[mascara | bit][k]:
+                    custo[mascara | bit][k] = novo
+                    anterior[mascara | bit][k] = j
+
+    cheia = total_mascaras - 1
+    ultimo = min(range(n), key=lambda j: custo[cheia][j])
+    ordem = []
+    mascara = cheia
+    while ultimo != -1:
+        ordem.append(ultimo)
+        ultimo, mascara = anterior[mascara][ultimo], mascara & ~(1 << ultimo)
+    ordem.reverse()
+    return ordem
+
+
+def _vizinho_mais_proximo(duracoes, turnos, saida) -> List[int]:
+    restantes = set(range(len(duracoes)))
+    manha_restantes = sum(1 for t in turnos if t == 'manha')
+    ordem = []
+
+    while restantes:
+        # Visitas da tarde só entram depois de todas as da manhã
+        candidatas = [k for k in restantes if manha_restantes == 0 or turnos[k] != 'tarde']
+        if ordem:
+            proxima = min(candidatas, key=lambda k: duracoes[ordem[-1]][k])
+        elif saida is not None:
+            proxima = min(candidatas, key=lambda k: saida[k])
+        else:
+            proxima = min(candidatas, key=lambda k: min(
+                (duracoes[k][m] for m in restantes if m != k), default=0.0))
+        ordem.append(proxima)
+        restantes.discard(proxima)
+        if turnos[proxima] == 'manha':
+            manha_restantes -= 1
+    return ordem
+
+
+def _busca_local(ordem, duracoes, turnos, saida) -> List[int]:
+    """Aplica 2-opt e Or-opt até não haver melhoria"""
+    n = len(ordem)
+    melhor = custo_roteiro(ordem, duracoes, saida)
+
+    melhorou = True
+    while melhorou:
+        melhorou = False
+
+        # 2-opt: inverte o trecho ordem[i:j]
+        for i in range(n - 1):
+            for j in range(i + 2, n + 1):
+                candidata = ordem[:i] + ordem[i:j][::-1] + ordem[j:]
+                custo = custo_roteiro(candidata, duracoes, saida)
+                if custo < melhor - 1e-9 and _ordem_valida(candidata, turnos):
+                    ordem, melhor, melhorou = candidata, custo, True
+
+        # Or-opt: move trechos de 1 a 3 visitas para outra posição
+        for tamanho in (1, 2, 3):
+            for i in range(n - tamanho + 1):
+                trecho = ordem[i:i + tamanho]
+                resto = ordem[:i] + ordem[i + tamanho:]
+                for j in range(len(resto) + 1):
+                    if j == i:
+                        continue
+                    candidata = resto[:j] + trecho + resto[j:]
+                    custo = custo_roteiro(candidata, duracoes, saida)
+                    if custo < melhor - 1e-9 and _ordem_valida(candidata, turnos):
+                        ordem, melhor, melhorou = candidata, custo, True
+                        break
+
+    return ordem
+
+
+def otimizar_roteiro(duracoes: Sequence[Sequence[float]],
+                     turnos: Optional[Sequence[Optional[str]]] = None,
+                     saida: Optional[Sequence[float]] = None,
+                     limite_exato: int = LIMITE_EXATO) -> Dict:
+    """
+    Calcula a ordem de visitas com o menor tempo total de deslocamento
+
+    Args:
+        duracoes: Matriz n x n com o tempo de viagem entre as visitas
+                  (duracoes[i][j] = de i para j, pode ser assimétrica)
+        turnos: Turno de cada visita ('manha', 'tarde', 'integral' ou vazio)
+        saida: Tempo do ponto de partida até cada visita (None = a primeira
+               visita é livre)
+        limite_exato: Maior número de visitas resolvido por Held-Karp
+
+    Returns:
+        Dicionário com 'ordem' (índices das visitas), 'duracao_total' (mesma
+        unidade de duracoes) e 'metodo' ('exato' ou 'heuristico')
+    """
+    n = len(duracoes)
+    turnos = list(turnos) if turnos is not None else [None] * n
+    if n == 0:
+        return {'ordem': [], 'duracao_total': 0.0, 'metodo': 'exato'}
+
+    if n <= limite_exato:
+        ordem = _held_karp(duracoes, turnos, saida)
+        metodo = 'exato'
+    else:
+        ordem = _busca_local(_vizinho_mais_proximo(duracoes, turnos, saida),
+                             duracoes, turnos, saida)
+        metodo = 'heuristico'
+
+    return {
+        'ordem': ordem,
+        'duracao_total': custo_roteiro(ordem, duracoes, saida),
+        'metodo': metodo,
+    }
+
+
+def _atribuir_com_capacidade(duracoes: np.ndarray, medoides: List[int],
+                             capacidades: Sequence[int]) -> np.ndarray:
+    """Liga cada ponto ao medoide mais próximo que ainda tenha vaga"""
+    n = len(duracoes)
+    grupos = np.full(n, -1)
+    vagas = list(capacidades)
+    custos = duracoes[:, medoides]
+
+    # Cada medoide fica no próprio grupo
+    for c, m in enumerate(medoides):
+        grupos[m] = c
+        vagas[c] -= 1
+
+    faltam = n - len(medoides)
+    for indice in np.argsort(custos, axis=None, kind='stable').tolist():
+        if faltam == 0:
+            break
+        i, c = divmod(indice, len(medoides))
+        if grupos[i] == -1 and vagas[c] > 0:
+            grupos[i] = c
+            vagas[c] -= 1
+            faltam -= 1
+    return grupos
+
+
+def k_medoides(duracoes, capacidades: Sequence[int], iteracoes: int = 50,
+               reinicios: int = 3, semente: int = 0) -> List[List[int]]:
+    """
+    Agrupa pontos próximos com k-medoides (atribuição com capacidade)
+
+    Args:
+        duracoes: Matriz n x n de tempos de viagem (simetrizada internamente)
+        capacidades: Máximo de pontos em cada um dos k grupos
+                     (a soma deve ser >= n)
+        iteracoes: Máximo de iterações de atribuição/atualização por reinício
+        reinicios: Quantas inicializações k-medoides++ testar
+        semente: Semente do gerador aleatório (resultado reprodutível)
+
+    Returns:
+        Lista com os índices dos pontos de cada grupo (na ordem de capacidades)
+    """
+    d = np.asarray(duracoes, dtype=np.float64)
+    d = (d + d.T) / 2
+    n = len(d)
+    k = len(capacidades)
+    if n == 0 or k == 0:
+        return [[] for _ in range(k)]
+    if sum(capacidades) < n:
+        raise ValueError("Capacidade total menor que o número de pontos")
+
+    k_efetivo = min(k, n)
+    rng = np.random.default_rng(semente)
+    melhor_custo, melhores_grupos = math.inf, None
+
+    for _ in range(reinicios):
+        # Inicialização k-medoides++: novos medoides longe dos já escolhidos
+        medoides = [int(rng.integers(n))]
+        mais_proximo = d[medoides[0]].copy()
+        while len(medoides) < k_efetivo:
+            pesos = mais_proximo ** 2
+            if pesos.sum() <= 0:
+                livres = [i for i in range(n) if i not in medoides]
+                medoides.append(int(rng.choice(livres)))
+            else:
+                medoides.append(int(rng.choice(n, p=pesos / pesos.sum())))
+            mais_proximo = np.minimum(mais_proximo, d[medoides[-1]])
+
+        for _ in range(iteracoes):
+            grupos = _atribuir_com_capacidade(d, medoides, capacidades[:k_efetivo])
+            novos = []
+            for c in range(k_efetivo):
+                membros = np.flatnonzero(grupos == c)
+                novos.append(int(membros[np.argmin(d[np.ix_(membros, membros)].sum(axis=1))]))
+            if novos == medoides:
+                break
+            medoides = novos
+
+        grupos = _atribuir_com_capacidade(d, medoides, capacidades[:k_efetivo])
+        custo = float(d[np.arange(n), np.asarray(medoides)[grupos]].sum())
+        if custo < melhor_custo:
+            melhor_custo, melhores_grupos = custo, grupos
+
+    resultado = [np.flatnonzero(melhores_grupos == c).tolist() for c in range(k_efetivo)]
+    return resultado + [[] for _ in range(k - k_efetivo)]
@@ -3,11 +3,15 @@ Modulo para gerenciar agenda/planejamento de eventos
 Sistema de agenda para organizar visitas, reunioes, feriados e outros eventos
 """
 import json
-import os
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from calendar import monthrange
 
+from armazenamento import ArmazenamentoJSON
+from banco_sqlite import BANCO_PADRAO, agora_utc, de_utc, marcadores, obter_banco
+from indice_ordenado import IndiceOrdenado
+
 
 # Tipos de eventos disponiveis
 TIPOS_EVENTO = {
@@ -19,46 +23,76 @@ TIPOS_EVENTO = {
     'outro': {'icone': 'bi-calendar-event', 'cor': '#6b7280', 'label': 'Outro'}
 }
 
+# Texto longo: no snapshot binario so e decodificado quando acessado
+CAMPOS_ADIADOS = ('descricao',)
+
+
+def _chave_evento(evento: Dict) -> tuple:
+    """Ordem de listar_eventos_dia: data, hora de inicio, titulo"""
+    return (evento['data'], evento.get('hora_inicio') or '00:00', evento.get('titulo', ''))
+
 
 class GerenciadorAgenda:
     """Gerencia agenda de eventos (visitas, reunioes, feriados, etc)"""
 
     def __init__(self, arquivo_dados: str = "data/agenda.json"):
         self.arquivo_dados = arquivo_dados
+        self._armazenamento = ArmazenamentoJSON(arquivo_dados, campos_adiados=CAMPOS_ADIADOS)
         self.eventos = []
         self._carregar_dados()
 
     def _carregar_dados(self):
         """Carrega eventos do arquivo JSON"""
-        if os.path.exists(self.arquivo_dados):
-            try:
-                with open(self.arquivo_dados, 'r', encoding='utf-8') as f:
-                    self.eventos = json.load(f)
-            except (json.JSONDecodeError, IOError):
+        with self._armazenamento.trava():
+            if self._armazenamento.existe():
+                try:
+                    self.eventos = self._armazenamento.ler()
+                except (json.JSONDecodeError, IOError):
+                    self.eventos = []
+            else:
                 self.eventos = []
-        else:
-            self.eventos = []
-            self._salvar_dados()
+                self._salvar_dados()
+        self._indexar()
+
+    def _indexar(self):
+        """Reconstroi os indices: id -> evento e eventos por data/hora"""
+        self._por_id = {e['id']: e for e in self.eventos}
+        self._por_data = IndiceOrdenado(_chave_evento, self.eventos)
 
     def _salvar_dados(self):
-        """Salva eventos no arquivo JSON"""
-        os.makedirs(os.path.dirname(self.arquivo_dados), exist_ok=True)
-        with open(self.arquivo_dados, 'w', encoding='utf-8') as f:
-            json.dump(self.eventos, f, ensure_ascii=False, indent=2)
+        """Salva eventos no arquivo JSON (gravacao atomica)"""
+        self._armazenamento.gravar(self.eventos)
 
     def _recarregar_do_disco(self):
-        """Recarrega eventos do JSON — necessario em ambientes multi-worker (Gunicorn)"""
-        if os.path.exists(self.arquivo_dados):
+        """
+        Recarrega eventos do JSON — necessario em ambientes multi-worker (Gunicorn)
+
+        So rele o arquivo se outro processo o alterou (senao custa um os.stat)
+        """
+        if self._armazenamento.alterado() and self._armazenamento.existe():
             try:
-                with open(self.arquivo_dados, 'r', encoding='utf-8') as f:
-                    self.eventos = json.load(f)
+                self.eventos = self._armazenamento.ler()
+                self._indexar()
             except (json.JSONDecodeError, IOError):
                 pass
 
+    @contextmanager
+    def _alteracao(self):
+        """Trava o arquivo e recarrega os eventos antes de ler-alterar-gravar"""
+        with self._armazenamento.trava():
+            self._recarregar_do_disco()
+            yield
+
     def _gerar_id(self) -> str:
         """Gera ID unico para evento"""
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
-        return f"evt_{timestamp}"
+        id_evento = f"evt_{timestamp}"
+        # Dois eventos no mesmo microssegundo (ex.: duplicacao em lote)
+        sufixo = 1
+        while id_evento in self._por_id:
+            sufixo += 1
+            id_evento = f"evt_{timestamp}_{sufixo}"
+        return id_evento
 
     def adicionar_evento(self, tipo: str, titulo: str, data: str,
                          hora_inicio: str = None, hora_fim: str = None,
@@ -89,29 +123,32 @@ class GerenciadorAgenda:
         """
         dt_data = datetime.strptime(data, "%Y-%m-%d")
 
-        evento = {
-            'id': self._gerar_id(),
-            'tipo': tipo,
-            'titulo': titulo,
-            'data': data,
-            'dia_semana': dt_data.weekday(),
-            'hora_inicio': hora_inicio,
-            'hora_fim': hora_fim,
-            'turno': turno,
-            'dia_inteiro': dia_inteiro,
-            'escola_id': escola_id,
-            'escola_nome': escola_nome,
-            'local': local,
-            'descricao': descricao,
-            'mediador_id': mediador_id,
-            'mediador_nome': mediador_nome,
-            'status': 'planejado',
-            'criado_em': datetime.now().isoformat(),
-            'atualizado_em': datetime.now().isoformat()
-        }
+        with self._alteracao():
+            evento = {
+                'id': self._gerar_id(),
+                'tipo': tipo,
+                'titulo': titulo,
+                'data': data,
+                'dia_semana': dt_data.weekday(),
+                'hora_inicio': hora_inicio,
+                'hora_fim': hora_fim,
+                'turno': turno,
+                'dia_inteiro': dia_inteiro,
+                'escola_id': escola_id,
+                'escola_nome': escola_nome,
+                'local': local,
+                'descricao': descricao,
+                'mediador_id': mediador_id,
+                'mediador_nome': mediador_nome,
+                'status': 'planejado',
+                'criado_em': datetime.now().isoformat(),
+                'atualizado_em': datetime.now().isoformat()
+            }
 
-        self.eventos.append(evento)
-        self._salvar_dados()
+            self.eventos.append(evento)
+            self._por_id[evento['id']] = evento
+            self._por_data.inserir(evento)
+            self._salvar_dados()
 
         return evento
 
@@ -126,8 +163,14 @@ class GerenciadorAgenda:
         Returns:
             True se atualizado com sucesso
         """
-        for evento in self.eventos:
-            if evento['id'] == evento_id:
+        with self._alteracao():
+            evento = self._por_id.get(evento_id)
+            if evento is None:
+                return False
+
+            # Data/hora/titulo fazem parte da chave do indice: reinsere depois de alterar
+            self._por_data.remover(evento)
+            try:
                 for key, value in kwargs.items():
                     if key in evento:
                         evento[key] = value
@@ -135,33 +178,31 @@ class GerenciadorAgenda:
                         if key == 'data' and value:
                             dt = datetime.strptime(value, "%Y-%m-%d")
                             evento['dia_semana'] = dt.weekday()
-                evento['atualizado_em'] = datetime.now().isoformat()
-                self._salvar_dados()
-                return True
-        return False
+            finally:
+                self._por_data.inserir(evento)
+            evento['atualizado_em'] = datetime.now().isoformat()
+            self._salvar_dados()
+        return True
 
     def remover_evento(self, evento_id: str) -> bool:
         """Remove um evento"""
-        tamanho_original = len(self.eventos)
-        self.eventos = [e for e in self.eventos if e['id'] != evento_id]
-        if len(self.eventos) < tamanho_original:
+        with self._alteracao():
+            evento = self._por_id.pop(evento_id, None)
+            if evento is None:
+                return False
+            self._por_data.remover(evento)
+            self.eventos = [e for e in self.eventos if e is not evento]
             self._salvar_dados()
-            return True
-        return False
+        return True
 
     def obter_evento(self, evento_id: str) -> Optional[Dict]:
         """Obtem um evento especifico"""
-        for evento in self.eventos:
-            if evento['id'] == evento_id:
-                return evento
-        return None
+        self._recarregar_do_disco()
+        return self._por_id.get(evento_id)
 
     def listar_eventos_dia(self, data: str) -> List[Dict]:
-        """Lista eventos de um dia especifico"""
-        eventos_dia = [e for e in self.eventos if e['data'] == data]
-        # Ordena por hora de inicio
-        eventos_dia.sort(key=lambda x: (x.get('hora_inicio') or '00:00', x.get('titulo', '')))
-        return eventos_dia
+        """Lista eventos de um dia especifico (ordenados por hora de inicio)"""
+        return self._por_data.intervalo(data, data)
 
     def listar_eventos_semana(self, data_referencia: str = None) -> Dict:
         """
@@ -370,12 +411,8 @@ class GerenciadorPlanejamentos(GerenciadorAgenda):
                              data_fim: str = None) -> List[Dict]:
         """Compatibilidade: lista eventos"""
         self._recarregar_do_disco()
-        resultado = self.eventos.copy()
-        if data_inicio:
-            resultado = [e for e in resultado if e['data'] >= data_inicio]
-        if data_fim:
-            resultado = [e for e in resultado if e['data'] <= data_fim]
-        resultado.sort(key=lambda x: x['data'], reverse=True)
+        resultado = self._por_data.intervalo(data_inicio or None, data_fim or None)
+        resultado.reverse()
         return resultado
 
     def obter_estatisticas_semana(self, planejamento_id: str) -> Dict:
@@ -391,3 +428,197 @@ class GerenciadorPlanejamentos(GerenciadorAgenda):
             'executadas': len([e for e in todos_eventos if e['status'] == 'executado']),
             'canceladas': len([e for e in todos_eventos if e['status'] == 'cancelado'])
         }
+
+
+# ----------------------------------------------------------------------
+# Banco SQLite do Django (ARMAZENAMENTO_LEGADO=sqlite)
+
+_COLUNAS_EVENTO = ('id, tipo, titulo, data, hora_inicio, hora_fim, turno, dia_inteiro, escola_id, '
+                   'escola_nome, local, descricao, mediador_id, mediador_nome, status, '
+                   'criado_em, atualizado_em')
+
+# Campos gravaveis do evento (dia_semana, criado_em e atualizado_em sao derivados)
+_CAMPOS_EVENTO = ('tipo', 'titulo', 'data', 'hora_inicio', 'hora_fim', 'turno', 'dia_inteiro',
+                  'escola_id', 'escola_nome', 'local', 'descricao', 'mediador_id',
+                  'mediador_nome', 'status')
+
+
+def _hora_para_banco(hora: Optional[str]) -> Optional[str]:
+    """'HH:MM' -> 'HH:MM:00' (TimeField do Django); vazio -> NULL"""
+    if not hora:
+        return None
+    return hora if hora.count(':') >= 2 else f"{hora}:00"
+
+
+def _evento_de_linha(linha) -> Dict:
+    """Linha de core_evento -> evento no formato do agenda.json"""
+    return {
+        'id': str(linha['id']),
+        'tipo': linha['tipo'],
+        'titulo': linha['titulo'],
+        'data': linha['data'],
+        'dia_semana': datetime.strptime(linha['data'], "%Y-%m-%d").weekday(),
+        'hora_inicio': linha['hora_inicio'][:5] if linha['hora_inicio'] else None,
+        'hora_fim': linha['hora_fim'][:5] if linha['hora_fim'] else None,
+        'turno': linha['turno'] or None,
+        'dia_inteiro': bool(linha['dia_inteiro']),
+        'escola_id': linha['escola_id'],
+        'escola_nome': linha['escola_nome'],
+        'local': linha['local'],
+        'descricao': linha['descricao'],
+        'mediador_id': linha['mediador_id'],
+        'mediador_nome': linha['mediador_nome'],
+        'status': linha['status'],
+        'criado_em': de_utc(linha['criado_em']),
+        'atualizado_em': de_utc(linha['atualizado_em'])
+    }
+
+
+class _AgendaSQL:
+    """
+    Metodos de GerenciadorAgenda sobre a tabela core_evento do banco do Django
+
+    Nada fica em memoria: cada consulta usa o indice de data + hora de inicio.
+    O ID do evento e a chave primaria, em texto como os IDs do JSON.
+    escola_id e mediador_id so sao gravados se existirem em core_escola e
+    core_mediador (os nomes sempre sao gravados).
+    """
+
+    def __init__(self, banco: str = BANCO_PADRAO):
+        self.banco = obter_banco(banco)
+        self._carregar_dados()
+
+    def _carregar_dados(self):
+        """Confere o esquema do banco"""
+        self.banco.verificar_tabelas('core_evento')
+
+    @property
+    def eventos(self) -> List[Dict]:
+        """Todos os eventos, em ordem de data e hora"""
+        return self._consultar()
+
+    def _recarregar_do_disco(self):
+        """Nada a recarregar: as consultas leem o banco"""
+
+    @contextmanager
+    def _alteracao(self):
+        """Transacao de escrita no banco"""
+        with self.banco.transacao() as conn:
+            yield conn
+
+    @staticmethod
+    def _id_banco(evento_id) -> Optional[int]:
+        try:
+            return int(evento_id)
+        except (TypeError, ValueError):
+            return None
+
+    def _consultar(self, onde: str = '', parametros: tuple = (), ordem: str = 'ASC') -> List[Dict]:
+        """Eventos na ordem de listar_eventos_dia (data, hora de inicio, titulo)"""
+        linhas = self.banco.consultar(
+            f"SELECT {_COLUNAS_EVENTO} FROM core_evento {onde} "
+            f"ORDER BY data {ordem}, COALESCE(hora_inicio, '00:00:00') {ordem}, titulo {ordem}, id {ordem}",
+            parametros)
+        return [_evento_de_linha(linha) for linha in linhas]
+
+    def _para_banco(self, campos: Dict) -> Dict:
+        """Valores do evento -> colunas de core_evento"""
+        valores = {}
+        for campo, valor in campos.items():
+            if campo in ('hora_inicio', 'hora_fim'):
+                valor = _hora_para_banco(valor)
+            elif campo == 'escola_id':
+                valor = valor if self.banco.existe('core_escola', valor) else None
+            elif campo == 'mediador_id':
+                valor = valor if self.banco.existe('core_mediador', valor) else None
+            elif campo == 'dia_inteiro':
+                valor = bool(valor)
+            elif valor is None:
+                valor = ''  # Colunas de texto do Django nao aceitam NULL
+            valores[campo] = valor
+        return valores
+
+    def adicionar_evento(self, tipo: str, titulo: str, data: str,
+                         hora_inicio: str = None, hora_fim: str = None,
+                         turno: str = None, escola_id: int = None,
+                         escola_nome: str = "", local: str = "",
+                         descricao: str = "", mediador_id: int = None,
+                         mediador_nome: str = "", dia_inteiro: bool = False) -> Dict:
+        """Adiciona um novo evento a agenda (argumentos de GerenciadorAgenda.adicionar_evento)"""
+        datetime.strptime(data, "%Y-%m-%d")
+
+        with self._alteracao() as conn:
+            valores = self._para_banco({
+                'tipo': tipo, 'titulo': titulo, 'data': data, 'hora_inicio': hora_inicio,
+                'hora_fim': hora_fim, 'turno': turno, 'dia_inteiro': dia_inteiro,
+                'escola_id': escola_id, 'escola_nome': escola_nome, 'local': local,
+                'descricao': descricao, 'mediador_id': mediador_id,
+                'mediador_nome': mediador_nome, 'status': 'planejado',
+            })
+            valores['criado_em'] = valores['atualizado_em'] = agora_utc()
+            cursor = conn.execute(
+                f"INSERT INTO core_evento ({', '.join(valores)}) VALUES ({marcadores(len(valores))})",
+                tuple(valores.values()))
+        return self.obter_evento(cursor.lastrowid)
+
+    def atualizar_evento(self, evento_id: str, **kwargs) -> bool:
+        """
+        Atualiza um evento existente
+
+        Args:
+            evento_id: ID do evento
+            **kwargs: Campos a serem atualizados (os que nao sao do evento sao ignorados)
+
+        Returns:
+            True se atualizado com sucesso
+        """
+        campos = {k: v for k, v in kwargs.items() if k in _CAMPOS_EVENTO}
+        if 'data' in campos:
+            if campos['data']:
+                datetime.strptime(campos['data'], "%Y-%m-%d")
+            else:
+                del campos['data']  # DateField sem valor vazio
+
+        with self._alteracao() as conn:
+            valores = self._para_banco(campos)
+            valores['atualizado_em'] = agora_utc()
+            atribuicoes = ', '.join(f'{coluna} = ?' for coluna in valores)
+            cursor = conn.execute(f'UPDATE core_evento SET {atribuicoes} WHERE id = ?',
+                                  (*valores.values(), self._id_banco(evento_id)))
+        return cursor.rowcount > 0
+
+    def remover_evento(self, evento_id: str) -> bool:
+        """Remove um evento"""
+        with self._alteracao() as conn:
+            cursor = conn.execute('DELETE FROM core_evento WHERE id = ?', (self._id_banco(evento_id),))
+        return cursor.rowcount > 0
+
+    def obter_evento(self, evento_id: str) -> Optional[Dict]:
+        """Obtem um evento especifico"""
+        eventos = self._consultar('WHERE id = ?', (self._id_banco(evento_id),))
+        return eventos[0] if eventos else None
+
+    def listar_eventos_dia(self, data: str) -> List[Dict]:
+        """Lista eventos de um dia especifico (ordenados por hora de inicio)"""
+        return self._consultar('WHERE data = ?', (data,))
+
+
+class GerenciadorAgendaSQL(_AgendaSQL, GerenciadorAgenda):
+    """GerenciadorAgenda sobre a tabela core_evento do banco do Django"""
+
+
+class GerenciadorPlanejamentosSQL(_AgendaSQL, GerenciadorPlanejamentos):
+    """GerenciadorPlanejamentos (compatibilidade) sobre a tabela core_evento"""
+
+    def listar_planejamentos(self, data_inicio: str = None,
+                             data_fim: str = None) -> List[Dict]:
+        """Compatibilidade: lista eventos (mais recentes primeiro)"""
+        condicoes, parametros = [], []
+        if data_inicio:
+            condicoes.append('data >= ?')
+            parametros.append(data_inicio)
+        if data_fim:
+            condicoes.append('data <= ?')
+            parametros.append(data_fim)
+        onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+        return self._consultar(onde, tuple(parametros), 'DESC')
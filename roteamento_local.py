@@ -0,0 +1,414 @@
+"""
+Módulo de roteamento local (sem rede) para o CalculadorDistancias
+
+Carrega a malha viária de um extrato OpenStreetMap (.osm, .osm.gz ou
+.osm.bz2) em vetores compactos no formato CSR (lista de adjacência em
+arrays) e responde rotas de carro dentro do próprio processo:
+  - Dijkstra bidirecional para um par origem → destino
+  - Dijkstra um-para-muitos para montar tabelas/matrizes
+
+O grafo compilado é salvo ao lado do extrato (.npz) para carregamento rápido.
+"""
+import bz2
+import gzip
+import heapq
+import math
+import os
+import xml.etree.ElementTree as ET
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from distancias import codificar_polyline
+from indice_espacial import IndiceEspacial
+
+# Velocidade média (km/h) por tipo de via OSM
+VELOCIDADES_KMH = {
+    'motorway': 90, 'motorway_link': 50,
+    'trunk': 80, 'trunk_link': 45,
+    'primary': 60, 'primary_link': 40,
+    'secondary': 50, 'secondary_link': 35,
+    'tertiary': 40, 'tertiary_link': 30,
+    'unclassified': 30, 'residential': 30, 'road': 30,
+    'living_street': 10, 'service': 15,
+}
+
+# Velocidade usada no trecho entre o ponto consultado e o nó mais próximo da malha
+VELOCIDADE_ACESSO_KMH = 20
+
+RAIO_TERRA_M = 6371008.8
+
+
+def _haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * RAIO_TERRA_M * math.asin(math.sqrt(min(1.0, a)))
+
+
+def _velocidade_via(tags: Dict) -> Optional[float]:
+    """Velocidade (km/h) de uma via ou None se não for trafegável por carro"""
+    tipo = tags.get('highway')
+    if tipo not in VELOCIDADES_KMH:
+        return None
+    if tags.get('access') in ('no', 'private') or tags.get('motor_vehicle') == 'no':
+        return None
+    maxspeed = tags.get('maxspeed', '').split()[0] if tags.get('maxspeed') else ''
+    if maxspeed.isdigit():
+        # Velocidade média fica abaixo do limite da via
+        return min(float(maxspeed) * 0.8, VELOCIDADES_KMH[tipo] * 1.5)
+    return float(VELOCIDADES_KMH[tipo])
+
+
+def _sentido_via(tags: Dict) -> int:
+    """1 = só no sentido dos nós, -1 = só no sentido inverso, 0 = mão dupla"""
+    oneway = tags.get('oneway', '')
+    if oneway in ('yes', 'true', '1'):
+        return 1
+    if oneway == '-1':
+        return -1
+    if oneway == 'no':
+        return 0
+    if tags.get('junction') in ('roundabout', 'circular') or tags.get('highway') == 'motorway':
+        return 1
+    return 0
+
+
+class GrafoViario:
+    """Malha viária em formato CSR: arestas de cada nó em inicio[n]:inicio[n+1]"""
+
+    def __init__(self, latitudes: np.ndarray, longitudes: np.ndarray,
+                 origens: np.ndarray, destinos: np.ndarray,
+                 distancias: np.ndarray, duracoes: np.ndarray):
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.total_nos = len(self.latitudes)
+
+        origens = np.asarray(origens, dtype=np.int32)
+        destinos = np.asarray(destinos, dtype=np.int32)
+        distancias = np.asarray(distancias, dtype=np.float32)
+        duracoes = np.asarray(duracoes, dtype=np.float32)
+
+        self._direto = self._montar_csr(origens, destinos, distancias, duracoes)
+        self._reverso = self._montar_csr(destinos, origens, distancias, duracoes)
+        self._arestas = (origens, destinos, distancias, duracoes)
+
+        self.indice = IndiceEspacial(
+            {'id': i, 'latitude': lat, 'longitude': lon}
+            for i, (lat, lon) in enumerate(zip(self.latitudes.tolist(), self.longitudes.tolist()))
+        )
+
+    def _montar_csr(self, de, para, distancias, duracoes):
+        ordem = np.argsort(de, kind='stable')
+        contagem = np.bincount(de, minlength=self.total_nos)
+        inicio = np.zeros(self.total_nos + 1, dtype=np.int64)
+        np.cumsum(contagem, out=inicio[1:])
+        # array.array devolve escalares Python rapidamente no laço do Dijkstra
+        return (
+            array('q', inicio.tobytes()),
+            array('i', para[ordem].astype(np.int32).tobytes()),
+            array('f', distancias[ordem].tobytes()),
+            array('f', duracoes[ordem].tobytes()),
+        )
+
+    @property
+    def total_arestas(self) -> int:
+        return len(self._arestas[0])
+
+    # ------------------------------------------------------------------
+    # Construção / persistência
+
+    @classmethod
+    def de_vias(cls, nos: Dict[int, Tuple[float, float]],
+                vias: Iterable[Tuple[Sequence[int], Dict]]) -> 'GrafoViario':
+        """
+        Monta o grafo a partir de nós e vias OSM
+
+        Args:
+            nos: {id_osm: (latitude, longitude)}
+            vias: Iterável de (lista de ids de nós, tags da via)
+        """
+        indice_no = {}
+        lats, lons = [], []
+        origens, destinos, distancias, duracoes = [], [], [], []
+
+        def _indice(id_osm):
+            if id_osm not in indice_no:
+                indice_no[id_osm] = len(lats)
+                lats.append(nos[id_osm][0])
+                lons.append(nos[id_osm][1])
+            return indice_no[id_osm]
+
+        for refs, tags in vias:
+            velocidade = _velocidade_via(tags)
+            if velocidade is None:
+                continue
+            sentido = _sentido_via(tags)
+            refs = [r for r in refs if r in nos]
+
+            for a, b in zip(refs, refs[1:]):
+                ia, ib = _indice(a), _indice(b)
+                metros = _haversine_m(lats[ia], lons[ia], lats[ib], lons[ib])
+                segundos = metros / (velocidade / 3.6)
+                if sentido >= 0:
+                    origens.append(ia)
+                    destinos.append(ib)
+                    distancias.append(metros)
+                    duracoes.append(segundos)
+                if sentido <= 0:
+                    origens.append(ib)
+                    destinos.append(ia)
+                    distancias.append(metros)
+                    duracoes.append(segundos)
+
+        return cls(np.array(lats), np.array(lons), np.array(origens, dtype=np.int32),
+                   np.array(destinos, dtype=np.int32), np.array(distancias), np.array(duracoes))
+
+    @classmethod
+    def de_osm(cls, arquivo: str) -> 'GrafoViario':
+        """Lê um extrato OSM XML (.osm, .osm.gz ou .osm.bz2)"""
+        if arquivo.endswith('.gz'):
+            abrir = gzip.open
+        elif arquivo.endswith('.bz2'):
+            abrir = bz2.open
+        else:
+            abrir = open
+
+        nos = {}
+        vias = []
+        with abrir(arquivo, 'rb') as f:
+            for _, elem in ET.iterparse(f, events=('end',)):
+                if elem.tag == 'node':
+                    nos[int(elem.get('id'))] = (float(elem.get('lat')), float(elem.get('lon')))
+                    elem.clear()
+                elif elem.tag == 'way':
+                    tags = {t.get('k'): t.get('v') for t in elem.iter('tag')}
+                    if 'highway' in tags:
+                        vias.append(([int(nd.get('ref')) for nd in elem.iter('nd')], tags))
+                    elem.clear()
+
+        return cls.de_vias(nos, vias)
+
+    def salvar(self, arquivo: str):
+        """Salva o grafo compilado em .npz"""
+        origens, destinos, distancias, duracoes = self._arestas
+        np.savez_compressed(arquivo, latitudes=self.latitudes, longitudes=self.longitudes,
+                            origens=origens, destinos=destinos,
+                            distancias=distancias, duracoes=duracoes)
+
+    @classmethod
+    def carregar(cls, arquivo: str) -> 'GrafoViario':
+        """Carrega um grafo compilado por salvar()"""
+        with np.load(arquivo) as dados:
+            return cls(dados['latitudes'], dados['longitudes'], dados['origens'],
+                       dados['destinos'], dados['distancias'], dados['duracoes'])
+
+    # ------------------------------------------------------------------
+    # Consultas
+
+    def no_mais_proximo(self, coords: Tuple[float, float]) -> Optional[Tuple[int, float]]:
+        """Retorna (índice do nó, distância em metros) do nó mais próximo de uma coordenada"""
+        resultado = self.indice.k_proximos(coords[0], coords[1], 1)
+        if not resultado:
+            return None
+        item, km = resultado[0]
+        return item['id'], km * 1000
+
+    def caminho_mais_curto(self, origem: int, destino: int) -> Optional[Tuple[float, float, List[int]]]:
+        """
+        Dijkstra bidirecional minimizando o tempo de viagem
+
+        Returns:
+            (duracao_segundos, distancia_metros, lista de nós) ou None se não houver caminho
+        """
+        if origem == destino:
+            return 0.0, 0.0, [origem]
+
+        lados = (
+            {'grafo': self._direto, 'custo': {origem: 0.0}, 'pai': {origem: None},
+             'fila': [(0.0, origem)], 'fechados': set()},
+            {'grafo': self._reverso, 'custo': {destino: 0.0}, 'pai': {destino: None},
+             'fila': [(0.0, destino)], 'fechados': set()},
+        )
+        melhor = math.inf
+        encontro = None
+
+        while lados[0]['fila'] and lados[1]['fila']:
+            if lados[0]['fila'][0][0] + lados[1]['fila'][0][0] >= melhor:
+                break
+
+            lado = lados[0] if lados[0]['fila'][0][0] <= lados[1]['fila'][0][0] else lados[1]
+            outro = lados[1] if lado is lados[0] else lados[0]
+            custo_atual, no = heapq.heappop(lado['fila'])
+            if no in lado['fechados']:
+                continue
+            lado['fechados'].add(no)
+
+            inicio, vizinhos, _, duracoes = lado['grafo']
+            for k in range(inicio[no], inicio[no + 1]):
+                vizinho = vizinhos[k]
+                novo = custo_atual + duracoes[k]
+                if novo < lado['custo'].get(vizinho, math.inf):
+                    lado['custo'][vizinho] = novo
+                    lado['pai'][vizinho] = no
+                    heapq.heappush(lado['fila'], (novo, vizinho))
+                if vizinho in outro['custo']:
+                    total = lado['custo'][vizinho] + outro['custo'][vizinho]
+                    if total < melhor:
+                        melhor = total
+                        encontro = vizinho
+
+        if encontro is None:
+            return None
+
+        ida = []
+        no = encontro
+        while no is not None:
+            ida.append(no)
+            no = lados[0]['pai'][no]
+        ida.reverse()
+        no = lados[1]['pai'][encontro]
+        while no is not None:
+            ida.append(no)
+            no = lados[1]['pai'][no]
+
+        return melhor, self._distancia_caminho(ida), ida
+
+    def _distancia_caminho(self, caminho: List[int]) -> float:
+        inicio, vizinhos, distancias, duracoes = self._direto
+        total = 0.0
+        for a, b in zip(caminho, caminho[1:]):
+            # Entre arestas paralelas, usa a mais rápida (a mesma escolhida pelo Dijkstra)
+            melhor = min((duracoes[k], distancias[k])
+                         for k in range(inicio[a], inicio[a + 1]) if vizinhos[k] == b)
+            total += melhor[1]
+        return total
+
+    def um_para_muitos(self, origem: int, destinos: Iterable[int]) -> Dict[int, Tuple[float, float]]:
+        """
+        Dijkstra a partir de um nó até todos os destinos serem alcançados
+
+        Returns:
+            {destino: (duracao_segundos, distancia_metros)} para os destinos alcançáveis
+        """
+        pendentes = set(destinos)
+        custo = {origem: (0.0, 0.0)}
+        fila = [(0.0, 0.0, origem)]
+        fechados = set()
+        resultado = {}
+        inicio, vizinhos, distancias, duracoes = self._direto
+
+        while fila and pendentes:
+            duracao, distancia, no = heapq.heappop(fila)
+            if no in fechados:
+                continue
+            fechados.add(no)
+            if no in pendentes:
+                resultado[no] = (duracao, distancia)
+                pendentes.discard(no)
+
+            for k in range(inicio[no], inicio[no + 1]):
+                vizinho = vizinhos[k]
+                nova = duracao + duracoes[k]
+                if nova < custo.get(vizinho, (math.inf,))[0]:
+                    custo[vizinho] = (nova, distancia + distancias[k])
+                    heapq.heappush(fila, (nova, distancia + distancias[k], vizinho))
+
+        return resultado
+
+
+class RoteadorLocal:
+    """Backend de roteamento para CalculadorDistancias que não usa rede"""
+
+    def __init__(self, grafo: GrafoViario):
+        self.grafo = grafo
+
+    @classmethod
+    def de_arquivo(cls, arquivo: str) -> 'RoteadorLocal':
+        """
+        Carrega a malha de um extrato OSM, reaproveitando o grafo compilado
+        (<arquivo>.npz) quando ele é mais novo que o extrato
+        """
+        compilado = arquivo if arquivo.endswith('.npz') else f"{arquivo}.npz"
+        if os.path.exists(compilado) and (
+                compilado == arquivo
+                or os.path.getmtime(compilado) >= os.path.getmtime(arquivo)):
+            return cls(GrafoViario.carregar(compilado))
+
+        grafo = GrafoViario.de_osm(arquivo)
+        grafo.salvar(compilado)
+        return cls(grafo)
+
+    @staticmethod
+    def _formatar_rota(distancia_metros: float, duracao_segundos: float) -> Dict:
+        return {
+            'distancia_metros': distancia_metros,
+            'distancia_km': round(distancia_metros / 1000, 2),
+            'duracao_segundos': duracao_segundos,
+            'duracao_minutos': round(duracao_segundos / 60, 1)
+        }
+
+    @staticmethod
+    def _acesso(metros: float) -> Tuple[float, float]:
+        """(segundos, metros) do trecho entre o ponto consultado e a malha"""
+        return metros / (VELOCIDADE_ACESSO_KMH / 3.6), metros
+
+    def calcular_distancia(self, origem: Tuple[float, float],
+                           destino: Tuple[float, float],
+                           geometria: bool = False) -> Optional[Dict]:
+        """
+        Mesmo contrato de CalculadorDistancias.calcular_distancia; com
+        geometria=True inclui o trajeto pelos nós da malha ('geometria',
+        polyline codificada)
+        """
+        no_origem = self.grafo.no_mais_proximo(origem)
+        no_destino = self.grafo.no_mais_proximo(destino)
+        if no_origem is None or no_destino is None:
+            return None
+
+        caminho = self.grafo.caminho_mais_curto(no_origem[0], no_destino[0])
+        if caminho is None:
+            return None
+
+        duracao, distancia, nos = caminho
+        for metros in (no_origem[1], no_destino[1]):
+            s, m = self._acesso(metros)
+            duracao += s
+            distancia += m
+        rota = self._formatar_rota(distancia, duracao)
+        if geometria:
+            pontos = [origem]
+            pontos += zip(self.grafo.latitudes[nos].tolist(), self.grafo.longitudes[nos].tolist())
+            pontos.append(destino)
+            rota['geometria'] = codificar_polyline(pontos)
+        return rota
+
+    def calcular_tabela(self, origens: List[Tuple[float, float]],
+                        destinos: List[Tuple[float, float]]) -> List[List[Optional[Dict]]]:
+        """Mesmo contrato de CalculadorDistancias.calcular_tabela"""
+        nos_destino = [self.grafo.no_mais_proximo(d) for d in destinos]
+        alvos = {n[0] for n in nos_destino if n is not None}
+
+        resultado = []
+        for origem in origens:
+            no_origem = self.grafo.no_mais_proximo(origem)
+            if no_origem is None:
+                resultado.append([None] * len(destinos))
+                continue
+
+            alcancados = self.grafo.um_para_muitos(no_origem[0], alvos)
+            linha = []
+            for no_destino in nos_destino:
+                if no_destino is None or no_destino[0] not in alcancados:
+                    linha.append(None)
+                    continue
+                duracao, distancia = alcancados[no_destino[0]]
+                for metros in (no_origem[1], no_destino[1]):
+                    s, m = self._acesso(metros)
+                    duracao += s
+                    distancia += m
+                linha.append(self._formatar_rota(distancia, duracao))
+            resultado.append(linha)
+
+        return resultado
@@ -110,6 +110,7 @@ def calcular_matriz_inicial():
 
     matriz = calculador.calcular_matriz_distancias(escolas_bloco1)
     calculador.salvar_matriz(matriz)
+    calculador.salvar_matriz_binaria(matriz, escolas_bloco1)
 
     print("-" * 80)
     print("\n[OK]Matriz de distâncias calculada e salva!")
@@ -1,12 +1,44 @@
 """
 Modulo para gerenciar usuarios do sistema
 """
-import json
-import os
-from typing import Dict, Optional
+import base64
+import hashlib
+import hmac
+import secrets
+import sqlite3
+import string
+from contextlib import contextmanager
+from typing import Dict, List, Optional
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 
+from armazenamento import ArmazenamentoJSON
+from banco_sqlite import BANCO_PADRAO, agora_utc, obter_banco
+
+# Hash de senha do Django (PBKDF2PasswordHasher, padrao do Django 5.2)
+ALGORITMO_DJANGO = 'pbkdf2_sha256'
+ITERACOES_DJANGO = 1_000_000
+
+
+def gerar_hash_django(senha: str, iteracoes: int = ITERACOES_DJANGO) -> str:
+    """Hash no formato de User.password do Django: pbkdf2_sha256$iteracoes$sal$hash"""
+    sal = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(22))
+    digest = hashlib.pbkdf2_hmac('sha256', senha.encode('utf-8'), sal.encode('utf-8'), iteracoes)
+    return f"{ALGORITMO_DJANGO}${iteracoes}${sal}${base64.b64encode(digest).decode('ascii')}"
+
+
+def verificar_hash_django(password_hash: str, senha: str) -> bool:
+    """Confere a senha com um hash pbkdf2_sha256 gravado pelo Django"""
+    try:
+        algoritmo, iteracoes, sal, esperado = password_hash.split('$', 3)
+        iteracoes = int(iteracoes)
+    except ValueError:
+        return False
+    if algoritmo != ALGORITMO_DJANGO:
+        return False
+    digest = hashlib.pbkdf2_hmac('sha256', senha.encode('utf-8'), sal.encode('utf-8'), iteracoes)
+    return hmac.compare_digest(base64.b64encode(digest).decode('ascii'), esperado)
+
 
 class Usuario(UserMixin):
     """Classe de usuario compativel com Flask-Login"""
@@ -26,6 +58,9 @@ class Usuario(UserMixin):
         return self.ativo
 
     def verificar_senha(self, senha):
+        # Usuarios do banco do Django tem o hash do Django; os do JSON, o do werkzeug
+        if self.password_hash.startswith(ALGORITMO_DJANGO + '$'):
+            return verificar_hash_django(self.password_hash, senha)
         return check_password_hash(self.password_hash, senha)
 
     @staticmethod
@@ -42,63 +77,182 @@ class Usuario(UserMixin):
 class GerenciadorUsuarios:
     def __init__(self, arquivo_dados: str = "data/usuarios.json"):
         self.arquivo_dados = arquivo_dados
+        self._armazenamento = ArmazenamentoJSON(arquivo_dados)
         self.usuarios = []
         self._carregar_dados()
 
     def _carregar_dados(self):
         """Carrega usuarios do arquivo JSON"""
-        if os.path.exists(self.arquivo_dados):
-            with open(self.arquivo_dados, 'r', encoding='utf-8') as f:
-                self.usuarios = json.load(f)
-        else:
-            self.usuarios = []
-            self._salvar_dados()
+        with self._armazenamento.trava():
+            if self._armazenamento.existe():
+                self.usuarios = self._armazenamento.ler()
+            else:
+                self.usuarios = []
+                self._salvar_dados()
+        self._indexar()
+
+    def _recarregar_do_disco(self):
+        """Rele o JSON so se outro processo o alterou (so um os.stat se nada mudou)"""
+        if self._armazenamento.alterado() and self._armazenamento.existe():
+            self.usuarios = self._armazenamento.ler()
+            self._indexar()
+
+    @contextmanager
+    def _alteracao(self):
+        """Trava o arquivo e recarrega os dados antes de ler-alterar-gravar"""
+        with self._armazenamento.trava():
+            self._recarregar_do_disco()
+            yield
+
+    def _indexar(self):
+        """Reconstroi os indices por id e por username e o proximo id livre"""
+        self._por_id = {u['id']: u for u in self.usuarios}
+        self._por_username = {u['username']: u for u in reversed(self.usuarios)}
+        self._proximo_id = max(self._por_id, default=0) + 1
 
     def _salvar_dados(self):
-        """Salva usuarios no arquivo JSON"""
-        os.makedirs(os.path.dirname(self.arquivo_dados), exist_ok=True)
-        with open(self.arquivo_dados, 'w', encoding='utf-8') as f:
-            json.dump(self.usuarios, f, ensure_ascii=False, indent=2)
+        """Salva usuarios no arquivo JSON (gravacao atomica)"""
+        self._armazenamento.gravar(self.usuarios)
 
     def _gerar_id(self) -> int:
-        """Gera proximo ID disponivel"""
-        if not self.usuarios:
-            return 1
-        return max(u['id'] for u in self.usuarios) + 1
+        """Gera proximo ID disponivel (crescente, sem reaproveitar)"""
+        novo_id = self._proximo_id
+        self._proximo_id += 1
+        return novo_id
 
     def inicializar_admin(self):
         """Cria usuario admin padrao se nenhum usuario existir"""
-        if not self.usuarios:
-            self.adicionar_usuario(
-                username="mileny_alves",
-                senha="M@2026",
-                nome_exibicao="Mileny Alves"
-            )
+        with self._alteracao():
+            if not self.usuarios:
+                self.adicionar_usuario(
+                    username="mileny_alves",
+                    senha="M@2026",
+                    nome_exibicao="Mileny Alves"
+                )
 
     def adicionar_usuario(self, username: str, senha: str,
                           nome_exibicao: str = "") -> Dict:
         """Adiciona novo usuario com senha hasheada"""
-        usuario = {
-            'id': self._gerar_id(),
+        password_hash = generate_password_hash(senha)
+        with self._alteracao():
+            usuario = {
+                'id': self._gerar_id(),
+                'username': username,
+                'password_hash': password_hash,
+                'nome_exibicao': nome_exibicao,
+                'ativo': True
+            }
+            self.usuarios.append(usuario)
+            self._por_id[usuario['id']] = usuario
+            self._por_username.setdefault(usuario['username'], usuario)
+            self._salvar_dados()
+        return usuario
+
+    def obter_por_username(self, username: str) -> Optional[Usuario]:
+        """Busca usuario por username e retorna objeto Usuario"""
+        self._recarregar_do_disco()
+        u = self._por_username.get(username)
+        return Usuario.from_dict(u) if u is not None else None
+
+    def obter_por_id(self, user_id: int) -> Optional[Usuario]:
+        """Busca usuario por ID e retorna objeto Usuario"""
+        self._recarregar_do_disco()
+        u = self._por_id.get(int(user_id))
+        return Usuario.from_dict(u) if u is not None else None
+
+
+# ----------------------------------------------------------------------
+# Banco SQLite do Django (ARMAZENAMENTO_LEGADO=sqlite)
+
+_COLUNAS_USUARIO = 'id, username, password, nome_exibicao, ativo, is_active'
+
+
+def _usuario_de_linha(linha) -> Dict:
+    """Linha de core_usuario -> dicionario no formato do usuarios.json"""
+    return {
+        'id': linha['id'],
+        'username': linha['username'],
+        'password_hash': linha['password'],
+        'nome_exibicao': linha['nome_exibicao'],
+        'ativo': bool(linha['ativo']) and bool(linha['is_active'])
+    }
+
+
+class GerenciadorUsuariosSQL(GerenciadorUsuarios):
+    """
+    GerenciadorUsuarios sobre a tabela core_usuario do banco do Django
+
+    Os logins sao os mesmos do Django: senhas novas usam o hash do Django e
+    username e unico (ValueError ao repetir).
+    """
+
+    def __init__(self, banco: str = BANCO_PADRAO):
+        self.banco = obter_banco(banco)
+        self._carregar_dados()
+
+    def _carregar_dados(self):
+        """Confere o esquema do banco"""
+        self.banco.verificar_tabelas('core_usuario')
+
+    @property
+    def usuarios(self) -> List[Dict]:
+        """Todos os usuarios (consulta o banco)"""
+        return [_usuario_de_linha(linha) for linha in self.banco.consultar(
+            f'SELECT {_COLUNAS_USUARIO} FROM core_usuario ORDER BY id')]
+
+    def _recarregar_do_disco(self):
+        """Nada a recarregar: as consultas leem o banco"""
+
+    @contextmanager
+    def _alteracao(self):
+        """Transacao de escrita no banco"""
+        with self.banco.transacao() as conn:
+            yield conn
+
+    def _inserir(self, conn, username: str, password_hash: str, nome_exibicao: str,
+                 is_staff: bool = False) -> Dict:
+        try:
+            cursor = conn.execute(
+                'INSERT INTO core_usuario (password, is_superuser, username, first_name, last_name, '
+                "email, is_staff, is_active, date_joined, nome_exibicao, ativo) "
+                "VALUES (?, 0, ?, '', '', '', ?, 1, ?, ?, 1)",
+                (password_hash, username, is_staff, agora_utc(), nome_exibicao))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Usuario ja existe: {username}") from None
+        return {
+            'id': cursor.lastrowid,
             'username': username,
-            'password_hash': generate_password_hash(senha),
+            'password_hash': password_hash,
             'nome_exibicao': nome_exibicao,
             'ativo': True
         }
-        self.usuarios.append(usuario)
-        self._salvar_dados()
-        return usuario
+
+    def inicializar_admin(self):
+        """Cria usuario admin padrao (equipe, como no init_db) se nenhum usuario existir"""
+        sem_usuarios = 'SELECT 1 FROM core_usuario LIMIT 1'
+        if self.banco.consultar_um(sem_usuarios) is not None:
+            return
+        # Hash (lento de proposito) fora da transacao de escrita
+        password_hash = gerar_hash_django("M@2026")
+        with self._alteracao() as conn:
+            if conn.execute(sem_usuarios).fetchone() is None:
+                self._inserir(conn, "mileny_alves", password_hash, "Mileny Alves", is_staff=True)
+
+    def adicionar_usuario(self, username: str, senha: str,
+                          nome_exibicao: str = "") -> Dict:
+        """Adiciona novo usuario com senha hasheada (hash do Django)"""
+        password_hash = gerar_hash_django(senha)
+        with self._alteracao() as conn:
+            return self._inserir(conn, username, password_hash, nome_exibicao)
 
     def obter_por_username(self, username: str) -> Optional[Usuario]:
         """Busca usuario por username e retorna objeto Usuario"""
-        for u in self.usuarios:
-            if u['username'] == username:
-                return Usuario.from_dict(u)
-        return None
+        linha = self.banco.consultar_um(
+            f'SELECT {_COLUNAS_USUARIO} FROM core_usuario WHERE username = ?', (username,))
+        return Usuario.from_dict(_usuario_de_linha(linha)) if linha is not None else None
 
     def obter_por_id(self, user_id: int) -> Optional[Usuario]:
         """Busca usuario por ID e retorna objeto Usuario"""
-        for u in self.usuarios:
-            if u['id'] == int(user_id):
-                return Usuario.from_dict(u)
-        return None
+        linha = self.banco.consultar_um(
+            f'SELECT {_COLUNAS_USUARIO} FROM core_usuario WHERE id = ?', (int(user_id),))
+        return Usuario.from_dict(_usuario_de_linha(linha)) if linha is not None else None
@@ -1,45 +1,291 @@
 """
 Módulo para gerenciar visitas às escolas
+
+As visitas ficam em um snapshot (visitas.json, a lista completa) mais um
+diário só de acréscimos (visitas.diario.jsonl) com uma linha por alteração.
+Registrar ou alterar uma visita grava só uma linha no diário; ao carregar,
+o diário é reaplicado sobre o snapshot. Quando o diário passa de
+LIMITE_DIARIO linhas, tudo é compactado em um novo snapshot.
+
+Todas as operações do diário são idempotentes (incluir substitui a visita
+de mesmo id, alterar grava os valores finais dos campos), então reaplicar
+um diário que já entrou no snapshot não muda nada.
+
+Entre processos (workers do gunicorn), snapshot e diário são protegidos pela
+trava do ArmazenamentoJSON do snapshot. Cada processo guarda até que byte
+do diário já aplicou: se só o diário cresceu, aplica apenas as linhas novas;
+se o snapshot foi trocado (compactação de outro processo), relê tudo.
 """
 import json
 import os
 import shutil
+from contextlib import contextmanager
 from datetime import datetime
+from operator import itemgetter
 from typing import List, Dict, Optional
 from pathlib import Path
 
+from armazenamento import ArmazenamentoJSON
+from banco_sqlite import BANCO_PADRAO, agora_utc, de_utc, lotes, marcadores, obter_banco
+from indice_ordenado import IndiceOrdenado
+
+# Linhas no diário que disparam a compactação em um novo snapshot
+LIMITE_DIARIO = 500
+
+# Textos longos e listas aninhadas: no snapshot binário só são decodificados
+# quando acessados (os índices e as estatísticas não usam nenhum deles)
+CAMPOS_ADIADOS = ('observacoes', 'contribuicoes', 'combinados', 'turmas', 'anexos')
+
+
+def arquivo_diario(arquivo_visitas: str) -> str:
+    """'data/visitas.json' -> 'data/visitas.diario.jsonl'"""
+    return os.path.splitext(arquivo_visitas)[0] + '.diario.jsonl'
+
+
+def _chave_data(visita: Dict) -> tuple:
+    return (visita['data'], visita.get('hora') or '')
+
+
+def _aplicar(visitas: Dict[str, Dict], operacao: Dict):
+    """Aplica uma linha do diário ao dicionário id -> visita"""
+    tipo = operacao['op']
+    if tipo == 'incluir':
+        visitas[operacao['visita']['id']] = operacao['visita']
+    elif tipo == 'alterar':
+        if operacao['id'] in visitas:
+            visitas[operacao['id']].update(operacao['campos'])
+    elif tipo == 'excluir':
+        visitas.pop(operacao['id'], None)
+
+
+def _ler_diario(diario: str, posicao: int = 0) -> tuple:
+    """
+    Lê as operações do diário a partir de um byte
+
+    Para na primeira linha sem '\\n' (queda no meio da gravação ou outro
+    processo ainda escrevendo), sem contá-la na posição.
+
+    Returns:
+        (lista de operações, posição logo após a última linha lida)
+    """
+    operacoes = []
+    try:
+        with open(diario, 'rb') as f:
+            f.seek(posicao)
+            for linha in f:
+                if not linha.endswith(b'\n'):
+                    break
+                try:
+                    operacoes.append(json.loads(linha))
+                except json.JSONDecodeError:
+                    print(f"Linha inválida ignorada no diário de visitas: {diario}")
+                    break
+                posicao += len(linha)
+    except FileNotFoundError:
+        pass
+    return operacoes, posicao
+
+
+def carregar_visitas(arquivo_visitas: str = "data/visitas.json") -> tuple:
+    """
+    Lê o snapshot e reaplica o diário
+
+    Uma última linha incompleta (queda no meio da gravação) é descartada.
+
+    Returns:
+        (lista de visitas, número de linhas válidas no diário)
+    """
+    visitas = {v['id']: v for v in ArmazenamentoJSON(arquivo_visitas).ler()}
+
+    operacoes, _ = _ler_diario(arquivo_diario(arquivo_visitas))
+    for operacao in operacoes:
+        _aplicar(visitas, operacao)
+    return list(visitas.values()), len(operacoes)
+
 
 class GerenciadorVisitas:
     def __init__(self, arquivo_visitas: str = "data/visitas.json",
-                 pasta_anexos: str = "anexos"):
+                 pasta_anexos: str = "anexos",
+                 limite_diario: int = LIMITE_DIARIO):
         self.arquivo_visitas = arquivo_visitas
+        self.arquivo_diario = arquivo_diario(arquivo_visitas)
         self.pasta_anexos = pasta_anexos
+        self.limite_diario = limite_diario
+        self._armazenamento = ArmazenamentoJSON(arquivo_visitas, campos_adiados=CAMPOS_ADIADOS)
         self.visitas = []
+        self._linhas_diario = 0
+        # Até onde o diário já foi aplicado (byte) e de qual arquivo (inode)
+        self._posicao_diario = 0
+        self._inode_diario = None
+        self._ultimo_id = (None, 0)
         self._carregar_visitas()
 
         # Cria pasta de anexos se não existir
         os.makedirs(pasta_anexos, exist_ok=True)
 
     def _carregar_visitas(self):
-        """Carrega visitas do arquivo JSON"""
-        if os.path.exists(self.arquivo_visitas):
-            with open(self.arquivo_visitas, 'r', encoding='utf-8') as f:
-                self.visitas = json.load(f)
-        else:
-            self.visitas = []
-            self._salvar_visitas()
+        """Carrega visitas do snapshot + diário"""
+        with self._armazenamento.trava():
+            if self._armazenamento.existe() or os.path.exists(self.arquivo_diario):
+                self._ler_tudo()
+                # Linha final incompleta: novas linhas seriam grudadas nela
+                if self._linhas_diario >= self.limite_diario or not self._diario_termina_em_linha():
+                    self.compactar()
+            else:
+                self.visitas = []
+                self._indexar()
+                self.compactar()
+
+    def _ler_tudo(self):
+        """Relê snapshot e diário inteiros (sob a trava: nenhuma compactação no meio)"""
+        with self._armazenamento.trava():
+            visitas = {v['id']: v for v in self._armazenamento.ler()}
+            self._inode_diario = self._inode_do_diario()
+            operacoes, self._posicao_diario = _ler_diario(self.arquivo_diario)
+            for operacao in operacoes:
+                _aplicar(visitas, operacao)
+            self.visitas = list(visitas.values())
+            self._linhas_diario = len(operacoes)
+            self._indexar()
+
+    def _inode_do_diario(self) -> Optional[int]:
+        try:
+            return os.stat(self.arquivo_diario).st_ino
+        except FileNotFoundError:
+            return None
 
-    def _salvar_visitas(self):
-        """Salva visitas no arquivo JSON"""
-        os.makedirs(os.path.dirname(self.arquivo_visitas), exist_ok=True)
-        with open(self.arquivo_visitas, 'w', encoding='utf-8') as f:
-            json.dump(self.visitas, f, ensure_ascii=False, indent=2)
+    def _recarregar_do_disco(self):
+        """
+        Traz as alterações gravadas por outros processos
+
+        Custa dois os.stat quando nada mudou; se só o diário cresceu, aplica
+        apenas as linhas novas sobre a memória (e os índices).
+        """
+        try:
+            if self._armazenamento.alterado():
+                self._ler_tudo()
+                return
+            try:
+                st = os.stat(self.arquivo_diario)
+            except FileNotFoundError:
+                if self._posicao_diario:
+                    self._ler_tudo()
+                return
+            if st.st_ino != self._inode_diario or st.st_size < self._posicao_diario:
+                # Diário recriado ou esvaziado por uma compactação
+                self._ler_tudo()
+            elif st.st_size > self._posicao_diario:
+                operacoes, self._posicao_diario = _ler_diario(self.arquivo_diario, self._posicao_diario)
+                for operacao in operacoes:
+                    self._aplicar_na_memoria(operacao)
+                self._linhas_diario += len(operacoes)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Erro ao recarregar visitas: {e}")
+
+    def _aplicar_na_memoria(self, operacao: Dict):
+        """Como _aplicar, mas sobre a lista em memória mantendo os índices"""
+        tipo = operacao['op']
+        if tipo == 'incluir':
+            anterior = self._por_id.get(operacao['visita']['id'])
+            if anterior is not None:
+                self.visitas.remove(anterior)
+                self._desindexar_visita(anterior)
+            self.visitas.append(operacao['visita'])
+            self._indexar_visita(operacao['visita'])
+        elif tipo == 'alterar':
+            visita = self._por_id.get(operacao['id'])
+            if visita is not None:
+                self._desindexar_visita(visita)
+                visita.update(operacao['campos'])
+                self._indexar_visita(visita)
+        elif tipo == 'excluir':
+            visita = self._por_id.get(operacao['id'])
+            if visita is not None:
+                self.visitas.remove(visita)
+                self._desindexar_visita(visita)
+
+    @contextmanager
+    def _alteracao(self):
+        """Trava snapshot e diário e recarrega as visitas antes de ler-alterar-gravar"""
+        with self._armazenamento.trava():
+            self._recarregar_do_disco()
+            yield
+
+    def _indexar(self):
+        """
+        Reconstrói os índices: id -> visita, visitas por data/hora e visitas
+        de cada escola por data/hora
+        """
+        self._por_id = {v['id']: v for v in self.visitas}
+        # Uma única ordenação: os índices por escola são recortes dela
+        pares = sorted(((_chave_data(v), v) for v in self.visitas), key=itemgetter(0))
+        self._por_data = IndiceOrdenado.de_pares_ordenados(_chave_data, pares)
+        agrupados = {}
+        for par in pares:
+            agrupados.setdefault(par[1]['escola_id'], []).append(par)
+        self._por_escola = {escola_id: IndiceOrdenado.de_pares_ordenados(_chave_data, lista)
+                            for escola_id, lista in agrupados.items()}
+
+    def _indexar_visita(self, visita: Dict):
+        self._por_id[visita['id']] = visita
+        self._por_data.inserir(visita)
+        if visita['escola_id'] not in self._por_escola:
+            self._por_escola[visita['escola_id']] = IndiceOrdenado(_chave_data)
+        self._por_escola[visita['escola_id']].inserir(visita)
+
+    def _desindexar_visita(self, visita: Dict):
+        self._por_id.pop(visita['id'], None)
+        self._por_data.remover(visita)
+        if visita['escola_id'] in self._por_escola:
+            self._por_escola[visita['escola_id']].remover(visita)
+
+    def _diario_termina_em_linha(self) -> bool:
+        if not os.path.exists(self.arquivo_diario) or os.path.getsize(self.arquivo_diario) == 0:
+            return True
+        with open(self.arquivo_diario, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def compactar(self):
+        """Grava o snapshot completo (substituição atômica) e esvazia o diário"""
+        with self._alteracao():
+            self._armazenamento.gravar(self.visitas)
+            # Uma queda aqui só deixa o diário antigo, que reaplicado não muda nada
+            with open(self.arquivo_diario, 'w', encoding='utf-8'):
+                pass
+            self._inode_diario = self._inode_do_diario()
+            self._posicao_diario = 0
+            self._linhas_diario = 0
+
+    def _registrar_no_diario(self, operacao: Dict):
+        """
+        Acrescenta uma operação ao diário (uma linha, sem reescrever o resto)
+
+        Chamado dentro de _alteracao(): a memória já está em dia com o diário,
+        então a posição aplicada avança só com a linha gravada aqui.
+        """
+        os.makedirs(os.path.dirname(self.arquivo_diario) or '.', exist_ok=True)
+        linha = (json.dumps(operacao, ensure_ascii=False) + '\n').encode('utf-8')
+        with open(self.arquivo_diario, 'ab') as f:
+            f.write(linha)
+            f.flush()
+            os.fsync(f.fileno())
+            self._inode_diario = os.fstat(f.fileno()).st_ino
+        self._posicao_diario += len(linha)
+        self._linhas_diario += 1
+        if self._linhas_diario >= self.limite_diario:
+            self.compactar()
 
     def _gerar_id_visita(self) -> str:
-        """Gera ID único para visita baseado em timestamp"""
+        """Gera ID único para visita baseado em timestamp (contador por segundo)"""
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        contador = len([v for v in self.visitas if v['id'].startswith(timestamp)])
-        return f"{timestamp}_{contador + 1}"
+        ultimo_timestamp, contador = self._ultimo_id
+        contador = contador + 1 if timestamp == ultimo_timestamp else 1
+        # IDs do mesmo segundo já gravados (ex.: por outro processo)
+        while f"{timestamp}_{contador}" in self._por_id:
+            contador += 1
+        self._ultimo_id = (timestamp, contador)
+        return f"{timestamp}_{contador}"
 
     def _copiar_anexo(self, caminho_origem: str, id_visita: str) -> Optional[str]:
         """
@@ -114,46 +360,49 @@ class GerenciadorVisitas:
         if data is None:
             data = datetime.now().strftime("%Y-%m-%d")
 
-        hora = datetime.now().strftime("%H:%M:%S")
-        id_visita = self._gerar_id_visita()
-
-        # Processa anexos
-        anexos_copiados = []
-        if anexos:
-            print(f"\nCopiando {len(anexos)} anexo(s)...")
-            for caminho in anexos:
-                caminho_relativo = self._copiar_anexo(caminho, id_visita)
-                if caminho_relativo:
-                    anexos_copiados.append({
-                        'caminho': caminho_relativo,
-                        'nome_original': os.path.basename(caminho),
-                        'timestamp': datetime.now().isoformat()
-                    })
-                    print(f"  ✓ {os.path.basename(caminho)}")
-
-        visita = {
-            'id': id_visita,
-            'escola_id': escola_id,
-            'escola_nome': escola_nome,
-            'escola_nome_oficial': escola_nome_oficial,
-            'data': data,
-            'hora': hora,
-            'turno': turno,
-            'oficina': oficina,
-            'observacoes': observacoes,
-            'contribuicoes': contribuicoes,
-            'combinados': combinados,
-            'mediador_id': mediador_id,
-            'mediador_nome': mediador_nome,
-            'articulador_nome': articulador_nome,
-            'gestor_nome': gestor_nome,
-            'turmas': turmas or [],
-            'anexos': anexos_copiados,
-            'criado_em': datetime.now().isoformat()
-        }
-
-        self.visitas.append(visita)
-        self._salvar_visitas()
+        # ID gerado e linha gravada sob a trava: outro processo não repete o ID
+        with self._alteracao():
+            hora = datetime.now().strftime("%H:%M:%S")
+            id_visita = self._gerar_id_visita()
+
+            # Processa anexos
+            anexos_copiados = []
+            if anexos:
+                print(f"\nCopiando {len(anexos)} anexo(s)...")
+                for caminho in anexos:
+                    caminho_relativo = self._copiar_anexo(caminho, id_visita)
+                    if caminho_relativo:
+                        anexos_copiados.append({
+                            'caminho': caminho_relativo,
+                            'nome_original': os.path.basename(caminho),
+                            'timestamp': datetime.now().isoformat()
+                        })
+                        print(f"  ✓ {os.path.basename(caminho)}")
+
+            visita = {
+                'id': id_visita,
+                'escola_id': escola_id,
+                'escola_nome': escola_nome,
+                'escola_nome_oficial': escola_nome_oficial,
+                'data': data,
+                'hora': hora,
+                'turno': turno,
+                'oficina': oficina,
+                'observacoes': observacoes,
+                'contribuicoes': contribuicoes,
+                'combinados': combinados,
+                'mediador_id': mediador_id,
+                'mediador_nome': mediador_nome,
+                'articulador_nome': articulador_nome,
+                'gestor_nome': gestor_nome,
+                'turmas': turmas or [],
+                'anexos': anexos_copiados,
+                'criado_em': datetime.now().isoformat()
+            }
+
+            self.visitas.append(visita)
+            self._indexar_visita(visita)
+            self._registrar_no_diario({'op': 'incluir', 'visita': visita})
 
         return visita
 
@@ -171,28 +420,23 @@ class GerenciadorVisitas:
         Returns:
             Lista de visitas filtradas
         """
-        visitas_filtradas = self.visitas.copy()
-
+        self._recarregar_do_disco()
         if escola_id is not None:
-            visitas_filtradas = [v for v in visitas_filtradas if v['escola_id'] == escola_id]
-
-        if data_inicio:
-            visitas_filtradas = [v for v in visitas_filtradas if v['data'] >= data_inicio]
-
-        if data_fim:
-            visitas_filtradas = [v for v in visitas_filtradas if v['data'] <= data_fim]
-
-        # Ordena por data e hora (mais recentes primeiro)
-        visitas_filtradas.sort(key=lambda x: (x['data'], x['hora']), reverse=True)
+            indice = self._por_escola.get(escola_id)
+            if indice is None:
+                return []
+        else:
+            indice = self._por_data
 
+        # Índices em ordem de data e hora: recorta o intervalo e inverte (mais recentes primeiro)
+        visitas_filtradas = indice.intervalo(data_inicio or None, data_fim or None)
+        visitas_filtradas.reverse()
         return visitas_filtradas
 
     def obter_visita(self, id_visita: str) -> Optional[Dict]:
         """Obtém uma visita específica pelo ID"""
-        for visita in self.visitas:
-            if visita['id'] == id_visita:
-                return visita
-        return None
+        self._recarregar_do_disco()
+        return self._por_id.get(id_visita)
 
     def adicionar_anexo_visita(self, id_visita: str, caminho_anexo: str) -> bool:
         """
@@ -205,26 +449,29 @@ class GerenciadorVisitas:
         Returns:
             True se sucesso, False caso contrário
         """
-        visita = self.obter_visita(id_visita)
+        with self._alteracao():
+            visita = self._por_id.get(id_visita)
+
+            if not visita:
+                print(f"⚠️  Visita {id_visita} não encontrada")
+                return False
+
+            caminho_relativo = self._copiar_anexo(caminho_anexo, id_visita)
+
+            if caminho_relativo:
+                visita['anexos'].append({
+                    'caminho': caminho_relativo,
+                    'nome_original': os.path.basename(caminho_anexo),
+                    'timestamp': datetime.now().isoformat()
+                })
+                # Lista completa de anexos (e não só o novo): a operação fica idempotente
+                self._registrar_no_diario({'op': 'alterar', 'id': id_visita,
+                                           'campos': {'anexos': visita['anexos']}})
+                print(f"✓ Anexo adicionado: {os.path.basename(caminho_anexo)}")
+                return True
 
-        if not visita:
-            print(f"⚠️  Visita {id_visita} não encontrada")
             return False
 
-        caminho_relativo = self._copiar_anexo(caminho_anexo, id_visita)
-
-        if caminho_relativo:
-            visita['anexos'].append({
-                'caminho': caminho_relativo,
-                'nome_original': os.path.basename(caminho_anexo),
-                'timestamp': datetime.now().isoformat()
-            })
-            self._salvar_visitas()
-            print(f"✓ Anexo adicionado: {os.path.basename(caminho_anexo)}")
-            return True
-
-        return False
-
     def atualizar_observacoes(self, id_visita: str, novas_observacoes: str) -> bool:
         """
         Atualiza observações de uma visita
@@ -236,15 +483,19 @@ class GerenciadorVisitas:
         Returns:
             True se sucesso, False caso contrário
         """
-        visita = self.obter_visita(id_visita)
-
-        if visita:
-            visita['observacoes'] = novas_observacoes
-            visita['atualizado_em'] = datetime.now().isoformat()
-            self._salvar_visitas()
-            return True
+        with self._alteracao():
+            visita = self._por_id.get(id_visita)
+
+            if visita:
+                visita['observacoes'] = novas_observacoes
+                visita['atualizado_em'] = datetime.now().isoformat()
+                self._registrar_no_diario({'op': 'alterar', 'id': id_visita, 'campos': {
+                    'observacoes': visita['observacoes'],
+                    'atualizado_em': visita['atualizado_em'],
+                }})
+                return True
 
-        return False
+            return False
 
     def excluir_visita(self, id_visita: str) -> bool:
         """
@@ -256,21 +507,23 @@ class GerenciadorVisitas:
         Returns:
             True se sucesso, False caso contrário
         """
-        visita = self.obter_visita(id_visita)
+        with self._alteracao():
+            visita = self._por_id.get(id_visita)
 
-        if not visita:
-            return False
+            if not visita:
+                return False
 
-        # Remove pasta de anexos
-        pasta_anexos_visita = os.path.join(self.pasta_anexos, id_visita)
-        if os.path.exists(pasta_anexos_visita):
-            shutil.rmtree(pasta_anexos_visita)
+            # Remove pasta de anexos
+            pasta_anexos_visita = os.path.join(self.pasta_anexos, id_visita)
+            if os.path.exists(pasta_anexos_visita):
+                shutil.rmtree(pasta_anexos_visita)
 
-        # Remove visita da lista
-        self.visitas = [v for v in self.visitas if v['id'] != id_visita]
-        self._salvar_visitas()
+            # Remove visita da lista e dos índices
+            self.visitas.remove(visita)
+            self._desindexar_visita(visita)
+            self._registrar_no_diario({'op': 'excluir', 'id': id_visita})
 
-        return True
+            return True
 
     def obter_estatisticas(self) -> Dict:
         """
@@ -279,6 +532,7 @@ class GerenciadorVisitas:
         Returns:
             Dicionário com estatísticas
         """
+        self._recarregar_do_disco()
         total_visitas = len(self.visitas)
 
         # Conta visitas por escola
@@ -313,3 +567,336 @@ class GerenciadorVisitas:
             'visitas_por_escola': visitas_por_escola,
             'visitas_por_mes': visitas_por_mes
         }
+
+
+# ----------------------------------------------------------------------
+# Banco SQLite do Django (ARMAZENAMENTO_LEGADO=sqlite)
+
+_COLUNAS_VISITA = ('id, escola_id, escola_nome, escola_nome_oficial, data, hora, turno, oficina, '
+                   'observacoes, contribuicoes, combinados, mediador_nome, articulador_nome, '
+                   'gestor_nome, criado_em, atualizado_em')
+
+
+def _tipo_anexo(nome: str) -> str:
+    """Como no init_db: 'foto' para imagens, senão a extensão"""
+    ext = nome.rsplit('.', 1)[-1].lower() if '.' in nome else ''
+    return 'foto' if ext in ('png', 'jpg', 'jpeg') else ext
+
+
+def _turma_para_banco(turma: Dict) -> tuple:
+    """
+    Turma do formulário -> (nome_turma, quantidade, nivel, avaliacao, faixa_etaria)
+
+    A avaliação do formulário é um dicionário (indicador -> conceito): vai
+    como JSON no texto de TurmaVisita.avaliacao.
+    """
+    try:
+        quantidade = int(turma.get('num_estudantes', turma.get('quantidade')))
+    except (TypeError, ValueError):
+        quantidade = None
+    avaliacao = turma.get('avaliacao', '')
+    if not isinstance(avaliacao, str):
+        avaliacao = json.dumps(avaliacao, ensure_ascii=False)
+    return (turma.get('turma', turma.get('nome_turma', '')), quantidade,
+            turma.get('tema', turma.get('nivel', '')), avaliacao, turma.get('faixa_etaria', ''))
+
+
+def _turma_de_linha(linha) -> Dict:
+    """Linha de core_turmavisita -> turma no formato do visitas.json"""
+    avaliacao = linha['avaliacao']
+    if avaliacao[:1] in ('{', '['):
+        try:
+            avaliacao = json.loads(avaliacao)
+        except json.JSONDecodeError:
+            pass
+    turma = {
+        'turma': linha['nome_turma'],
+        'num_estudantes': linha['quantidade'],
+        'tema': linha['nivel'],
+        'avaliacao': avaliacao,
+    }
+    if linha['faixa_etaria']:
+        turma['faixa_etaria'] = linha['faixa_etaria']
+    return turma
+
+
+class GerenciadorVisitasSQL(GerenciadorVisitas):
+    """
+    GerenciadorVisitas sobre core_visita, core_turmavisita e core_anexovisita
+    do banco do Django
+
+    Nada fica em memória: cada consulta vai ao banco pelos índices de data e
+    de escola + data. O ID de cada visita é a chave primária, em texto como
+    os IDs do JSON. Os arquivos dos anexos continuam copiados para
+    pasta_anexos/<id>/; no banco o arquivo fica como uploads/<nome>, como
+    gravam as views do Django e o init_db.
+    """
+
+    def __init__(self, banco: str = BANCO_PADRAO, pasta_anexos: str = "anexos"):
+        self.banco = obter_banco(banco)
+        self.pasta_anexos = pasta_anexos
+        self.banco.verificar_tabelas('core_visita', 'core_turmavisita', 'core_anexovisita')
+
+        # Cria pasta de anexos se não existir
+        os.makedirs(pasta_anexos, exist_ok=True)
+
+    @property
+    def visitas(self) -> List[Dict]:
+        """Todas as visitas, mais recentes primeiro (prefira listar_visitas com filtros)"""
+        return self.listar_visitas()
+
+    def _recarregar_do_disco(self):
+        """Nada a recarregar: as consultas leem o banco"""
+
+    @contextmanager
+    def _alteracao(self):
+        """Transação de escrita no banco"""
+        with self.banco.transacao() as conn:
+            yield conn
+
+    def compactar(self):
+        """Nada a compactar: as alterações vão direto ao banco"""
+
+    @staticmethod
+    def _id_banco(id_visita) -> Optional[int]:
+        try:
+            return int(id_visita)
+        except (TypeError, ValueError):
+            return None
+
+    def _montar_visitas(self, linhas) -> List[Dict]:
+        """Linhas de core_visita -> visitas no formato do visitas.json (turmas e anexos em lote)"""
+        ids = [linha['id'] for linha in linhas]
+        turmas, anexos = {}, {}
+        for lote in lotes(ids):
+            filtro = f'WHERE visita_id IN ({marcadores(len(lote))}) ORDER BY id'
+            for t in self.banco.consultar(
+                    'SELECT visita_id, nome_turma, quantidade, nivel, avaliacao, faixa_etaria '
+                    f'FROM core_turmavisita {filtro}', lote):
+                turmas.setdefault(t['visita_id'], []).append(_turma_de_linha(t))
+            for a in self.banco.consultar(
+                    f'SELECT visita_id, arquivo, nome_original, criado_em FROM core_anexovisita {filtro}', lote):
+                anexos.setdefault(a['visita_id'], []).append({
+                    'caminho': os.path.join(str(a['visita_id']), os.path.basename(a['arquivo'])),
+                    'nome_original': a['nome_original'],
+                    'timestamp': de_utc(a['criado_em']),
+                })
+
+        visitas = []
+        for linha in linhas:
+            visita = {
+                'id': str(linha['id']),
+                'escola_id': linha['escola_id'],
+                'escola_nome': linha['escola_nome'],
+                'escola_nome_oficial': linha['escola_nome_oficial'],
+                'data': linha['data'],
+                'hora': linha['hora'],
+                'turno': linha['turno'],
+                'oficina': linha['oficina'],
+                'observacoes': linha['observacoes'],
+                'contribuicoes': linha['contribuicoes'],
+                'combinados': linha['combinados'],
+                'mediador_id': None,
+                'mediador_nome': linha['mediador_nome'],
+                'articulador_nome': linha['articulador_nome'],
+                'gestor_nome': linha['gestor_nome'],
+                'turmas': turmas.get(linha['id'], []),
+                'anexos': anexos.get(linha['id'], []),
+                'criado_em': de_utc(linha['criado_em']),
+                'atualizado_em': de_utc(linha['atualizado_em']),
+            }
+            visitas.append(visita)
+        return visitas
+
+    def _inserir_anexo(self, conn, id_visita: int, caminho_origem: str) -> bool:
+        """Copia o arquivo para pasta_anexos/<id>/ e grava a linha de core_anexovisita"""
+        if not self._copiar_anexo(caminho_origem, str(id_visita)):
+            return False
+        nome = os.path.basename(caminho_origem)
+        conn.execute('INSERT INTO core_anexovisita (visita_id, arquivo, tipo, nome_original, criado_em) '
+                     'VALUES (?, ?, ?, ?, ?)',
+                     (id_visita, f'uploads/{nome}', _tipo_anexo(nome), nome, agora_utc()))
+        return True
+
+    def registrar_visita(self, escola_id: int, escola_nome: str,
+                        data: Optional[str] = None,
+                        observacoes: str = "",
+                        anexos: Optional[List[str]] = None,
+                        mediador_id: Optional[int] = None,
+                        mediador_nome: str = "",
+                        contribuicoes: str = "",
+                        combinados: str = "",
+                        oficina: str = "",
+                        turno: str = "",
+                        articulador_nome: str = "",
+                        gestor_nome: str = "",
+                        escola_nome_oficial: str = "",
+                        turmas: Optional[List[Dict]] = None) -> Dict:
+        """
+        Registra uma nova visita (visita, turmas e anexos na mesma transação)
+
+        Os argumentos são os de GerenciadorVisitas.registrar_visita;
+        mediador_id não tem coluna em core_visita (fica só mediador_nome).
+        """
+        if data is None:
+            data = datetime.now().strftime("%Y-%m-%d")
+        hora = datetime.now().strftime("%H:%M:%S")
+        agora = agora_utc()
+
+        with self._alteracao() as conn:
+            cursor = conn.execute(
+                'INSERT INTO core_visita (escola_id, escola_nome, escola_nome_oficial, data, hora, turno, '
+                'oficina, observacoes, contribuicoes, combinados, mediador_nome, articulador_nome, '
+                'gestor_nome, criado_em, atualizado_em) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (escola_id if self.banco.existe('core_escola', escola_id) else None,
+                 escola_nome, escola_nome_oficial, data, hora, turno or '', oficina, observacoes,
+                 contribuicoes, combinados, mediador_nome, articulador_nome, gestor_nome, agora, agora))
+            id_visita = cursor.lastrowid
+
+            conn.executemany(
+                'INSERT INTO core_turmavisita (visita_id, nome_turma, quantidade, nivel, avaliacao, faixa_etaria) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(id_visita, *_turma_para_banco(t)) for t in turmas or []])
+
+            if anexos:
+                print(f"\nCopiando {len(anexos)} anexo(s)...")
+                for caminho in anexos:
+                    if self._inserir_anexo(conn, id_visita, caminho):
+                        print(f"  ✓ {os.path.basename(caminho)}")
+
+        visita = self.obter_visita(str(id_visita))
+        # Como no JSON, a visita devolvida mantém o escola_id e o mediador_id recebidos
+        visita['escola_id'] = escola_id
+        visita['mediador_id'] = mediador_id
+        return visita
+
+    def listar_visitas(self, escola_id: Optional[int] = None,
+                      data_inicio: Optional[str] = None,
+                      data_fim: Optional[str] = None) -> List[Dict]:
+        """
+        Lista visitas com filtros opcionais (mais recentes primeiro)
+
+        Args:
+            escola_id: Filtrar por ID da escola
+            data_inicio: Data inicial (YYYY-MM-DD)
+            data_fim: Data final (YYYY-MM-DD)
+
+        Returns:
+            Lista de visitas filtradas
+        """
+        condicoes, parametros = [], []
+        if escola_id is not None:
+            condicoes.append('escola_id = ?')
+            parametros.append(escola_id)
+        if data_inicio:
+            condicoes.append('data >= ?')
+            parametros.append(data_inicio)
+        if data_fim:
+            condicoes.append('data <= ?')
+            parametros.append(data_fim)
+        onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+        linhas = self.banco.consultar(
+            f"SELECT {_COLUNAS_VISITA} FROM core_visita {onde} "
+            "ORDER BY data DESC, COALESCE(hora, '') DESC, id DESC", parametros)
+        return self._montar_visitas(linhas)
+
+    def obter_visita(self, id_visita: str) -> Optional[Dict]:
+        """Obtém uma visita específica pelo ID"""
+        linha = self.banco.consultar_um(
+            f'SELECT {_COLUNAS_VISITA} FROM core_visita WHERE id = ?', (self._id_banco(id_visita),))
+        return self._montar_visitas([linha])[0] if linha is not None else None
+
+    def adicionar_anexo_visita(self, id_visita: str, caminho_anexo: str) -> bool:
+        """
+        Adiciona anexo a uma visita existente
+
+        Args:
+            id_visita: ID da visita
+            caminho_anexo: Caminho do arquivo a anexar
+
+        Returns:
+            True se sucesso, False caso contrário
+        """
+        pk = self._id_banco(id_visita)
+        with self._alteracao() as conn:
+            if not self.banco.existe('core_visita', pk):
+                print(f"⚠️  Visita {id_visita} não encontrada")
+                return False
+            if not self._inserir_anexo(conn, pk, caminho_anexo):
+                return False
+            conn.execute('UPDATE core_visita SET atualizado_em = ? WHERE id = ?', (agora_utc(), pk))
+        print(f"✓ Anexo adicionado: {os.path.basename(caminho_anexo)}")
+        return True
+
+    def atualizar_observacoes(self, id_visita: str, novas_observacoes: str) -> bool:
+        """
+        Atualiza observações de uma visita
+
+        Args:
+            id_visita: ID da visita
+            novas_observacoes: Novas observações
+
+        Returns:
+            True se sucesso, False caso contrário
+        """
+        with self._alteracao() as conn:
+            cursor = conn.execute('UPDATE core_visita SET observacoes = ?, atualizado_em = ? WHERE id = ?',
+                                  (novas_observacoes, agora_utc(), self._id_banco(id_visita)))
+        return cursor.rowcount > 0
+
+    def excluir_visita(self, id_visita: str) -> bool:
+        """
+        Exclui uma visita, suas turmas e seus anexos
+
+        Args:
+            id_visita: ID da visita
+
+        Returns:
+            True se sucesso, False caso contrário
+        """
+        pk = self._id_banco(id_visita)
+        with self._alteracao() as conn:
+            # CASCADE dos modelos do Django
+            conn.execute('DELETE FROM core_turmavisita WHERE visita_id = ?', (pk,))
+            conn.execute('DELETE FROM core_anexovisita WHERE visita_id = ?', (pk,))
+            if conn.execute('DELETE FROM core_visita WHERE id = ?', (pk,)).rowcount == 0:
+                return False
+
+        # Remove pasta de anexos
+        pasta_anexos_visita = os.path.join(self.pasta_anexos, str(pk))
+        if os.path.exists(pasta_anexos_visita):
+            shutil.rmtree(pasta_anexos_visita)
+        return True
+
+    def obter_estatisticas(self) -> Dict:
+        """
+        Obtém estatísticas das visitas (agregadas no banco)
+
+        Returns:
+            Dicionário com estatísticas
+        """
+        visitas_por_escola = {
+            linha['escola_nome']: linha['total'] for linha in self.banco.consultar(
+                'SELECT escola_nome, COUNT(*) AS total FROM core_visita GROUP BY escola_nome '
+                'ORDER BY MIN(id)')}
+        visitas_por_mes = {
+            linha['mes']: linha['total'] for linha in self.banco.consultar(
+                'SELECT substr(data, 1, 7) AS mes, COUNT(*) AS total FROM core_visita GROUP BY mes '
+                'ORDER BY MIN(id)')}
+
+        # Escola mais visitada (empate: a primeira visitada, como no JSON)
+        escola_mais_visitada = None
+        max_visitas = 0
+        for escola, count in visitas_por_escola.items():
+            if count > max_visitas:
+                max_visitas = count
+                escola_mais_visitada = escola
+
+        return {
+            'total_visitas': sum(visitas_por_escola.values()),
+            'total_escolas_visitadas': len(visitas_por_escola),
+            'escola_mais_visitada': escola_mais_visitada,
+            'max_visitas_escola': max_visitas,
+            'visitas_por_escola': visitas_por_escola,
+            'visitas_por_mes': visitas_por_mes
+        }